@@ -1,12 +1,30 @@
 import os
+import copy
+import tempfile
 import numpy as np
 import pandas as pd
 
+from multiprocessing import Pool
+from typing import Union
 from currentscape_calculator.CurrentscapeCalculator import CurrentscapeCalculator
-from simulator.ModelSimulator import ModelSimulator
+from currentscape_calculator.grouping import DISTANCE_BINS, distance_grouping, branch_order_grouping
+from currentscape_calculator.ensemble_statistics import EnsembleStatistics
+from currentscape_calculator.progress import ProgressAggregator, print_progress
+from PipelineScheduler import PipelineScheduler, get_pipeline_stages
+from Instrumentation import Instrumentation, instrumented
+from Precision import get_dtype
+from simulator.ModelSimulator import ModelSimulator, BACKGROUND_INPUT
 from preprocessor.Preprocessor import Preprocessor
 from currentscape_visualization.currentscape import plot_currentscape
 
+# Renderers of the currentscape figures: Altair (Vega) charts, or Matplotlib figures drawn from NumPy arrays, which
+# are much faster to save for batches of figures
+RENDERERS = ('altair', 'matplotlib')
+
+# Recording profiles without the membrane potentials of all segments, whose axial currents can only be calculated
+# by the 'accumulated' axial current engine
+ACCUMULATED_PROFILES = ('currentscape-accumulated',)
+
 
 class CurrentscapePipeline:
     """
@@ -16,7 +34,8 @@ class CurrentscapePipeline:
     Attributes:
         output_dir (str): The directory where the preprocessed and output files will be saved.
         target (str): The neuronal compartment targeted for currentscape calculations.
-        partitioning (str): Strategy used for partitioning currents ('type' or 'region').
+        partitioning (str or callable): Strategy used for partitioning currents ('type', 'region', 'distance',
+            'branch_order' or a user-defined grouping scheme, see `currentscape_calculator.grouping`).
         ca (bool): A boolean indicating if calcium channels are included in the model.
         stim_dend (int): Dendrite that is stimulated during the simulation.
         direction (str): Direction of stimulation in the model ('IN' or 'OUT').
@@ -29,11 +48,64 @@ class CurrentscapePipeline:
         currentscape_filename (str): Output file name for the currentscape plot.
         simulation_data (dict): Dictionary holding the results of the simulation.
         taxis (array): Array representing the time axis of the simulation results.
+        distance_bins (list): Edges of the somatic distance bins (um) used when partitioning by 'distance'.
+        coarse_grain (str, int or None): Optional coarse-graining of the partitioning graph ('section' or a number
+            of segments per node). See `CurrentscapeCalculator`.
+        validate_coarse_graining (bool): If True, the coarse-grained currentscape is compared to the full-resolution
+            one and the error is saved to 'results/coarse_graining_error.csv'.
+        tolerance (float or None): Tolerance (nA) of the approximate partitioning. Subtrees connected through smaller
+            axial currents are folded into a 'residual' current type and the error bound of each timepoint is saved
+            to 'results/error_bound.csv'. If None, the exact partitioning is used.
+        adaptive_stride (int or None): If given, the currentscape is calculated with an adaptive temporal resolution
+            starting from every `adaptive_stride`-th sample. The calculated (not interpolated) timepoints are saved to
+            'results/exact_timepoints.csv'.
+        adaptive_threshold (float): Change of the current shares (percentage points) above which the adaptive
+            resolution is refined.
+        chunk_size (int or None): If given, the currentscape is calculated in chunks of `chunk_size` timepoints,
+            streaming the inputs from disk so that memory use is bounded by the chunk size.
+        aggregate_synapses (bool): If True, synaptic currents are summed per (segment, receptor type) during the
+            simulation instead of being recorded for every synapse.
+        background_input (bool): If True, the background excitatory and inhibitory spike trains of
+            `simulator/model/synaptic_input` are delivered to randomly placed synapses alongside the stimulation.
+        recording_profile (str): The variables recorded during the simulation: 'full', 'currentscape-minimal' (only
+            what the currentscape needs), 'currentscape-accumulated' (only what the currentscape needs with the
+            'accumulated' axial current engine, which must then be selected) or 'vm-target' (only the membrane
+            potential of the target, enough to visualize existing results). See
+            `simulator.model.utils.recording_profiles`.
+        seed (int or None): Seed of a randomized trial (positions of the stimulated synapses and locations of the
+            background synapses). If None, the deterministic synapse placement is used. See `run_ensemble`.
+        instrumentation (Instrumentation): Measures the time, memory and throughput of each stage and sub-step. The
+            report is saved to 'instrumentation.json' by `run_full_pipeline`. `instrumentation_hooks` are called with
+            the record of each completed stage (see `Instrumentation`).
+        progress_callback (callable or None): Called with the progress of the partitioning (completed timepoints,
+            throughput and ETA), at most every `progress_interval` seconds. Prints one line per report by default.
+            When pipelines run in parallel worker processes, the progress of all workers is aggregated. See
+            `currentscape_calculator.progress`.
+        progress_interval (float): The minimal number of seconds between two progress reports.
+        axial_engine (str): How the axial currents are preprocessed: 'voltage' from the membrane potentials of all
+            segments, or 'accumulated' as the membrane current of the subtree beyond each connection, which balances
+            the currents exactly and only needs the membrane potential of the target (e.g. with the
+            'currentscape-accumulated' recording profile). See `preprocessor.Preprocessor`.
+        precision (str): The floating point precision of the currents ('float32' or 'float64'), honored by the
+            recorders, the preprocessing, the calculator and the currentscape store. Sums are accumulated in float64
+            and the membrane potentials are always float64. See `Precision`.
+        renderer (str): The renderer of the currentscape figure: 'altair' or 'matplotlib' (same layout and colors,
+            see `currentscape_visualization.matplotlib_renderer`). 'matplotlib' needs the optional matplotlib package.
     """
     def __init__(self, output_dir: str = 'output', target: str = 'soma', partitioning: str = 'type', ca: bool = True,
                  stim_dend: int = 108, direction: str = 'IN', tstop: int = 900, tmin: int = 280, tmax: int = 380,
                  nsyn: int = 8, t_interval: float = 0.3, onset: int = 300,
-                 currentscape_filename: str = 'currentscape.pdf') -> None:
+                 currentscape_filename: str = 'currentscape.pdf', distance_bins: list = None,
+                 coarse_grain: Union[str, int] = None, validate_coarse_graining: bool = False,
+                 tolerance: float = None, adaptive_stride: int = None, adaptive_threshold: float = 5.0,
+                 chunk_size: int = None, aggregate_synapses: bool = False,
+                 background_input: bool = False, recording_profile: str = 'full', seed: int = None,
+                 instrumentation_hooks: list = None, progress_callback=print_progress,
+                 progress_interval: float = 10.0, axial_engine: str = 'voltage',
+                 precision: str = 'float32', renderer: str = 'altair') -> None:
+        if recording_profile in ACCUMULATED_PROFILES and axial_engine != 'accumulated':
+            raise ValueError(f"The recording profile '{recording_profile}' does not record the membrane potentials "
+                             f"needed by the '{axial_engine}' axial current engine. Use axial_engine='accumulated'.")
 
         self.output_dir = output_dir
         self.target = target
@@ -50,27 +122,164 @@ class CurrentscapePipeline:
         self.currentscape_filename = currentscape_filename
         self.simulation_data = None
         self.taxis = None
+        self.distance_bins = distance_bins if distance_bins is not None else DISTANCE_BINS
+        self.coarse_grain = coarse_grain
+        self.validate_coarse_graining = validate_coarse_graining
+        self.tolerance = tolerance
+        self.adaptive_stride = adaptive_stride
+        self.adaptive_threshold = adaptive_threshold
+        self.chunk_size = chunk_size
+        self.aggregate_synapses = aggregate_synapses
+        self.background_input = background_input
+        self.recording_profile = recording_profile
+        self.seed = seed
+        self.instrumentation = Instrumentation(hooks=instrumentation_hooks)
+        self.progress_callback = progress_callback
+        self.progress_interval = progress_interval
+        self.axial_engine = axial_engine
+        self.precision = precision
+        self.renderer = renderer
 
 
-    def run_simulation(self):
+    @instrumented('simulation')
+    def run_simulation(self, recording_profile: str = None):
         """
         Runs the simulation using the ModelSimulator.
 
         This method builds a neuron model with the specified stimulated dendrite,
         executes the simulation with the configured parameters, and stores
         the simulation data including the time axis ('taxis').
+
+        Args:
+            recording_profile (str or None): Overrides the recording profile of the pipeline for this simulation.
         """
-        simulator = ModelSimulator()
-        model = simulator.build_model(self.ca, self.stim_dend, self.nsyn)
+        recording_profile = self.recording_profile if recording_profile is None else recording_profile
+        simulator = ModelSimulator(self.instrumentation)
+        model = simulator.build_model(self.ca, self.stim_dend, self.nsyn, self.aggregate_synapses,
+                                      BACKGROUND_INPUT if self.background_input else None, self.seed)
         self.simulation_data = simulator.run_simulation(model, self.nsyn, self.tInterval, self.onset,
-                                                        self.direction, self.tstop)
+                                                        self.direction, self.tstop, recording_profile,
+                                                        self.target, self.precision)
         self.taxis = self.simulation_data['taxis']
 
 
+    @staticmethod
+    def run_simulation_batch(pipelines: list['CurrentscapePipeline']) -> None:
+        """
+        Runs the simulations of several pipelines together, as copies of the CA1 model in a single NEURON process.
+
+        The pipelines may differ in their synaptic input (stimulated dendrite, nsyn, interval, onset and direction),
+        but must share the model ('ca') and the simulation duration ('tstop'). The simulation data of each
+        configuration is stored in its pipeline, which can then be preprocessed and calculated as usual.
+
+        Args:
+            pipelines (list[CurrentscapePipeline]): The pipelines to simulate.
+        """
+        if len({(pipeline.ca, pipeline.tstop, pipeline.aggregate_synapses, pipeline.recording_profile,
+                 pipeline.target, pipeline.precision) for pipeline in pipelines}) > 1:
+            raise ValueError("Pipelines simulated in a batch must have the same 'ca', 'tstop', "
+                             "'aggregate_synapses', 'recording_profile', 'target' and 'precision'.")
+        if any(pipeline.background_input for pipeline in pipelines):
+            raise ValueError("Background input is not supported in batch simulations.")
+        configs = [{'stim_dend': pipeline.stim_dend, 'nsyn': pipeline.nsyn, 't_interval': pipeline.tInterval,
+                    'onset': pipeline.onset, 'direction': pipeline.direction} for pipeline in pipelines]
+
+        simulator = ModelSimulator()
+        models = simulator.build_batch(pipelines[0].ca, configs, pipelines[0].aggregate_synapses)
+        simulation_data_batch = simulator.run_batch(models, configs, pipelines[0].tstop,
+                                                    pipelines[0].recording_profile, pipelines[0].target,
+                                                    pipelines[0].precision)
+        for pipeline, simulation_data in zip(pipelines, simulation_data_batch):
+            pipeline.simulation_data = simulation_data
+            pipeline.taxis = simulation_data['taxis']
+
+
+    @staticmethod
+    def run_staged(pipelines: list['CurrentscapePipeline'], simulation_workers: int = None,
+                   calculation_workers: int = None, visualize: bool = True,
+                   queue_size: int = 2, visualization_workers: int = 1,
+                   progress_callback=print_progress) -> list['CurrentscapePipeline']:
+        """
+        Runs several pipelines with overlapping stages (see `PipelineScheduler`).
+
+        The simulations of the next pipelines run in NEURON worker processes while the previous ones are preprocessed
+        and partitioned in other worker processes. The utilisation of each stage is printed at the end.
+
+        Args:
+            pipelines (list[CurrentscapePipeline]): The pipelines to run.
+            simulation_workers (int or None): The number of simulation processes. Defaults to half of the CPUs.
+            calculation_workers (int or None): The number of preprocessing and partitioning processes. Defaults to
+                the remaining CPUs.
+            visualize (bool): Whether to save the currentscape figures.
+            queue_size (int): The maximal number of pipelines waiting between two stages.
+            visualization_workers (int): The number of visualization processes (see `renderer`).
+            progress_callback (callable or None): Called with the combined progress of the partitioning of all
+                pipelines (see `ProgressAggregator`), in place of the callbacks of the pipelines. If None, no progress
+                is reported.
+
+        Returns:
+            list[CurrentscapePipeline]: The completed pipelines (from the worker processes), in the order of
+            `pipelines`, with their own progress callbacks.
+        """
+        scheduler = PipelineScheduler(get_pipeline_stages(simulation_workers, calculation_workers, visualize,
+                                                          visualization_workers), queue_size)
+        # The progress of the calculation workers is reported through the aggregator of this process
+        callbacks = [pipeline.progress_callback for pipeline in pipelines]
+        with ProgressAggregator(progress_callback) as progress:
+            pipelines = [copy.copy(pipeline) for pipeline in pipelines]
+            for worker, pipeline in enumerate(pipelines):
+                pipeline.progress_callback = progress.worker_callback(worker)
+            results = scheduler.run(pipelines)
+        for pipeline, callback in zip(results, callbacks):
+            pipeline.progress_callback = callback
+        return results
+
+
+    def run_ensemble(self, n_trials: int, processes: int = None, seed: int = 0) -> EnsembleStatistics:
+        """
+        Calculates the currentscapes of an ensemble of randomized trials and summarizes them.
+
+        Trial `k` is a copy of this pipeline with the seed `seed + k` (see `seed`). The trials run in parallel
+        worker processes, each in a fresh process (NEURON models cannot be rebuilt in the same process) and with a
+        temporary output directory that is deleted after the trial. The currentscape of each trial is reduced into
+        the `EnsembleStatistics` as soon as it completes, so memory use does not grow with the number of trials.
+        The summary is saved to the 'ensemble' directory in the output directory.
+
+        Args:
+            n_trials (int): The number of trials.
+            processes (int or None): The number of worker processes. Defaults to the number of CPUs.
+            seed (int): The seed of the first trial.
+
+        Returns:
+            EnsembleStatistics: The summary of the currentscapes of all trials.
+        """
+        statistics = EnsembleStatistics()
+        with ProgressAggregator(self.progress_callback) as progress, Pool(processes, maxtasksperchild=1) as pool:
+            trials = (self._copy_for_trial(seed + k, progress.worker_callback(k)) for k in range(n_trials))
+            for part_pos, part_neg in pool.imap_unordered(run_ensemble_trial, trials):
+                statistics.add(part_pos, part_neg)
+                print(f"Ensemble: {statistics.n_trials}/{n_trials} trials completed")
+        statistics.save(os.path.join(self.output_dir, 'ensemble'))
+        print("Ensemble statistics saved to " + os.path.join(self.output_dir, 'ensemble'))
+        return statistics
+
+
+    def _copy_for_trial(self, seed: int, progress_callback) -> 'CurrentscapePipeline':
+        trial = copy.copy(self)
+        trial.seed = seed
+        trial.progress_callback = progress_callback
+        trial.simulation_data = None
+        trial.taxis = None
+        return trial
+
+
+    @instrumented('preprocess')
     def preprocess(self):
         """
         Preprocesses simulation data for membrane and axial currents and saves
-        the preprocessed data as CSV files.
+        the preprocessed data as CSV files. Only the timepoints of the analysis
+        window (tmin, tmax) are preprocessed. The current balance of the
+        preprocessed currents is checked and added to the instrumentation report.
 
         Args:
             simulation_data : dict
@@ -87,9 +296,11 @@ class CurrentscapePipeline:
                 DataFrame containing the preprocessed axial currents.
         """
 
-        preprocessor = Preprocessor(self.simulation_data)
+        preprocessor = Preprocessor(self.simulation_data, self.tmin, self.tmax, instrumentation=self.instrumentation,
+                                    axial_engine=self.axial_engine, precision=self.precision)
         self.im = preprocessor.preprocess_membrane_currents()
         self.iax = preprocessor.preprocess_axial_currents()
+        preprocessor.validate_current_balance(self.im, self.iax)
 
         pre_dir = os.path.join(self.output_dir, 'preprocessed')
         os.makedirs(pre_dir, exist_ok=True)
@@ -101,6 +312,7 @@ class CurrentscapePipeline:
         np.save(os.path.join(self.output_dir, 'taxis.npy'), self.taxis)
 
 
+    @instrumented('calculate')
     def calculate_currentscape(self):
         """
         Calculates the currentscape for a given target and partitioning strategy.
@@ -110,42 +322,130 @@ class CurrentscapePipeline:
         calculate the positive and negative partitioned currents based
         on the provided target, input files, and time constraints. The
         calculated values are stored in the attributes `part_pos` and
-        `part_neg`.
+        `part_neg`. If `chunk_size` is set, the currentscape is calculated
+        in time chunks and written to the 'results/store' directory.
         """
         region_list_dir = os.path.join('currentscape_calculator', 'region_list')
-        calc = CurrentscapeCalculator(self.target, self.partitioning, region_list_dir)
-        self.part_pos, self.part_neg = calc.calculate_currentscape(
-            self.iax_path, self.im_path, self.taxis, self.tmin, self.tmax
-        )
-
+        # The catalog of the simulated model is shared with the partitioning
+        catalog = self.simulation_data.get('catalog') if self.simulation_data is not None else None
+        calc = CurrentscapeCalculator(self.target, self.get_partitioning_strategy(), region_list_dir,
+                                      coarse_grain=self.coarse_grain,
+                                      validate_coarse_graining=self.validate_coarse_graining,
+                                      tolerance=self.tolerance, adaptive_stride=self.adaptive_stride,
+                                      adaptive_threshold=self.adaptive_threshold,
+                                      instrumentation=self.instrumentation,
+                                      progress_callback=self.progress_callback,
+                                      progress_interval=self.progress_interval,
+                                      precision=self.precision, catalog=catalog)
         res_dir = os.path.join(self.output_dir, 'results')
         os.makedirs(res_dir, exist_ok=True)
+        if self.chunk_size is None:
+            self.part_pos, self.part_neg = calc.calculate_currentscape(
+                self.iax_path, self.im_path, self.taxis, self.tmin, self.tmax
+            )
+        else:
+            self.part_pos, self.part_neg = calc.calculate_currentscape_streaming(
+                self.iax_path, self.im_path, self.taxis, self.tmin, self.tmax,
+                os.path.join(res_dir, 'store'), self.chunk_size
+            )
         part_pos_path = os.path.join(res_dir, 'part_pos.csv')
         part_neg_path = os.path.join(res_dir, 'part_neg.csv')
 
         self.part_pos.to_csv(part_pos_path)
         self.part_neg.to_csv(part_neg_path)
+        if calc.coarse_graining_error is not None:
+            calc.coarse_graining_error.to_csv(os.path.join(res_dir, 'coarse_graining_error.csv'))
+        if calc.error_bound is not None:
+            calc.error_bound.to_csv(os.path.join(res_dir, 'error_bound.csv'))
+        if calc.exact_timepoints is not None:
+            calc.exact_timepoints.to_csv(os.path.join(res_dir, 'exact_timepoints.csv'))
+
 
+    def get_partitioning_strategy(self):
+        """
+        Resolves the partitioning strategy passed to the CurrentscapeCalculator.
 
-    def visualize(self):
+        'distance' and 'branch_order' are turned into grouping schemes using the segment distances and section
+        branch orders of the simulated model. Other strategies are passed on unchanged.
+        """
+        if self.partitioning == 'distance':
+            distances = self.simulation_data['distances']['distance']
+            return distance_grouping(distances, self.distance_bins)
+        if self.partitioning == 'branch_order':
+            branch_orders = self.simulation_data['branch_orders']['branch_order']
+            return branch_order_grouping(branch_orders)
+        return self.partitioning
+
+
+    @instrumented('visualize')
+    def visualize(self, renderer: str = None):
         """
         Generates a currentscape plot.
 
         This method processes the simulation data of membrane potential at a specific target,
         filters the time range, and plots the currentscape. It outputs the currentscape plot to a specified file.
+
+        Args:
+            renderer (str or None): Overrides the renderer of the pipeline ('altair' or 'matplotlib').
+        """
+        renderer = self.renderer if renderer is None else renderer
+        if renderer not in RENDERERS:
+            raise ValueError(f"Unknown renderer '{renderer}'. Available renderers: {', '.join(RENDERERS)}.")
+        filename = os.path.join(self.output_dir, self.currentscape_filename)
+        if renderer == 'matplotlib':
+            # Matplotlib is an optional dependency, only needed by this renderer
+            from currentscape_visualization.matplotlib_renderer import save_currentscape_figure
+            save_currentscape_figure(**self.get_figure_job())
+        else:
+            currentscape = plot_currentscape(
+                                            self.part_pos, self.part_neg, self.get_target_vm(), self.taxis,
+                                            self.tmin, self.tmax, return_segs=False, segments_preselected=False,
+                                            partitionby=self.get_partitionby())
+            currentscape.save(filename)
+        print("Currentscape saved to " + filename)
+
+
+    @staticmethod
+    def visualize_batch(pipelines: list['CurrentscapePipeline'], processes: int = None) -> None:
+        """
+        Saves the currentscape figures of several pipelines with the Matplotlib renderer, in parallel worker
+        processes.
+
+        Args:
+            pipelines (list[CurrentscapePipeline]): Pipelines with calculated or loaded results.
+            processes (int or None): The number of worker processes. Defaults to the number of CPUs.
+        """
+        # Matplotlib is an optional dependency, only needed by this renderer
+        from currentscape_visualization.matplotlib_renderer import save_currentscape_figures
+        filenames = save_currentscape_figures([pipeline.get_figure_job() for pipeline in pipelines], processes)
+        print(f"{len(filenames)} currentscapes saved")
+
+
+    def get_target_vm(self) -> np.ndarray:
+        """
+        Returns the membrane potential of the target within the time interval (tmin, tmax).
         """
         v_idx = np.where(
             np.array(self.simulation_data['membrane_potential_data'][0]).astype(str) == f'{self.target}(0.5)'
         )
-        v_target = np.array(self.simulation_data['membrane_potential_data'][1])[v_idx].squeeze()[
+        return np.array(self.simulation_data['membrane_potential_data'][1])[v_idx].squeeze()[
             np.flatnonzero((self.taxis > self.tmin) & (self.taxis < self.tmax))
         ]
-        currentscape = plot_currentscape(
-                                        self.part_pos, self.part_neg, v_target, self.taxis, self.tmin, self.tmax,
-                                        return_segs=False, segments_preselected=False,
-                                        partitionby=self.partitioning)
-        currentscape.save(os.path.join(self.output_dir, self.currentscape_filename))
-        print("Currentscape saved to " + os.path.join(self.output_dir, self.currentscape_filename))
+
+
+    def get_partitionby(self) -> str:
+        return self.partitioning if isinstance(self.partitioning, str) else 'custom'
+
+
+    def get_figure_job(self) -> dict:
+        """
+        Returns the arguments of `save_currentscape_figure` for the currentscape of the pipeline, holding only the
+        arrays of the time interval (tmin, tmax) so that it can be sent to a worker process.
+        """
+        segment_indexes = np.flatnonzero((self.taxis > self.tmin) & (self.taxis < self.tmax))
+        return {'filename': os.path.join(self.output_dir, self.currentscape_filename),
+                'part_pos': self.part_pos[segment_indexes], 'part_neg': self.part_neg[segment_indexes],
+                'vm': self.get_target_vm(), 't': self.taxis[segment_indexes], 'partitionby': self.get_partitionby()}
 
 
     def run_full_pipeline(self):
@@ -159,6 +459,15 @@ class CurrentscapePipeline:
         self.preprocess()
         self.calculate_currentscape()
         self.visualize()
+        self.save_instrumentation_report()
+
+
+    def save_instrumentation_report(self):
+        """
+        Saves the instrumentation report of the stages run so far to 'instrumentation.json' in the output directory.
+        """
+        os.makedirs(self.output_dir, exist_ok=True)
+        self.instrumentation.save(os.path.join(self.output_dir, 'instrumentation.json'))
 
 
     def results_exist(self) -> bool:
@@ -180,11 +489,30 @@ class CurrentscapePipeline:
         part_pos_path = os.path.join(res_dir, 'part_pos.csv')
         part_neg_path = os.path.join(res_dir, 'part_neg.csv')
 
-        # Load currentscape partition data
-        self.part_pos = pd.read_csv(part_pos_path, index_col=0)
-        self.part_neg = pd.read_csv(part_neg_path, index_col=0)
+        # Load currentscape partition data in the precision of the pipeline
+        dtype = get_dtype(self.precision)
+        header = pd.read_csv(part_pos_path, index_col=0, nrows=0).columns
+        self.part_pos = pd.read_csv(part_pos_path, index_col=0, dtype=dict.fromkeys(header, dtype))
+        self.part_neg = pd.read_csv(part_neg_path, index_col=0, dtype=dict.fromkeys(header, dtype))
         self.part_pos.columns = self.part_pos.columns.astype(int)
         self.part_neg.columns = self.part_neg.columns.astype(int)
 
         # Load simulation time axis and membrane potential to visualize properly
-        self.taxis = np.load(os.path.join(self.output_dir, 'taxis.npy'))
\ No newline at end of file
+        self.taxis = np.load(os.path.join(self.output_dir, 'taxis.npy'))
+
+
+def run_ensemble_trial(pipeline: CurrentscapePipeline) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Runs the simulation, preprocessing and currentscape calculation of a trial of `CurrentscapePipeline.run_ensemble`
+    in a temporary output directory.
+
+    Returns:
+        tuple[pd.DataFrame, pd.DataFrame]: The positive and negative currentscape of the trial.
+    """
+    with tempfile.TemporaryDirectory() as output_dir:
+        pipeline.output_dir = output_dir
+        pipeline.run_simulation()
+        pipeline.preprocess()
+        pipeline.calculate_currentscape()
+        # copy the results, which may be memory-mapped from the temporary directory
+        return pipeline.part_pos.copy(), pipeline.part_neg.copy()
@@ -0,0 +1,149 @@
+import sys
+import json
+import time
+import functools
+import numpy as np
+import pandas as pd
+
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+# Counters that are also reported per second of wall time
+RATE_COUNTERS = ('timepoints', 'edges', 'segments')
+
+
+class Instrumentation:
+    """
+    Collects the wall time, CPU time, peak memory and size metrics of the stages of a run.
+
+    Stages are measured with the `stage` context manager and can be nested; the name of a nested stage is the path
+    of the enclosing stages (e.g. 'calculate/partition'). Inside a stage, code adds its own metrics to the yielded
+    dictionary: counters such as 'timepoints', 'edges' and 'segments' (also reported per second) and array sizes in
+    bytes (see `nbytes`). Each completed stage is passed to the registered hooks, so that monitoring can collect the
+    same numbers as the JSON report.
+
+    A disabled instrumentation (the default of the pipeline components) skips all measurements.
+
+    Attributes:
+        enabled (bool): Whether stages are measured.
+        hooks (list[callable]): Functions called with the record (dict) of each completed stage. They have to be
+            picklable (module-level functions) if the pipeline is run in worker processes.
+        records (list[dict]): The records of the completed stages, in order of completion.
+    """
+    def __init__(self, enabled: bool = True, hooks: list = None) -> None:
+        self.enabled = enabled
+        self.hooks = list(hooks) if hooks is not None else []
+        self.records = []
+        self._stack = []
+        self._start = time.perf_counter()
+
+    def add_hook(self, hook) -> None:
+        """
+        Registers a function that is called with the record of each completed stage.
+        """
+        self.hooks.append(hook)
+
+    @contextmanager
+    def stage(self, name: str, **metrics):
+        """
+        Measures a stage of the run.
+
+        Args:
+            name (str): The name of the stage.
+            **metrics: Initial metrics of the stage (e.g. counters known in advance).
+
+        Yields:
+            dict: The metrics of the stage, to be completed by the measured code.
+        """
+        if not self.enabled:
+            yield metrics
+            return
+
+        self._stack.append(name)
+        path = '/'.join(self._stack)
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        try:
+            yield metrics
+        finally:
+            self._stack.pop()
+            wall_time = time.perf_counter() - wall_start
+            record = {'stage': path,
+                      'start': wall_start - self._start,
+                      'wall_time': wall_time,
+                      'cpu_time': time.process_time() - cpu_start,
+                      'peak_rss_mb': get_peak_rss_mb()}
+            record.update(metrics)
+            for counter in RATE_COUNTERS:
+                if counter in metrics and wall_time > 0:
+                    record[f'{counter}_per_s'] = metrics[counter] / wall_time
+            self.records.append(record)
+            for hook in self.hooks:
+                hook(record)
+
+    def report(self) -> dict:
+        """
+        Returns the report of the run: the records of all stages and the peak memory of the process.
+        """
+        return {'stages': self.records, 'peak_rss_mb': get_peak_rss_mb()}
+
+    def save(self, path: str) -> None:
+        """
+        Saves the report of the run as a JSON file.
+        """
+        with open(path, 'w') as file:
+            json.dump(self.report(), file, indent=2, default=to_json)
+
+
+def instrumented(name: str):
+    """
+    Decorator that measures a method as a stage of the `instrumentation` attribute of its object.
+    """
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            with self.instrumentation.stage(name):
+                return method(self, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def get_peak_rss_mb() -> float:
+    """
+    Returns the peak resident set size of the process in MB (None if it cannot be measured on this platform).
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes on Linux
+    return peak / 1024 ** 2 if sys.platform == 'darwin' else peak / 1024
+
+
+def nbytes(*arrays) -> int:
+    """
+    Returns the total size in bytes of NumPy arrays and pandas DataFrames/Series (nested lists, tuples and
+    dictionaries of them are summed, other objects are ignored).
+    """
+    total = 0
+    for array in arrays:
+        if isinstance(array, (pd.DataFrame, pd.Series)):
+            total += int(array.memory_usage(index=True).sum()) if isinstance(array, pd.DataFrame) \
+                else int(array.memory_usage(index=True))
+        elif isinstance(array, np.ndarray):
+            total += array.nbytes
+        elif isinstance(array, dict):
+            total += nbytes(*array.values())
+        elif isinstance(array, (list, tuple)):
+            total += nbytes(*array)
+    return total
+
+
+def to_json(value):
+    # Converts NumPy scalars of the metrics to JSON numbers
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
@@ -0,0 +1,214 @@
+import os
+import time
+import queue
+import threading
+import multiprocessing
+import pandas as pd
+
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+
+class PipelineStage:
+    """
+    A stage of a `PipelineScheduler`.
+
+    Attributes:
+        name (str): The name of the stage in the utilisation report.
+        function (callable): A picklable (module-level) function that processes one item and returns the item passed
+            on to the next stage.
+        workers (int): The number of worker processes of the stage.
+        fresh_process (bool): If True, each item is processed in a new worker process (e.g. NEURON simulations,
+            since a model cannot be rebuilt in the same process).
+    """
+    def __init__(self, name: str, function, workers: int = 1, fresh_process: bool = False) -> None:
+        self.name = name
+        self.function = function
+        self.workers = workers
+        self.fresh_process = fresh_process
+
+
+class PipelineScheduler:
+    """
+    Producer/consumer scheduler that overlaps the stages of several pipelines.
+
+    Each stage has its own worker processes, and consecutive stages are connected by bounded queues. While the
+    workers of a later stage process an item, the workers of the earlier stages already process the next items, so
+    e.g. NEURON simulations of the next configurations run while previous ones are partitioned. When a queue is full,
+    the stage before it waits, which bounds the number of items (and their simulation data) held in memory.
+
+    If a worker process dies (e.g. it is killed or NEURON crashes), its item fails with a `BrokenProcessPool` error
+    and the worker continues with the next item in a new process.
+
+    Worker processes are started by a fork server rather than forked from the worker threads, since a process forked
+    while another thread holds a lock (e.g. of a queue) can deadlock.
+
+    Attributes:
+        stages (list[PipelineStage]): The stages, in processing order.
+        queue_size (int): The maximal number of items waiting between two stages.
+        report (pd.DataFrame or None): The utilisation of each stage in the last run (see `run`).
+    """
+    def __init__(self, stages: list[PipelineStage], queue_size: int = 2) -> None:
+        self.stages = stages
+        self.queue_size = queue_size
+        self.report = None
+
+    def run(self, items: list) -> list:
+        """
+        Processes the items through all stages.
+
+        Args:
+            items (list): The inputs of the first stage.
+
+        Returns:
+            list: The outputs of the last stage, in the order of `items`.
+
+        Raises:
+            Exception: The first exception raised by a stage function (or `BrokenProcessPool` if the worker process
+                of an item died), after all other items were processed.
+        """
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in self.stages]
+        results = [None] * len(items)
+        errors = []
+        busy = [0.0] * len(self.stages)
+        counts = [0] * len(self.stages)
+        finished = [0] * len(self.stages)
+        lock = threading.Lock()
+        executors = []
+        context = multiprocessing.get_context('forkserver')
+
+        def work(position):
+            # Each worker thread runs its items in its own worker process
+            stage = self.stages[position]
+            executor = None
+            while True:
+                task = queues[position].get()
+                if task is None:
+                    break
+                index, item = task
+                if executor is None:
+                    executor = ProcessPoolExecutor(max_workers=1, mp_context=context)
+                    with lock:
+                        executors.append(executor)
+                start = time.perf_counter()
+                try:
+                    output = executor.submit(stage.function, item).result()
+                except Exception as error:
+                    output = error
+                if stage.fresh_process or isinstance(output, BrokenProcessPool):
+                    # A new process for the next item
+                    executor.shutdown()
+                    executor = None
+                with lock:
+                    busy[position] += time.perf_counter() - start
+                    counts[position] += 1
+                    if isinstance(output, Exception):
+                        errors.append((index, output))
+                        continue
+                if position + 1 < len(self.stages):
+                    queues[position + 1].put((index, output))
+                else:
+                    results[index] = output
+
+            if executor is not None:
+                executor.shutdown()
+            # The last worker of a stage ends the workers of the next stage
+            with lock:
+                finished[position] += 1
+                last = finished[position] == stage.workers
+            if last and position + 1 < len(self.stages):
+                for _ in range(self.stages[position + 1].workers):
+                    queues[position + 1].put(None)
+
+        threads = [threading.Thread(target=work, args=(position,), daemon=True)
+                   for position, stage in enumerate(self.stages) for _ in range(stage.workers)]
+        start = time.perf_counter()
+        try:
+            for thread in threads:
+                thread.start()
+            for index, item in enumerate(items):
+                queues[0].put((index, item))
+            for _ in range(self.stages[0].workers):
+                queues[0].put(None)
+            for thread in threads:
+                thread.join()
+        finally:
+            for executor in executors:
+                executor.shutdown(wait=False, cancel_futures=True)
+        wall_time = time.perf_counter() - start
+
+        self.report = pd.DataFrame({
+            'workers': [stage.workers for stage in self.stages],
+            'items': counts,
+            'busy_time': busy,
+            'utilisation': [busy[position] / (stage.workers * wall_time) for position, stage in enumerate(self.stages)],
+        }, index=pd.Index([stage.name for stage in self.stages], name='stage'))
+        print(f"Pipeline scheduler finished {len(items)} items in {wall_time:.1f} s")
+        print(self.report.to_string(float_format='{:.2f}'.format))
+
+        if errors:
+            raise min(errors, key=lambda error: error[0])[1]
+        return results
+
+
+def simulate_stage(pipeline):
+    """
+    Simulation stage: runs the simulation of a `CurrentscapePipeline`.
+    """
+    pipeline.run_simulation()
+    return pipeline
+
+
+def calculate_stage(pipeline):
+    """
+    Calculation stage: preprocesses the currents and calculates the currentscape of a `CurrentscapePipeline`.
+
+    The preprocessed currents are saved to the output directory by `preprocess` and are dropped from the pipeline
+    afterwards, together with the simulation data that visualization does not need, so that less data is passed to
+    the next stage.
+    """
+    pipeline.preprocess()
+    pipeline.calculate_currentscape()
+    pipeline.save_instrumentation_report()
+    pipeline.im = None
+    pipeline.iax = None
+    pipeline.simulation_data = {'membrane_potential_data': pipeline.simulation_data['membrane_potential_data'],
+                                'taxis': pipeline.simulation_data['taxis']}
+    return pipeline
+
+
+def visualize_stage(pipeline):
+    """
+    Visualization stage: saves the currentscape figure of a `CurrentscapePipeline`.
+    """
+    pipeline.visualize()
+    pipeline.save_instrumentation_report()
+    return pipeline
+
+
+def get_pipeline_stages(simulation_workers: int = None, calculation_workers: int = None,
+                        visualize: bool = True, visualization_workers: int = 1) -> list[PipelineStage]:
+    """
+    Creates the simulation, calculation and (optionally) visualization stages of `CurrentscapePipeline` runs.
+
+    Args:
+        simulation_workers (int or None): The number of NEURON worker processes. Defaults to half of the CPUs.
+        calculation_workers (int or None): The number of preprocessing and partitioning worker processes. Defaults to
+            the remaining CPUs.
+        visualize (bool): Whether to add the visualization stage.
+        visualization_workers (int): The number of visualization worker processes (e.g. several with the
+            'matplotlib' renderer of the pipelines).
+
+    Returns:
+        list[PipelineStage]: The stages, in processing order.
+    """
+    cpus = os.cpu_count() or 1
+    if simulation_workers is None:
+        simulation_workers = max(1, cpus // 2)
+    if calculation_workers is None:
+        calculation_workers = max(1, cpus - simulation_workers)
+    stages = [PipelineStage('simulate', simulate_stage, simulation_workers, fresh_process=True),
+              PipelineStage('calculate', calculate_stage, calculation_workers)]
+    if visualize:
+        stages.append(PipelineStage('visualize', visualize_stage, visualization_workers))
+    return stages
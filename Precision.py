@@ -0,0 +1,18 @@
+import numpy as np
+
+# Floating point precisions of the recorded, preprocessed and partitioned currents
+PRECISIONS = {'float32': np.float32, 'float64': np.float64}
+
+# Sums over many values (unit conversions, subtree, group and partition sums) are accumulated in this type and rounded
+# once to the precision of the data. The membrane potentials are also kept in this type, because the axial currents
+# are calculated from differences of nearly equal potentials.
+ACCUMULATION_DTYPE = np.dtype(np.float64)
+
+
+def get_dtype(precision: str) -> np.dtype:
+    """
+    Returns the NumPy type of a precision ('float32' or 'float64').
+    """
+    if precision not in PRECISIONS:
+        raise ValueError(f"Unknown precision '{precision}'. Available precisions: {', '.join(PRECISIONS)}.")
+    return np.dtype(PRECISIONS[precision])
@@ -0,0 +1,129 @@
+import numpy as np
+import pandas as pd
+
+
+class SegmentCatalog:
+    """
+    Interns segment names, sections and current types into dense integer codes.
+
+    The catalog is created when the model is built and shared by all stages of the pipeline, so that the hot code
+    can work on integer arrays instead of string labels. The code of a segment (or current type) is its position in
+    the catalog. Names that are not yet in the catalog, such as merged nodes ('soma' or a target section), are added
+    when they are encoded, so codes stay valid for the whole run. Strings only appear at the output boundary
+    (DataFrames saved to CSV files and figures).
+
+    Segment names are NEURON segment names (e.g. 'dend5_0(0.5)'); their section is the part before the parenthesis
+    and their position is the number within it. Nodes without a position (e.g. the merged 'soma') belong to the
+    section of the same name.
+
+    Attributes:
+        segments (list[str]): The interned segment names, indexed by segment code.
+        sections (list[str]): The interned section names, indexed by section code.
+        itypes (list[str]): The interned current types, indexed by itype code.
+        section_codes (np.ndarray): The section code of each segment.
+        positions (np.ndarray): The position (0 to 1) of each segment within its section, NaN for merged nodes.
+    """
+    def __init__(self, segments: list[str] = (), itypes: list[str] = ()) -> None:
+        self.segments = []
+        self.sections = []
+        self.itypes = []
+        self._segment_sections = []
+        self._segment_positions = []
+        self._arrays = None
+        self._segment_lookup = {}
+        self._section_lookup = {}
+        self._itype_lookup = {}
+        self.encode_segments(segments)
+        self.encode_itypes(itypes)
+
+    @classmethod
+    def from_currents(cls, im: pd.DataFrame, iax: pd.DataFrame) -> 'SegmentCatalog':
+        """
+        Creates a catalog of the nodes and current types of membrane currents indexed by (segment, itype) and axial
+        currents indexed by (ref, par).
+        """
+        catalog = cls()
+        for names in (im.index.get_level_values(0), iax.index.get_level_values(0), iax.index.get_level_values(1)):
+            catalog.encode_segments(names)
+        catalog.encode_itypes(im.index.get_level_values(1))
+        return catalog
+
+    def __len__(self) -> int:
+        return len(self.segments)
+
+    @property
+    def section_codes(self) -> np.ndarray:
+        return self._get_arrays()[0]
+
+    @property
+    def positions(self) -> np.ndarray:
+        return self._get_arrays()[1]
+
+    def encode_segments(self, names) -> np.ndarray:
+        """
+        Returns the segment code of each name, adding unknown names to the catalog.
+        """
+        codes, uniques = pd.factorize(np.asarray(names, dtype=object))
+        unique_codes = np.array([self._intern_segment(name) for name in uniques], dtype=np.int64)
+        return unique_codes[codes]
+
+    def encode_itypes(self, itypes) -> np.ndarray:
+        """
+        Returns the itype code of each current type, adding unknown types to the catalog.
+        """
+        codes, uniques = pd.factorize(np.asarray(itypes, dtype=object))
+        unique_codes = np.array([self._intern(itype, self.itypes, self._itype_lookup) for itype in uniques],
+                                dtype=np.int64)
+        return unique_codes[codes]
+
+    def segment_names(self, codes: np.ndarray) -> np.ndarray:
+        """
+        Returns the segment names of the given segment codes.
+        """
+        return np.asarray(self.segments, dtype=object)[np.asarray(codes, dtype=np.int64)]
+
+    def itype_names(self, codes: np.ndarray) -> np.ndarray:
+        """
+        Returns the current types of the given itype codes.
+        """
+        return np.asarray(self.itypes, dtype=object)[np.asarray(codes, dtype=np.int64)]
+
+    def section_code(self, section: str) -> int:
+        """
+        Returns the code of a section, adding it to the catalog if unknown.
+        """
+        return self._intern(section, self.sections, self._section_lookup)
+
+    def in_section(self, codes: np.ndarray, section: str) -> np.ndarray:
+        """
+        Returns a boolean mask of the segment codes that are segments of the section (e.g. 'dend5_0(0.5)' for
+        'dend5_0'). Merged nodes named after the section itself are not included.
+        """
+        codes = np.asarray(codes, dtype=np.int64)
+        section_code = self.section_code(section)
+        return (self.section_codes[codes] == section_code) & ~np.isnan(self.positions[codes])
+
+    def _get_arrays(self) -> tuple[np.ndarray, np.ndarray]:
+        # The arrays are rebuilt only after new segments were interned
+        if self._arrays is None or len(self._arrays[0]) != len(self.segments):
+            self._arrays = (np.array(self._segment_sections, dtype=np.int64),
+                            np.array(self._segment_positions, dtype=np.float64))
+        return self._arrays
+
+    def _intern_segment(self, name: str) -> int:
+        code = self._segment_lookup.get(name)
+        if code is None:
+            code = self._intern(name, self.segments, self._segment_lookup)
+            section, _, position = str(name).partition('(')
+            self._segment_sections.append(self.section_code(section.strip()))
+            self._segment_positions.append(float(position.rstrip(')')) if position else np.nan)
+        return code
+
+    @staticmethod
+    def _intern(name: str, names: list[str], lookup: dict) -> int:
+        code = lookup.get(name)
+        if code is None:
+            code = len(names)
+            names.append(name)
+            lookup[name] = code
+        return code
@@ -0,0 +1,342 @@
+import os
+import sys
+import json
+import time
+import socket
+import uuid
+import shutil
+import hashlib
+import argparse
+import importlib
+import itertools
+import traceback
+import multiprocessing
+
+
+class SweepQueue:
+    """
+    File-based job queue of a parameter sweep on a shared filesystem.
+
+    Any number of worker processes on any number of hosts can drain the same queue without a central server. The
+    state of a job is the directory its file is in:
+        - 'pending/': waiting to be claimed.
+        - 'claimed/': claimed by a worker. A worker claims a job by renaming its file from 'pending/' to a name with
+          a new claimant token (an atomic operation, so only one worker succeeds) and holds a lease by touching the
+          file every `heartbeat` seconds. Jobs whose lease is older than `lease_timeout` (e.g. of a crashed host) are
+          moved back to 'pending/'. A worker only renews, completes or fails the file of its own token, so a worker
+          whose lease expired cannot move a job that was claimed again by another worker.
+        - 'done/': completed.
+        - 'failed/': failed `max_attempts` times. Failed jobs with attempts left are moved back to 'pending/'.
+
+    Each job runs in a new process (a NEURON model cannot be rebuilt in the same process) and writes its outputs to
+    a temporary directory, which is renamed to '<output_root>/<job_id>' when the job completes. Job ids are derived
+    from the job parameters, so outputs are idempotent: a job whose output directory exists is not run again, and a
+    job that is completed twice (e.g. after its lease expired) keeps the first output.
+
+    Attributes:
+        directory (str): The queue directory.
+        output_root (str): The directory of the job output directories. Defaults to '<directory>/output'.
+        lease_timeout (float): Seconds after the last heartbeat when a claimed job is considered stale.
+        heartbeat (float): Seconds between the heartbeats of a worker.
+        max_attempts (int): The number of failed attempts after which a job is moved to 'failed/'.
+    """
+    STATES = ('pending', 'claimed', 'done', 'failed')
+
+    def __init__(self, directory: str, output_root: str = None, lease_timeout: float = 600, heartbeat: float = 30,
+                 max_attempts: int = 3) -> None:
+        self.directory = directory
+        self.output_root = os.path.join(directory, 'output') if output_root is None else output_root
+        self.lease_timeout = lease_timeout
+        self.heartbeat = heartbeat
+        self.max_attempts = max_attempts
+        for state in self.STATES + ('tmp',):
+            os.makedirs(os.path.join(self.directory, state), exist_ok=True)
+        os.makedirs(self.output_root, exist_ok=True)
+
+    def submit(self, jobs: list[dict]) -> list[str]:
+        """
+        Adds jobs to the queue. Jobs that are already in the queue (in any state) are not added again.
+
+        Args:
+            jobs (list[dict]): The parameters of each job (e.g. keyword arguments of `CurrentscapePipeline`).
+
+        Returns:
+            list[str]: The ids of the added jobs.
+        """
+        added = []
+        for params in jobs:
+            job_id = get_job_id(params)
+            if self._is_claimed(job_id) or \
+                    any(os.path.exists(self._path(state, job_id)) for state in ('pending', 'done', 'failed')):
+                continue
+            self._write(self._path('pending', job_id), {'job_id': job_id, 'params': params, 'attempts': 0})
+            added.append(job_id)
+        return added
+
+    def claim(self) -> dict:
+        """
+        Claims a pending job.
+
+        Returns:
+            dict or None: The claimed job ('job_id', 'params', 'attempts' and the 'claimant' token of this claim), or
+            None if no job is pending.
+        """
+        for name in sorted(os.listdir(os.path.join(self.directory, 'pending'))):
+            pending_path = os.path.join(self.directory, 'pending', name)
+            claimant = uuid.uuid4().hex
+            claimed_path = self._claimed_path(os.path.splitext(name)[0], claimant)
+            try:
+                # The lease starts with the modification time, which is kept by the rename
+                os.utime(pending_path)
+                os.rename(pending_path, claimed_path)
+            except FileNotFoundError:
+                continue  # claimed by another worker
+            with open(claimed_path) as file:
+                return dict(json.load(file), claimant=claimant)
+        return None
+
+    def renew(self, job: dict) -> bool:
+        """
+        Renews the lease of a claimed job. Returns False if the claim is no longer held (its lease expired).
+        """
+        try:
+            os.utime(self._claimed_path(job['job_id'], job['claimant']))
+            return True
+        except FileNotFoundError:
+            return False
+
+    def complete(self, job: dict) -> None:
+        """
+        Marks a claimed job as done. Does nothing if the claim is no longer held: the job was requeued after its
+        lease expired, and is completed by its next claimant, which finds its outputs.
+        """
+        try:
+            os.rename(self._claimed_path(job['job_id'], job['claimant']), self._path('done', job['job_id']))
+        except FileNotFoundError:
+            pass
+
+    def fail(self, job: dict, error: str) -> None:
+        """
+        Records a failed attempt of a claimed job and requeues it, or moves it to 'failed/' after `max_attempts`.
+        Does nothing if the claim is no longer held (see `complete`).
+        """
+        # Taking the claimed file away first ensures that the claim is still held
+        tmp_path = os.path.join(self.directory, 'tmp', f"{job['job_id']}.{job['claimant']}.json")
+        try:
+            os.rename(self._claimed_path(job['job_id'], job['claimant']), tmp_path)
+        except FileNotFoundError:
+            return
+        job = {key: value for key, value in job.items() if key != 'claimant'}
+        job = dict(job, attempts=job['attempts'] + 1, error=error)
+        state = 'failed' if job['attempts'] >= self.max_attempts else 'pending'
+        self._write(self._path(state, job['job_id']), job)
+        os.remove(tmp_path)
+
+    def requeue_stale(self) -> list[str]:
+        """
+        Moves the claimed jobs with an expired lease back to 'pending/'.
+
+        Returns:
+            list[str]: The ids of the requeued jobs.
+        """
+        requeued = []
+        now = time.time()
+        for name in os.listdir(os.path.join(self.directory, 'claimed')):
+            claimed_path = os.path.join(self.directory, 'claimed', name)
+            try:
+                if now - os.path.getmtime(claimed_path) > self.lease_timeout:
+                    # Claimed files are named '<job_id>.<claimant>.json'
+                    job_id = name.split('.')[0]
+                    os.rename(claimed_path, self._path('pending', job_id))
+                    requeued.append(job_id)
+            except FileNotFoundError:
+                continue  # renewed, completed or requeued by another worker in the meantime
+        return requeued
+
+    def status(self) -> dict:
+        """
+        Returns the number of jobs in each state.
+        """
+        return {state: len(os.listdir(os.path.join(self.directory, state))) for state in self.STATES}
+
+    def output_dir(self, job_id: str) -> str:
+        """
+        Returns the output directory of a job.
+        """
+        return os.path.join(self.output_root, job_id)
+
+    def work(self, job_function=None, poll_interval: float = 5) -> int:
+        """
+        Runs jobs until the queue is drained (no job is pending or claimed).
+
+        Args:
+            job_function (callable or None): A picklable function called with the job parameters and the output
+                directory of the job. Defaults to `run_pipeline_job`.
+            poll_interval (float): Seconds to wait while other workers hold the remaining jobs.
+
+        Returns:
+            int: The number of jobs completed by this worker.
+        """
+        job_function = run_pipeline_job if job_function is None else job_function
+        worker = f'{socket.gethostname()}-{os.getpid()}'
+        n_completed = 0
+        while True:
+            self.requeue_stale()
+            job = self.claim()
+            if job is None:
+                if not os.listdir(os.path.join(self.directory, 'claimed')):
+                    break
+                time.sleep(poll_interval)
+                continue
+
+            output_dir = self.output_dir(job['job_id'])
+            if os.path.exists(output_dir):
+                print(f"[{worker}] Job {job['job_id']} already has outputs, skipping")
+                self.complete(job)
+                continue
+
+            print(f"[{worker}] Running job {job['job_id']} (attempt {job['attempts'] + 1})")
+            error = self._run(job, job_function, worker)
+            if error is None:
+                self.complete(job)
+                n_completed += 1
+            else:
+                print(f"[{worker}] Job {job['job_id']} failed")
+                self.fail(job, error)
+        print(f"[{worker}] Queue drained, {n_completed} jobs completed")
+        return n_completed
+
+    def _run(self, job: dict, job_function, worker: str) -> str:
+        # Runs a job in a new process while renewing its lease; returns the error or None
+        tmp_dir = os.path.join(self.output_root, f"{job['job_id']}.tmp-{worker}")
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+        process = multiprocessing.Process(target=run_job, args=(job_function, job['params'], tmp_dir))
+        process.start()
+        lease_held = True
+        while process.is_alive():
+            process.join(self.heartbeat)
+            if process.is_alive() and lease_held and not self.renew(job):
+                print(f"[{worker}] Lease of job {job['job_id']} expired, it may also be run by another worker")
+                lease_held = False
+
+        if process.exitcode != 0:
+            error_path = os.path.join(tmp_dir, 'error.txt')
+            error = open(error_path).read() if os.path.exists(error_path) else f'Exit code {process.exitcode}'
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            return error
+        try:
+            os.rename(tmp_dir, self.output_dir(job['job_id']))
+        except OSError:
+            # Another worker completed the job first; its outputs are kept
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+        return None
+
+    def _path(self, state: str, job_id: str) -> str:
+        return os.path.join(self.directory, state, f'{job_id}.json')
+
+    def _claimed_path(self, job_id: str, claimant: str) -> str:
+        return os.path.join(self.directory, 'claimed', f'{job_id}.{claimant}.json')
+
+    def _is_claimed(self, job_id: str) -> bool:
+        return any(name.split('.')[0] == job_id for name in os.listdir(os.path.join(self.directory, 'claimed')))
+
+    def _write(self, path: str, job: dict) -> None:
+        # Writes the job file atomically, so other workers never read a partial file
+        tmp_path = os.path.join(self.directory, 'tmp', f"{job['job_id']}-{socket.gethostname()}-{os.getpid()}")
+        with open(tmp_path, 'w') as file:
+            json.dump(job, file, indent=2)
+        os.replace(tmp_path, path)
+
+
+def get_job_id(params: dict) -> str:
+    """
+    Returns a deterministic id of a job, derived from its parameters.
+    """
+    return hashlib.sha1(json.dumps(params, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def parameter_grid(grid: dict) -> list[dict]:
+    """
+    Returns the parameters of all combinations of a parameter grid.
+
+    Args:
+        grid (dict): Lists of values of each parameter, e.g. {'nsyn': [8, 10], 'partitioning': ['type', 'region']}.
+
+    Returns:
+        list[dict]: One dictionary of parameters per combination.
+    """
+    names = list(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+
+
+def run_pipeline_job(params: dict, output_dir: str) -> None:
+    """
+    Runs the full `CurrentscapePipeline` of a job.
+    """
+    # Imported here so that the queue can be managed without NEURON
+    from CurrentscapePipeline import CurrentscapePipeline
+
+    CurrentscapePipeline(output_dir=output_dir, **params).run_full_pipeline()
+
+
+def run_job(job_function, params: dict, output_dir: str) -> None:
+    """
+    Runs a job in a worker process and saves the traceback to 'error.txt' in the output directory if it fails.
+    """
+    try:
+        job_function(params, output_dir)
+    except Exception:
+        with open(os.path.join(output_dir, 'error.txt'), 'w') as file:
+            file.write(traceback.format_exc())
+        sys.exit(1)
+
+
+def load_function(name: str):
+    """
+    Returns the function of a 'module:function' name.
+    """
+    module, _, function = name.partition(':')
+    return getattr(importlib.import_module(module), function)
+
+
+def main(argv: list[str] = None) -> None:
+    parser = argparse.ArgumentParser(description="File-based job queue of currentscape parameter sweeps.")
+    parser.add_argument('directory', help="The queue directory on the shared filesystem.")
+    parser.add_argument('--output-root', default=None, help="Directory of the job outputs.")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    submit_parser = commands.add_parser('submit', help="Add the jobs of a parameter grid to the queue.")
+    submit_parser.add_argument('grid', help="JSON file with the list of values of each pipeline parameter.")
+
+    work_parser = commands.add_parser('work', help="Run jobs until the queue is drained.")
+    work_parser.add_argument('--processes', type=int, default=1, help="Number of worker processes on this host.")
+    work_parser.add_argument('--lease-timeout', type=float, default=600)
+    work_parser.add_argument('--heartbeat', type=float, default=30)
+    work_parser.add_argument('--max-attempts', type=int, default=3)
+    work_parser.add_argument('--poll-interval', type=float, default=5)
+    work_parser.add_argument('--job', default='SweepQueue:run_pipeline_job',
+                             help="The 'module:function' run for each job.")
+
+    commands.add_parser('status', help="Print the number of jobs in each state.")
+    args = parser.parse_args(argv)
+
+    if args.command == 'submit':
+        with open(args.grid) as file:
+            grid = json.load(file)
+        added = SweepQueue(args.directory, args.output_root).submit(parameter_grid(grid))
+        print(f"{len(added)} jobs added")
+    elif args.command == 'work':
+        queue = SweepQueue(args.directory, args.output_root, args.lease_timeout, args.heartbeat, args.max_attempts)
+        job_function = load_function(args.job)
+        workers = [multiprocessing.Process(target=queue.work, args=(job_function, args.poll_interval))
+                   for _ in range(args.processes)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+    print(SweepQueue(args.directory, args.output_root).status())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,216 @@
+import os
+import json
+import time
+import argparse
+import tempfile
+import platform
+import subprocess
+import numpy as np
+import pandas as pd
+
+from typing import Iterator
+from Instrumentation import Instrumentation, to_json
+from benchmarks.synthetic_tree import SyntheticTree
+from currentscape_calculator.grouping import get_grouping_scheme, apply_grouping
+from currentscape_calculator.partitioning_algorithm import partition_iax, calc_im_by_region, \
+    merge_dendritic_section_iax, update_root_node
+
+DEFAULT_SIZES = [1000, 3000, 10000, 30000, 100000]
+
+
+def benchmark_partition_iax(tree: SyntheticTree, region_list: str) -> Iterator[dict]:
+    """
+    Partitions all timepoints towards the soma by current type.
+    """
+    im = tree.im.copy()
+    timepoints = list(tree.im.columns)
+    yield {'timepoints': len(timepoints), 'edges': len(timepoints) * tree.iax.shape[0]}
+    partition_iax(im, tree.iax, timepoints, 'soma', 'type', region_list)
+
+
+def benchmark_region_aggregation(tree: SyntheticTree, region_list: str) -> Iterator[dict]:
+    """
+    Groups the membrane currents by region and sums the positive and negative currents of each group, as done
+    before partitioning by 'region'.
+    """
+    yield {'segments': tree.n_segments}
+    grouping = get_grouping_scheme('region', region_list)
+    im = apply_grouping(tree.im, grouping)
+    calc_im_by_region(im.clip(lower=0))
+    calc_im_by_region(im.clip(upper=0))
+
+
+def benchmark_update_root_node(tree: SyntheticTree, region_list: str) -> Iterator[dict]:
+    """
+    Moves the root node from the soma to the deepest section (the longest re-rooted path).
+    """
+    target = tree.deepest_section()
+    iax = merge_dendritic_section_iax(tree.iax, target)
+    yield {'segments': tree.n_segments, 'edges': iax.shape[0]}
+    update_root_node(iax, target)
+
+
+# Each benchmark is a generator: the code before the yield prepares the inputs and yields the counters of the
+# measured stage, the code after it is measured
+BENCHMARKS = {'partition_iax': benchmark_partition_iax,
+              'region_aggregation': benchmark_region_aggregation,
+              'update_root_node': benchmark_update_root_node}
+
+
+def run_benchmarks(sizes: list[int] = DEFAULT_SIZES, n_timepoints: int = 10, flip_rate: float = 0.05,
+                   repeat: int = 3, benchmarks: list[str] = None, seed: int = 0, data_dir: str = None) -> dict:
+    """
+    Runs the calculator benchmarks on synthetic trees of increasing size.
+
+    Args:
+        sizes (list[int]): The numbers of segments of the synthetic trees.
+        n_timepoints (int): The number of timepoints of the synthetic currents.
+        flip_rate (float): The approximate number of sign changes of each membrane current per timepoint.
+        repeat (int): The number of measurements of each benchmark and size.
+        benchmarks (list[str] or None): The benchmarks to run (keys of `BENCHMARKS`). Defaults to all.
+        seed (int): The seed of the synthetic trees.
+        data_dir (str or None): If given, the synthetic inputs are also saved to this directory (see
+            `SyntheticTree.save`), e.g. to run the full calculator on them.
+
+    Returns:
+        dict: The results: the run metadata ('environment', 'parameters'), one record per measurement
+        ('measurements') and the summary and scaling of each benchmark (see `summarize` and `get_scaling`).
+    """
+    benchmarks = list(BENCHMARKS) if benchmarks is None else benchmarks
+    instrumentation = Instrumentation()
+    datasets = []
+    region_dir = tempfile.TemporaryDirectory()
+    for n_segments in sizes:
+        tree = SyntheticTree(n_segments, n_timepoints, flip_rate, seed=seed)
+        region_list = os.path.join(region_dir.name, f'tree_{n_segments}')
+        tree.save_regions(region_list)
+        if data_dir is not None:
+            tree.save(os.path.join(data_dir, f'tree_{n_segments}'))
+        datasets.append({'n_segments': n_segments, 'sections': len(tree.sections), 'nodes': len(tree.nodes),
+                         'edges': tree.iax.shape[0], 'depth': tree.depth})
+        print(f"Synthetic tree with {n_segments} segments: {len(tree.sections)} sections, depth {tree.depth}")
+
+        for name in benchmarks:
+            for _ in range(repeat):
+                benchmark = BENCHMARKS[name](tree, region_list)
+                counters = next(benchmark)
+                with instrumentation.stage(name, n_segments=n_segments, **counters):
+                    next(benchmark, None)
+            wall_times = [record['wall_time'] for record in instrumentation.records[-repeat:]]
+            print(f"  {name}: {min(wall_times):.4f} s")
+    region_dir.cleanup()
+
+    measurements = pd.DataFrame(instrumentation.records).rename(columns={'stage': 'benchmark'})
+    summary = summarize(measurements)
+    return {'environment': get_environment(),
+            'parameters': {'sizes': sizes, 'n_timepoints': n_timepoints, 'flip_rate': flip_rate, 'repeat': repeat,
+                           'seed': seed},
+            'datasets': datasets,
+            'measurements': measurements.to_dict(orient='records'),
+            'summary': summary.reset_index().to_dict(orient='records'),
+            'scaling': get_scaling(summary)}
+
+
+def summarize(measurements: pd.DataFrame) -> pd.DataFrame:
+    """
+    Returns the minimal and median wall time, the CPU time and peak memory of each benchmark and size.
+    """
+    grouped = measurements.groupby(['benchmark', 'n_segments'], sort=False)
+    return pd.DataFrame({'min_time': grouped['wall_time'].min(),
+                         'median_time': grouped['wall_time'].median(),
+                         'cpu_time': grouped['cpu_time'].median(),
+                         'peak_rss_mb': grouped['peak_rss_mb'].max()})
+
+
+def get_scaling(summary: pd.DataFrame) -> dict:
+    """
+    Returns the scaling exponent of each benchmark: the slope of the log-log fit of the minimal wall time against
+    the number of segments (1 for linear scaling).
+    """
+    scaling = {}
+    for benchmark, df in summary.groupby(level='benchmark', sort=False):
+        n_segments = df.index.get_level_values('n_segments').to_numpy(dtype=np.float64)
+        if len(n_segments) > 1:
+            scaling[benchmark] = float(np.polyfit(np.log(n_segments), np.log(df['min_time']), 1)[0])
+    return scaling
+
+
+def get_environment() -> dict:
+    """
+    Returns the commit and versions that the results were measured with.
+    """
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    import networkx
+    import scipy
+    return {'commit': commit, 'date': time.strftime('%Y-%m-%dT%H:%M:%S'), 'machine': platform.machine(),
+            'processor': platform.processor(), 'python': platform.python_version(), 'numpy': np.__version__,
+            'pandas': pd.__version__, 'scipy': scipy.__version__, 'networkx': networkx.__version__}
+
+
+def print_results(results: dict) -> None:
+    """
+    Prints the scaling curves (minimal wall time per size) and the scaling exponent of each benchmark.
+    """
+    summary = pd.DataFrame(results['summary'])
+    curves = summary.pivot(index='n_segments', columns='benchmark', values='min_time')
+    print(f"Minimal wall time (s) at commit {results['environment']['commit']}:")
+    print(curves.to_string(float_format='{:.4f}'.format))
+    print("Scaling exponents (time ~ segments^k): " +
+          ', '.join(f'{benchmark} {k:.2f}' for benchmark, k in results['scaling'].items()))
+
+
+def compare_results(baseline: dict, results: dict) -> pd.DataFrame:
+    """
+    Compares the minimal wall times of two runs.
+
+    Returns:
+        pd.DataFrame: The minimal wall time of both runs and the speedup (baseline / results) of each benchmark and
+        size measured in both runs.
+    """
+    index = ['benchmark', 'n_segments']
+    times = pd.DataFrame(baseline['summary']).set_index(index)[['min_time']].join(
+        pd.DataFrame(results['summary']).set_index(index)[['min_time']], how='inner', lsuffix='_baseline')
+    times['speedup'] = times['min_time_baseline'] / times['min_time']
+    return times
+
+
+def main(argv: list[str] = None) -> None:
+    parser = argparse.ArgumentParser(description="Benchmarks of the currentscape calculator on synthetic trees.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help="Numbers of segments.")
+    parser.add_argument('--timepoints', type=int, default=10, help="Number of timepoints.")
+    parser.add_argument('--flip-rate', type=float, default=0.05,
+                        help="Sign changes of each membrane current per timepoint.")
+    parser.add_argument('--repeat', type=int, default=3, help="Measurements of each benchmark and size.")
+    parser.add_argument('--benchmarks', nargs='+', choices=list(BENCHMARKS), default=None)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--data-dir', default=None, help="Directory to save the synthetic input files to.")
+    parser.add_argument('--output', default=None,
+                        help="JSON file of the results. Defaults to 'benchmark_results/<commit>.json'.")
+    parser.add_argument('--compare', default=None, help="JSON file of a baseline run to compare with.")
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.sizes, args.timepoints, args.flip_rate, args.repeat, args.benchmarks, args.seed,
+                             args.data_dir)
+    print_results(results)
+
+    output = args.output
+    if output is None:
+        output = os.path.join('benchmark_results', f"{results['environment']['commit'] or 'results'}.json")
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w') as file:
+        json.dump(results, file, indent=2, default=to_json)
+    print("Benchmark results saved to " + output)
+
+    if args.compare is not None:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+        print(f"Speedup over commit {baseline['environment']['commit']}:")
+        print(compare_results(baseline, results).to_string(float_format='{:.4f}'.format))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,316 @@
+import os
+import sys
+import json
+import time
+import pickle
+import argparse
+import tempfile
+import numpy as np
+import pandas as pd
+
+from Instrumentation import to_json
+from benchmarks.synthetic_tree import SyntheticTree
+from benchmarks.reference import reference_preprocess
+from benchmarks.baseline import partitioning_algorithm as baseline
+from benchmarks.benchmark_calculator import get_environment
+from currentscape_calculator.partitioning_algorithm import partition_iax
+from preprocessor.Preprocessor import Preprocessor
+from preprocessor.utils.current_balance import get_current_balance
+
+
+def preprocess_currents(simulation_data: dict, axial_engine: str = 'voltage',
+                        precision: str = 'float64') -> tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Preprocesses the membrane and axial currents of the whole simulation with the `Preprocessor`.
+    """
+    preprocessor = Preprocessor(simulation_data, axial_engine=axial_engine, precision=precision)
+    return preprocessor.preprocess_membrane_currents(), preprocessor.preprocess_axial_currents()
+
+
+def preprocess_currents_accumulated(simulation_data: dict) -> tuple[pd.DataFrame, pd.DataFrame]:
+    return preprocess_currents(simulation_data, 'accumulated')
+
+
+def preprocess_currents_float32(simulation_data: dict) -> tuple[pd.DataFrame, pd.DataFrame]:
+    return preprocess_currents(simulation_data, precision='float32')
+
+
+# The partitioning strategies of the baseline
+BASELINE_STRATEGIES = ('type', 'region')
+
+
+def reference_partition_iax(im: pd.DataFrame, iax: pd.DataFrame, timepoints: list, target: str, partition_by: str,
+                            regions_list_directory: str) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Partitions the currents with the baseline `partition_iax` (see `benchmarks.baseline`), the reference of the
+    partitioning backends. The baseline selects the result columns by position, so the selected timepoints are
+    passed to it as the first columns and relabeled afterwards.
+    """
+    if not isinstance(partition_by, str) or partition_by not in BASELINE_STRATEGIES:
+        raise ValueError(f"The baseline partitioning only supports the strategies {', '.join(BASELINE_STRATEGIES)}.")
+    timepoints = list(timepoints)
+    positions = list(range(len(timepoints)))
+    im = im.loc[:, timepoints].set_axis(positions, axis=1)
+    iax = iax.loc[:, timepoints].set_axis(positions, axis=1)
+    part_pos, part_neg = baseline.partition_iax(im, iax, positions, target, partition_by, regions_list_directory)
+    return part_pos.set_axis(timepoints, axis=1), part_neg.set_axis(timepoints, axis=1)
+
+
+def partition_iax_float32(im: pd.DataFrame, iax: pd.DataFrame, *args) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Partitions the currents in single precision, as in production runs (see `Precision`).
+    """
+    return partition_iax(im.astype(np.float32), iax.astype(np.float32), *args)
+
+
+# Backends checked against the baseline partitioning (see `reference_partition_iax`) and the reference preprocessing
+# of `benchmarks.reference`. A partitioning backend has the
+# signature of `partition_iax` (returning the positive and negative currents of the target), a preprocessing backend
+# takes the simulation data and returns the merged membrane and axial currents. Faster engines are added here.
+PARTITION_BACKENDS = {'partition_iax': partition_iax, 'partition_iax_float32': partition_iax_float32}
+PREPROCESS_BACKENDS = {'preprocessor': preprocess_currents, 'accumulated_iax': preprocess_currents_accumulated,
+                       'preprocessor_float32': preprocess_currents_float32}
+
+
+class EquivalenceHarness:
+    """
+    Checks that the backends of the partitioning and preprocessing reproduce the reference implementations, and
+    measures their speedup over the references in the same run.
+
+    Each input is processed by the reference and by every backend. The checks compare
+        - the merged membrane ('im') and axial ('iax') currents of the preprocessing backends,
+        - the positive and negative currents of the target ('part_pos', 'part_neg') of the partitioning backends,
+    to the reference results, and require that the backends balance the currents at least as well as the reference:
+        - 'kirchhoff': the membrane current of every node equals the axial current flowing into it from its parent
+          minus the axial currents flowing on to its children,
+        - 'partition_balance': the currents attributed to the target sum to its own membrane current plus the axial
+          currents flowing into it.
+    A check passes if its maximal absolute error is at most `atol + rtol * scale`, where the scale is the maximal
+    absolute reference value (for the balance checks: the maximal absolute axial current, and the error is the
+    excess over the reference imbalance).
+
+    Attributes:
+        rtol (float): The tolerance relative to the scale of the compared values.
+        atol (float): The absolute tolerance (nA).
+        partition_backends (dict): The partitioning backends, by name.
+        preprocess_backends (dict): The preprocessing backends, by name.
+        checks (list[dict]): The result of each check.
+        timings (list[dict]): The run time of the reference and each backend on each input.
+    """
+    def __init__(self, rtol: float = 1e-5, atol: float = 1e-9, partition_backends: dict = None,
+                 preprocess_backends: dict = None) -> None:
+        self.rtol = rtol
+        self.atol = atol
+        self.partition_backends = PARTITION_BACKENDS if partition_backends is None else partition_backends
+        self.preprocess_backends = PREPROCESS_BACKENDS if preprocess_backends is None else preprocess_backends
+        self.checks = []
+        self.timings = []
+
+    def check_preprocessing(self, name: str, simulation_data: dict) -> None:
+        """
+        Checks the preprocessing backends on the simulation data of an input.
+        """
+        (im_ref, iax_ref), reference_time = timed(reference_preprocess, simulation_data)
+        reference_balance = get_current_balance(im_ref, iax_ref)
+        for backend, function in self.preprocess_backends.items():
+            (im, iax), backend_time = timed(function, simulation_data)
+            labels = {'input': name, 'operation': 'preprocess', 'backend': backend}
+            self._add_timing(labels, reference_time, backend_time)
+            self._compare(labels, 'im', im_ref, im)
+            self._compare(labels, 'iax', iax_ref, iax)
+            self._compare_balance(labels, 'kirchhoff', reference_balance, get_current_balance(im, iax),
+                                  scale=np.abs(iax_ref.to_numpy()).max())
+
+    def check_partitioning(self, name: str, im: pd.DataFrame, iax: pd.DataFrame, timepoints: list, target: str,
+                           partition_by: str, regions_list_directory: str) -> None:
+        """
+        Checks the partitioning backends on the merged currents of an input.
+        """
+        args = (timepoints, target, partition_by, regions_list_directory)
+        (pos_ref, neg_ref), reference_time = timed(reference_partition_iax, im.copy(), iax.copy(), *args)
+        reference_balance = get_partition_balance(pos_ref, neg_ref, im, iax, target)
+        for backend, function in self.partition_backends.items():
+            (pos, neg), backend_time = timed(function, im.copy(), iax.copy(), *args)
+            labels = {'input': name, 'operation': f'partition {target} by {partition_by}', 'backend': backend}
+            self._add_timing(labels, reference_time, backend_time)
+            self._compare(labels, 'part_pos', pos_ref, pos)
+            self._compare(labels, 'part_neg', neg_ref, neg)
+            self._compare_balance(labels, 'partition_balance', reference_balance,
+                                  get_partition_balance(pos, neg, im, iax, target),
+                                  scale=np.abs(iax.loc[:, list(timepoints)].to_numpy()).max())
+
+    def report(self) -> tuple[pd.DataFrame, pd.DataFrame]:
+        """
+        Returns the checks and the timings (with the speedup of each backend over the reference) as DataFrames.
+        """
+        return pd.DataFrame(self.checks), pd.DataFrame(self.timings)
+
+    @property
+    def passed(self) -> bool:
+        return all(check['passed'] for check in self.checks)
+
+    def _compare(self, labels: dict, check: str, reference: pd.DataFrame, result: pd.DataFrame) -> None:
+        # Rows missing from one of the results are zero (e.g. rows of current types absent from a segment)
+        index = reference.index.union(result.index)
+        columns = reference.columns.union(result.columns)
+        reference = reference.reindex(index=index, columns=columns, fill_value=0.0).to_numpy(dtype=np.float64)
+        result = result.reindex(index=index, columns=columns, fill_value=0.0).to_numpy(dtype=np.float64)
+        error = np.abs(result - reference).max(initial=0.0)
+        self._add_check(labels, check, error, np.abs(reference).max(initial=0.0))
+
+    def _compare_balance(self, labels: dict, check: str, reference: pd.DataFrame, result: pd.DataFrame,
+                         scale: float) -> None:
+        # Only the imbalance exceeding the imbalance of the reference is an error of the backend
+        excess = np.abs(result.to_numpy()).max(initial=0.0) - np.abs(reference.to_numpy()).max(initial=0.0)
+        self._add_check(labels, check, max(excess, 0.0), scale)
+
+    def _add_check(self, labels: dict, check: str, error: float, scale: float) -> None:
+        tolerance = self.atol + self.rtol * scale
+        self.checks.append(dict(labels, check=check, max_abs_error=error,
+                                max_rel_error=error / scale if scale > 0 else 0.0, tolerance=tolerance,
+                                passed=bool(error <= tolerance)))
+
+    def _add_timing(self, labels: dict, reference_time: float, backend_time: float) -> None:
+        self.timings.append(dict(labels, reference_time=reference_time, time=backend_time,
+                                 speedup=reference_time / backend_time if backend_time > 0 else np.inf))
+
+
+def get_partition_balance(part_pos: pd.DataFrame, part_neg: pd.DataFrame, im: pd.DataFrame, iax: pd.DataFrame,
+                          target: str) -> pd.DataFrame:
+    """
+    Returns the difference between the currents attributed to the target and its own membrane current plus the axial
+    currents flowing into it, at each timepoint (nA).
+    """
+    timepoints = list(part_pos.columns)
+    im = im.loc[:, timepoints]
+    iax = iax.loc[:, timepoints]
+    if target != 'soma':
+        im = baseline.merge_dendritic_section_imembrane(im, target)
+        iax = baseline.merge_dendritic_section_iax(iax, target)
+    own = im.loc[target].sum()
+    # Axial currents of (ref, par) flow from par into ref
+    refs = iax.index.get_level_values('ref')
+    pars = iax.index.get_level_values('par')
+    inflow = iax[refs == target].sum() - iax[pars == target].sum()
+    attributed = part_pos.sum() + part_neg.sum()
+    return (attributed - own + inflow).to_frame().T
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+
+def load_recorded_currents(output_dir: str, max_timepoints: int = None) -> tuple[pd.DataFrame, pd.DataFrame, list]:
+    """
+    Loads the preprocessed currents of a `CurrentscapePipeline` output directory ('preprocessed/im.csv' and
+    'preprocessed/iax.csv').
+
+    Returns:
+        tuple[pd.DataFrame, pd.DataFrame, list]: The membrane and axial currents and the timepoints to check: all
+        columns, or `max_timepoints` evenly spaced columns.
+    """
+    currents = []
+    for name in ('im.csv', 'iax.csv'):
+        df = pd.read_csv(os.path.join(output_dir, 'preprocessed', name), index_col=[0, 1])
+        df.columns = df.columns.astype(int)
+        currents.append(df)
+    im, iax = currents
+    timepoints = list(im.columns)
+    if max_timepoints is not None and len(timepoints) > max_timepoints:
+        timepoints = [timepoints[i] for i in np.linspace(0, len(timepoints) - 1, max_timepoints).astype(int)]
+    return im, iax, timepoints
+
+
+def run_equivalence(sizes: list[int] = (1000, 5000), n_timepoints: int = 20, flip_rate: float = 0.05,
+                    seed: int = 0, recorded: list[str] = (), simulation_data: list[str] = (),
+                    strategies: list[str] = ('type', 'region'), max_timepoints: int = 50, rtol: float = 1e-5,
+                    atol: float = 1e-9) -> EquivalenceHarness:
+    """
+    Runs the equivalence checks on synthetic and recorded inputs.
+
+    Args:
+        sizes (list[int]): The numbers of segments of the synthetic trees (see `SyntheticTree`). Their raw
+            simulation data is preprocessed, and their currents are partitioned towards the soma and towards the
+            deepest section.
+        n_timepoints (int): The number of timepoints of the synthetic currents.
+        flip_rate (float): The approximate number of sign changes of each synthetic membrane current per timepoint.
+        seed (int): The seed of the synthetic trees.
+        recorded (list[str]): `CurrentscapePipeline` output directories, whose preprocessed currents are partitioned
+            towards the soma with the region list of the model.
+        simulation_data (list[str]): Pickled simulation data (as returned by `ModelSimulator.run_simulation`) to
+            preprocess.
+        strategies (list[str]): The partitioning strategies to check.
+        max_timepoints (int): The maximal number of timepoints of a recorded input that are partitioned.
+        rtol, atol (float): The tolerances of the checks (see `EquivalenceHarness`).
+
+    Returns:
+        EquivalenceHarness: The harness with the results of all checks.
+    """
+    harness = EquivalenceHarness(rtol, atol)
+    with tempfile.TemporaryDirectory() as region_dir:
+        for n_segments in sizes:
+            name = f'synthetic_{n_segments}'
+            tree = SyntheticTree(n_segments, n_timepoints, flip_rate, seed=seed)
+            tree.save_regions(os.path.join(region_dir, name))
+            print(f"Checking {name}")
+            harness.check_preprocessing(name, tree.get_simulation_data())
+            for target in ('soma', tree.deepest_section()):
+                for strategy in strategies:
+                    harness.check_partitioning(name, tree.im, tree.iax, list(tree.im.columns), target, strategy,
+                                               os.path.join(region_dir, name))
+
+    for output_dir in recorded:
+        print(f"Checking {output_dir}")
+        im, iax, timepoints = load_recorded_currents(output_dir, max_timepoints)
+        for strategy in strategies:
+            harness.check_partitioning(output_dir, im, iax, timepoints, 'soma', strategy,
+                                       os.path.join('currentscape_calculator', 'region_list'))
+
+    for path in simulation_data:
+        print(f"Checking {path}")
+        with open(path, 'rb') as file:
+            harness.check_preprocessing(path, pickle.load(file))
+    return harness
+
+
+def main(argv: list[str] = None) -> None:
+    parser = argparse.ArgumentParser(description="Checks the partitioning and preprocessing backends against the "
+                                                 "reference implementations and measures their speedup.")
+    parser.add_argument('--sizes', type=int, nargs='*', default=[1000, 5000],
+                        help="Numbers of segments of the synthetic trees.")
+    parser.add_argument('--timepoints', type=int, default=20, help="Number of synthetic timepoints.")
+    parser.add_argument('--flip-rate', type=float, default=0.05,
+                        help="Sign changes of each synthetic membrane current per timepoint.")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--recorded', nargs='*', default=[], help="Pipeline output directories to check.")
+    parser.add_argument('--simulation-data', nargs='*', default=[], help="Pickled simulation data to check.")
+    parser.add_argument('--strategies', nargs='+', default=list(BASELINE_STRATEGIES), choices=BASELINE_STRATEGIES)
+    parser.add_argument('--max-timepoints', type=int, default=50,
+                        help="Maximal number of partitioned timepoints of a recorded input.")
+    parser.add_argument('--rtol', type=float, default=1e-5)
+    parser.add_argument('--atol', type=float, default=1e-9)
+    parser.add_argument('--output', default=None, help="JSON file of the results.")
+    args = parser.parse_args(argv)
+
+    harness = run_equivalence(args.sizes, args.timepoints, args.flip_rate, args.seed, args.recorded,
+                              args.simulation_data, args.strategies, args.max_timepoints, args.rtol, args.atol)
+    checks, timings = harness.report()
+    print(checks.to_string(index=False, float_format='{:.3g}'.format))
+    print(timings.to_string(index=False, float_format='{:.3g}'.format))
+    failed = checks[~checks['passed']]
+    print(f"{len(checks) - len(failed)}/{len(checks)} checks passed")
+
+    if args.output is not None:
+        with open(args.output, 'w') as file:
+            json.dump({'environment': get_environment(), 'rtol': args.rtol, 'atol': args.atol,
+                       'checks': checks.to_dict(orient='records'), 'timings': timings.to_dict(orient='records')},
+                      file, indent=2, default=to_json)
+        print("Equivalence results saved to " + args.output)
+    if not harness.passed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
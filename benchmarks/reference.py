@@ -0,0 +1,66 @@
+import numpy as np
+import pandas as pd
+
+# Golden reference implementations of the preprocessing.
+#
+# They compute the same results as the `Preprocessor` did when the equivalence harness was introduced, written as
+# plainly as possible (one connection and current type at a time, on labeled pandas data) and independent of the
+# optimized code paths, which they are checked against (see `benchmarks.equivalence`). They are not meant to be fast
+# and should only change if the intended results change. The reference of the partitioning is the baseline code
+# itself (see `benchmarks.baseline`).
+
+
+def reference_preprocess(simulation_data: dict, timepoints: np.ndarray = None) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Reference of the `Preprocessor`: returns the membrane currents (nA) indexed by (segment, itype) and the axial
+    currents indexed by (ref, par), with the soma merged into a single 'soma' node.
+    """
+    columns = np.arange(len(simulation_data['taxis'])) if timepoints is None else np.asarray(timepoints)
+    return (reference_membrane_currents(simulation_data, columns),
+            reference_axial_currents(simulation_data, columns))
+
+
+def reference_membrane_currents(simulation_data: dict, columns: np.ndarray) -> pd.DataFrame:
+    """
+    Reference of `MembraneCurrentPreprocessor`: converts the intrinsic current densities to nA with the segment
+    areas, sums the synaptic currents of each segment, and sums the soma segments into the 'soma' node.
+    """
+    areas = simulation_data['areas'].iloc[:, 0]
+    rows = []
+    for data, is_density in ((simulation_data['intrinsic_data'], True),
+                             (simulation_data['synaptic_data'], False)):
+        segments, values = data
+        for itype in segments:
+            df = pd.DataFrame(np.asarray(values[itype])[:, columns], columns=columns)
+            if is_density:
+                df = df.mul(areas.loc[segments[itype]].to_numpy() * 0.01, axis=0)
+            df['segment'] = np.where(pd.Series(segments[itype]).str.startswith('soma('), 'soma', segments[itype])
+            df['itype'] = itype
+            rows.append(df)
+    im = pd.concat(rows).groupby(['segment', 'itype'], sort=False).sum()
+    return im.unstack(fill_value=0.0).stack(future_stack=True).fillna(0.0)
+
+
+def reference_axial_currents(simulation_data: dict, columns: np.ndarray) -> pd.DataFrame:
+    """
+    Reference of `AxialCurrentPreprocessor`: calculates the axial current of each connection from the membrane
+    potentials, (v_par - v_ref) / ri, and connects the sections attached to the soma to the 'soma' node.
+    """
+    segments, v = simulation_data['membrane_potential_data']
+    v = pd.DataFrame(np.asarray(v)[:, columns], columns=columns)
+    v = v.groupby(np.asarray(segments), sort=False).first()
+
+    rows = []
+    index = []
+    for ref, par, ri in simulation_data['connections'].itertuples(index=False):
+        ref_soma = ref.startswith('soma(')
+        par_soma = par.startswith('soma(')
+        if ref_soma:
+            continue  # connections within the soma and of the soma to its parent
+        if ref in v.index and par in v.index:
+            values = (v.loc[par] - v.loc[ref]) / ri
+        else:
+            values = pd.Series(0.0, index=columns)
+        index.append((ref, 'soma' if par_soma else par))
+        rows.append(values.to_numpy())
+    return pd.DataFrame(rows, index=pd.MultiIndex.from_tuples(index, names=['ref', 'par']), columns=columns)
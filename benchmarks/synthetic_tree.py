@@ -0,0 +1,320 @@
+import os
+import numpy as np
+import pandas as pd
+
+from currentscape_calculator.grouping import REGION_NAMES, CURRENT_CATEGORIES
+
+# Sections attached to the soma in the CA1 model, with their number of segments and the soma segment they are
+# connected to (see `AxialCurrentPreprocessor.merge_soma_iax`). Only the dendritic stems branch.
+STEMS = {'dend1_0': (1, 'soma(1)'), 'dend2_0': (1, 'soma(0.833333)'), 'dend3_0': (1, 'soma(0.5)'),
+         'dend4_0': (3, 'soma(1)'), 'dend5_0': (3, 'soma(1)'), 'hill': (3, 'soma(0.5)')}
+SOMA_NSEG = 3
+
+# Membrane current types and the mean of their normalized waveform: inward (negative) for sodium, calcium and
+# excitatory synaptic currents, outward (positive) for potassium and inhibitory currents
+CURRENT_BIAS = {'capacitive': 0.0, 'passive': 0.0, 'nax': -0.5, 'nad': -0.5, 'car': -0.3, 'kdr': 0.5, 'kap': 0.5,
+                'kad': 0.5, 'kslow': 0.3, 'AMPA': -0.5, 'NMDA': -0.5, 'GABA': 0.3, 'GABA_B': 0.3}
+
+# Number of segments of a section (odd, as set by the d_lambda rule)
+NSEG_CHOICES = [1, 3, 5, 7, 9]
+
+
+class SyntheticTree:
+    """
+    Random binary dendritic tree with synthetic membrane and axial currents in the input format of
+    `CurrentscapeCalculator`, to measure the calculator without running NEURON.
+
+    The tree starts with the sections attached to the soma of the CA1 model and grows by splitting a random terminal
+    dendritic section into two child sections, named like the branches of the model ('dend5_0' -> 'dend5_00',
+    'dend5_01'), until it has `n_segments` segments. Nodes and edges follow the preprocessed NEURON data: the first
+    segment of a section is connected to the end node ('(1)') of its parent section, or to the merged 'soma' node
+    for the stems. The raw simulation data that the preprocessor turns into these currents is created by
+    `get_simulation_data`.
+
+    Each membrane current of each segment is a sine wave around a current-type specific bias (e.g. inward sodium
+    and outward potassium currents), with a random amplitude and phase, so that it changes sign about `flip_rate`
+    times per timepoint. Synaptic currents are only present in a random fraction of the segments. The axial current
+    of each edge is the total membrane current of the subtree beyond the edge, so the currents are balanced at
+    every node.
+
+    Attributes:
+        n_segments (int): The number of segments (without the section end nodes and the soma).
+        n_timepoints (int): The number of timepoints.
+        flip_rate (float): The approximate number of sign changes of each membrane current per timepoint.
+        synapse_fraction (float): The fraction of segments with synaptic currents.
+        seed (int): The seed of the random tree and currents.
+        sections (list[str]): The section names, parents before children.
+        parents (dict): The parent section of each section ('soma' for the stems).
+        nodes (list[str]): The node names: 'soma', then the segments and end node of each section.
+        node_parents (np.ndarray): The index in `nodes` of the parent of each node (-1 for 'soma').
+        im (pd.DataFrame): Membrane currents indexed by (segment, itype), one column per timepoint, for every node
+            and itype (as preprocessed; the rows of the section end nodes are zero).
+        iax (pd.DataFrame): Axial currents indexed by (ref, par), one column per timepoint.
+    """
+    def __init__(self, n_segments: int, n_timepoints: int = 20, flip_rate: float = 0.05,
+                 synapse_fraction: float = 0.1, seed: int = 0) -> None:
+        self.n_segments = n_segments
+        self.n_timepoints = n_timepoints
+        self.flip_rate = flip_rate
+        self.synapse_fraction = synapse_fraction
+        self.seed = seed
+        rng = np.random.default_rng(seed)
+        self.sections, self.parents, nsegs = grow_binary_tree(n_segments, rng)
+        self.nodes, self.node_parents, segment_nodes = get_section_nodes(self.sections, self.parents, nsegs)
+        self.im = self._get_membrane_currents(segment_nodes, rng)
+        self.iax = self._get_axial_currents()
+
+    @property
+    def taxis(self) -> np.ndarray:
+        return np.arange(self.n_timepoints) * 0.025
+
+    @property
+    def depth(self) -> int:
+        """
+        The number of sections on the longest path from the soma.
+        """
+        depths = {'soma': 0}
+        for section in self.sections:
+            depths[section] = depths[self.parents[section]] + 1
+        return max(depths.values())
+
+    def deepest_section(self) -> str:
+        """
+        Returns the terminal section farthest from the soma (e.g. the target of a re-rooting benchmark).
+        """
+        return max(self.sections, key=lambda section: (len(section), section))
+
+    def save(self, directory: str) -> dict:
+        """
+        Saves the currents as 'im.csv' and 'iax.csv' (as saved by the preprocessor) and a region list directory
+        ('region_list') that assigns the basal stems to 'basal', the axon hillock to 'axon' and the branches of the
+        apical stem to 'oblique_trunk' or 'distal' by their depth.
+
+        Returns:
+            dict: The paths of the 'im', 'iax' and 'region_list' files.
+        """
+        os.makedirs(directory, exist_ok=True)
+        paths = {'im': os.path.join(directory, 'im.csv'), 'iax': os.path.join(directory, 'iax.csv'),
+                 'region_list': os.path.join(directory, 'region_list')}
+        self.im.to_csv(paths['im'])
+        self.iax.to_csv(paths['iax'])
+        self.save_regions(paths['region_list'])
+        return paths
+
+    def save_regions(self, directory: str) -> None:
+        """
+        Saves the region list directory (a '<region>.txt' file listing the sections of each region).
+        """
+        os.makedirs(directory, exist_ok=True)
+        for region, sections in self.get_regions().items():
+            with open(os.path.join(directory, region + '.txt'), 'w') as file:
+                file.write('\n'.join(sections))
+
+    def get_regions(self) -> dict:
+        """
+        Returns the sections of each region of `REGION_NAMES`.
+        """
+        regions = {region: [] for region in REGION_NAMES}
+        regions['soma'].append('soma')
+        half_depth = max(1, self.depth // 2)
+        for section in self.sections:
+            if section == 'hill':
+                regions['axon'].append(section)
+            elif not section.startswith('dend5_'):
+                regions['basal'].append(section)
+            elif len(section) - len('dend5_') <= half_depth:
+                regions['oblique_trunk'].append(section)
+            else:
+                regions['distal'].append(section)
+        return regions
+
+    def get_simulation_data(self, seed: int = None) -> dict:
+        """
+        Creates the raw simulation data (as returned by `ModelSimulator.run_simulation`) that the `Preprocessor`
+        turns into `im` and `iax`.
+
+        The soma is split into its segments and all sections get their 0 and 1 end nodes, as recorded from the CA1
+        model. Intrinsic currents are densities (mA/cm2) of random segment areas, with zero-area end nodes, and the
+        synaptic currents of a segment are split over one to three synapses. The membrane potentials are integrated
+        from the soma along the axial currents with random axial resistances, so `calculate_axial_currents` recovers
+        `iax`.
+
+        Args:
+            seed (int or None): The seed of the areas, axial resistances and synapses. Defaults to `seed` + 1.
+
+        Returns:
+            dict: The 'membrane_potential_data', 'intrinsic_data', 'synaptic_data', 'connections', 'areas' and
+            'taxis' of the simulation.
+        """
+        rng = np.random.default_rng(self.seed + 1 if seed is None else seed)
+        soma_segments = [f'soma({(k + 0.5) / SOMA_NSEG:g})' for k in range(SOMA_NSEG)]
+        soma_nodes = ['soma(0)'] + soma_segments + ['soma(1)']
+
+        # Raw node of each tree node, and the 0 end node of each section (not connected, as in the recordings)
+        names = np.asarray(self.nodes, dtype=object)
+        sections = np.array([node.split('(')[0] for node in self.nodes], dtype=object)
+        first = np.flatnonzero(sections[1:] != sections[:-1]) + 1
+        raw_names = np.insert(names[1:], first - 1, [f'{section}(0)' for section in sections[first]])
+        raw_names = np.concatenate((soma_nodes, raw_names))
+        n_raw = len(raw_names)
+        raw_rows = pd.Index(raw_names).get_indexer(names)  # -1 for the merged soma
+
+        # Axial resistances (MOhm) and membrane potentials (mV) along the axial currents, from the soma outwards
+        iax = self.iax.to_numpy()
+        ri = rng.lognormal(mean=np.log(0.05), sigma=0.5, size=len(self.nodes))
+        v = np.zeros((n_raw, self.n_timepoints))
+        v[:len(soma_nodes)] = -65 + 5 * np.sin(np.pi * self.flip_rate * np.arange(self.n_timepoints))
+        parent_rows = raw_rows[self.node_parents].copy()
+        stem_nodes = np.flatnonzero(self.node_parents == 0)
+        parent_rows[stem_nodes] = pd.Index(soma_nodes).get_indexer([STEMS[sections[node]][1] for node in stem_nodes])
+        for node in range(1, len(self.nodes)):
+            v[raw_rows[node]] = v[parent_rows[node]] - iax[node - 1] * ri[node]
+        end_rows = np.flatnonzero(pd.Series(raw_names).str.endswith('(0)').to_numpy())[1:]
+        v[end_rows] = v[parent_rows[first]]
+
+        connections = pd.DataFrame({
+            'ref': np.concatenate((soma_nodes[1:], raw_names[raw_rows[1:]])),
+            'par': np.concatenate((['None'], soma_nodes[1:-1], raw_names[parent_rows[1:]])),
+            'ri': np.concatenate(([-1.0], rng.lognormal(np.log(0.05), 0.5, size=SOMA_NSEG), ri[1:]))})
+
+        # Segment areas (um2), zero at the end nodes
+        is_end = pd.Series(raw_names).str.endswith(('(0)', '(1)')).to_numpy()
+        area = np.where(is_end, 0.0, rng.lognormal(mean=np.log(100), sigma=0.5, size=n_raw))
+        areas = pd.DataFrame({'area': area}, index=raw_names)
+
+        # Membrane currents (nA) of each raw node; the soma currents are split over the soma segments
+        im = pd.DataFrame(0.0, index=pd.MultiIndex.from_product([raw_names, self.im.index.levels[1]]),
+                          columns=self.im.columns)
+        tree_im = self.im.drop('soma', level='segment')
+        im.loc[list(zip(raw_names[raw_rows[pd.Index(self.nodes).get_indexer(tree_im.index.get_level_values(0))]],
+                        tree_im.index.get_level_values(1)))] = tree_im.to_numpy()
+        soma_im = self.im.loc['soma']
+        for segment in soma_segments:
+            im.loc[segment] = (soma_im / SOMA_NSEG).reindex(im.loc[segment].index).to_numpy()
+
+        intrinsic_segments, intrinsic_values = {}, {}
+        with np.errstate(divide='ignore', invalid='ignore'):
+            for itype in CURRENT_CATEGORIES['intrinsic']:
+                density = im.xs(itype, level=1).to_numpy() / (area[:, np.newaxis] * 0.01)
+                intrinsic_segments[itype] = raw_names
+                intrinsic_values[itype] = np.where(is_end[:, np.newaxis], rng.normal(size=density.shape), density)
+
+        synaptic_segments, synaptic_values = {}, {}
+        for itype in CURRENT_CATEGORIES['synaptic']:
+            currents = im.xs(itype, level=1)
+            currents = currents[(currents != 0).any(axis=1)]
+            n_synapses = rng.integers(1, 4, size=len(currents))
+            rows = np.repeat(np.arange(len(currents)), n_synapses)
+            weights = rng.random(len(rows))
+            weights /= np.bincount(rows, weights)[rows]
+            synaptic_segments[itype] = currents.index.to_numpy()[rows]
+            synaptic_values[itype] = currents.to_numpy()[rows] * weights[:, np.newaxis]
+
+        return {'membrane_potential_data': [raw_names, v],
+                'intrinsic_data': [intrinsic_segments, intrinsic_values],
+                'synaptic_data': [synaptic_segments, synaptic_values],
+                'connections': connections,
+                'areas': areas,
+                'taxis': self.taxis}
+
+    def _get_membrane_currents(self, segment_nodes: np.ndarray, rng: np.random.Generator) -> pd.DataFrame:
+        itypes = CURRENT_CATEGORIES['intrinsic'] + CURRENT_CATEGORIES['synaptic']
+        nodes = np.concatenate(([0], segment_nodes))  # the soma and the segments, without the end nodes
+        shape = (len(nodes), len(itypes))
+
+        amplitude = rng.lognormal(mean=-3.0, sigma=1.0, size=shape)
+        synaptic = np.isin(itypes, CURRENT_CATEGORIES['synaptic'])
+        amplitude[:, synaptic] *= rng.random((len(nodes), 1)) < self.synapse_fraction
+        phase = rng.uniform(0, 2 * np.pi, size=shape)
+        bias = np.array([CURRENT_BIAS[itype] for itype in itypes])
+
+        # A sine wave with a period of 2 / flip_rate timepoints changes sign about flip_rate times per timepoint
+        t = np.arange(self.n_timepoints)
+        waveform = np.sin(np.pi * self.flip_rate * t + phase[..., np.newaxis]) + bias[:, np.newaxis]
+        values = amplitude[..., np.newaxis] * waveform
+
+        # All nodes and itypes, as preprocessed: the end nodes have no membrane and zero currents
+        node_values = np.zeros((len(self.nodes), len(itypes), self.n_timepoints))
+        node_values[nodes] = values.reshape(shape + (self.n_timepoints,))
+        multi_index = pd.MultiIndex.from_product([self.nodes, itypes], names=['segment', 'itype'])
+        return pd.DataFrame(data=node_values.reshape(-1, self.n_timepoints), index=multi_index, columns=t)
+
+    def _get_axial_currents(self) -> pd.DataFrame:
+        # Total membrane current of each node, accumulated from the leaves to the soma level by level
+        node_codes = pd.Index(self.nodes).get_indexer(self.im.index.get_level_values(0))
+        subtree = np.zeros((len(self.nodes), self.n_timepoints))
+        np.add.at(subtree, node_codes, self.im.to_numpy())
+        levels = get_node_levels(self.node_parents)
+        for level in range(levels.max(), 0, -1):
+            children = np.flatnonzero(levels == level)
+            np.add.at(subtree, self.node_parents[children], subtree[children])
+
+        children = np.arange(1, len(self.nodes))
+        names = np.asarray(self.nodes, dtype=object)
+        multi_index = pd.MultiIndex.from_arrays([names[children], names[self.node_parents[children]]],
+                                                names=['ref', 'par'])
+        return pd.DataFrame(data=subtree[children], index=multi_index, columns=self.im.columns)
+
+
+def grow_binary_tree(n_segments: int, rng: np.random.Generator) -> tuple[list[str], dict, dict]:
+    """
+    Grows a random binary tree from the stems by splitting random terminal sections until the tree has at least
+    `n_segments` segments.
+
+    Returns:
+        tuple[list[str], dict, dict]: The sections (parents before children), the parent of each section and the
+        number of segments of each section.
+    """
+    sections = list(STEMS)
+    parents = {stem: 'soma' for stem in STEMS}
+    nsegs = {stem: nseg for stem, (nseg, _) in STEMS.items()}
+    terminals = [stem for stem in STEMS if stem.startswith('dend')]
+    total = sum(nsegs.values())
+    while total < n_segments:
+        # Swap the split section with the last terminal, so it is removed in constant time
+        position = rng.integers(len(terminals))
+        terminals[position], terminals[-1] = terminals[-1], terminals[position]
+        section = terminals.pop()
+        for child in (section + '0', section + '1'):
+            sections.append(child)
+            parents[child] = section
+            nsegs[child] = int(rng.choice(NSEG_CHOICES))
+            terminals.append(child)
+            total += nsegs[child]
+    return sections, parents, nsegs
+
+
+def get_section_nodes(sections: list[str], parents: dict, nsegs: dict) -> tuple[list[str], np.ndarray, np.ndarray]:
+    """
+    Creates the nodes of the partitioning graph: the merged 'soma', and the segments and end node of each section.
+
+    Returns:
+        tuple[list[str], np.ndarray, np.ndarray]: The node names, the index of the parent of each node (-1 for the
+        soma) and the indexes of the segment nodes.
+    """
+    nodes = ['soma']
+    node_parents = [-1]
+    segment_nodes = []
+    end_nodes = {'soma': 0}
+    for section in sections:
+        parent = end_nodes[parents[section]]
+        for k in range(nsegs[section]):
+            nodes.append(f'{section}({(k + 0.5) / nsegs[section]:g})')
+            node_parents.append(parent)
+            parent = len(nodes) - 1
+            segment_nodes.append(parent)
+        nodes.append(f'{section}(1)')
+        node_parents.append(parent)
+        end_nodes[section] = len(nodes) - 1
+    return nodes, np.array(node_parents), np.array(segment_nodes)
+
+
+def get_node_levels(node_parents: np.ndarray) -> np.ndarray:
+    """
+    Returns the number of edges between each node and the root, for parent indexes where parents come before their
+    children.
+    """
+    levels = np.zeros(len(node_parents), dtype=np.int64)
+    for node in range(1, len(node_parents)):
+        levels[node] = levels[node_parents[node]] + 1
+    return levels
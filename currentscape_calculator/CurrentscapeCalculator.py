@@ -1,7 +1,18 @@
+import os
+import tempfile
 import pandas as pd
 import numpy as np
 
-from currentscape_calculator.partitioning_algorithm import partition_iax
+from typing import Union
+
+from Instrumentation import Instrumentation, nbytes
+from Precision import get_dtype
+from SegmentCatalog import SegmentCatalog
+from currentscape_calculator.partitioning_algorithm import partition_iax, partition_iax_approximate
+from currentscape_calculator.adaptive_resolution import partition_iax_adaptive
+from currentscape_calculator.coarse_graining import coarse_grain_currents, coarse_graining_error, parse_coarse_grain
+from currentscape_calculator.currentscape_store import CurrentscapeStore, ColumnChunkReader
+from currentscape_calculator.progress import ProgressReporter
 
 class CurrentscapeCalculator:
     """
@@ -13,11 +24,51 @@ class CurrentscapeCalculator:
         partitioning_strategy (str): Strategy for partitioning the data, either by "type" or "region".
         The directory path containing .txt files, where each file corresponds to neuronal sections
         that belong to the same region.
+        coarse_grain (str, int or None): Optional coarse-graining of the partitioning graph before partitioning.
+            'section' collapses every section into one node, an integer N collapses runs of N segments.
+            The target section is never collapsed.
+        validate_coarse_graining (bool): If True, the currentscape is also calculated at full resolution and the
+            error of the coarse-grained result is stored in `coarse_graining_error`.
+        tolerance (float or None): If given, the approximate partitioning is used: subtrees connected through axial
+            currents below the tolerance (nA) are folded into a 'residual' current type, and the error bound of each
+            timepoint is stored in `error_bound`.
+        adaptive_stride (int or None): If given, the adaptive temporal resolution is used: the currentscape is
+            calculated at every `adaptive_stride`-th timepoint and refined where it changes quickly, the remaining
+            timepoints are interpolated. The calculated timepoints are flagged in `exact_timepoints`.
+        adaptive_threshold (float): Change of the current shares (percentage points) above which the adaptive
+            resolution is refined.
+        instrumentation (Instrumentation): Measures loading and partitioning (disabled if not given).
+        progress_callback (callable or None): Called with the progress of the partitioning (completed timepoints,
+            throughput and ETA) at most every `progress_interval` seconds. See `currentscape_calculator.progress`.
+        progress_interval (float): The minimal number of seconds between two progress reports.
+        dtype (np.dtype): The type of the currents, set by the `precision` ('float32' or 'float64', see `Precision`).
+            The input files are read directly into this type and the currentscape is calculated in it.
+        catalog (SegmentCatalog or None): The catalog of the simulated model (`simulation_data['catalog']`), shared
+            by the partitioning. If None, a catalog is created from the currents of each calculation.
     """
-    def __init__(self, target: str, partitioning_strategy: str, regions_list_directory: str) -> None:
+    def __init__(self, target: str, partitioning_strategy: str, regions_list_directory: str,
+                 coarse_grain: Union[str, int] = None, validate_coarse_graining: bool = False,
+                 tolerance: float = None, adaptive_stride: int = None, adaptive_threshold: float = 5.0,
+                 instrumentation: Instrumentation = None, progress_callback=None,
+                 progress_interval: float = 10.0, precision: str = 'float64',
+                 catalog: SegmentCatalog = None) -> None:
         self.target = target
         self.partitioning_strategy = partitioning_strategy
         self.regions_list_directory = regions_list_directory
+        self.coarse_grain = coarse_grain
+        self.validate_coarse_graining = validate_coarse_graining
+        self.coarse_graining_error = None
+        self.tolerance = tolerance
+        self.error_bound = None
+        self.adaptive_stride = adaptive_stride
+        self.adaptive_threshold = adaptive_threshold
+        self.exact_timepoints = None
+        self.instrumentation = instrumentation if instrumentation is not None else Instrumentation(enabled=False)
+        self.progress_callback = progress_callback
+        self.progress_interval = progress_interval
+        self.progress = None
+        self.dtype = get_dtype(precision)
+        self.catalog = catalog
 
     def calculate_currentscape(self, iax: str, im: str, taxis: np.array, tmin: int, tmax: int):
         """
@@ -43,23 +94,220 @@ class CurrentscapeCalculator:
 
         print("Calculating currentscape...")
         # Load data for the given pair of files
-        df_iax = pd.read_csv(iax, index_col=[0,1])
-        df_iax.columns = df_iax.columns.astype(int)
-        df_im = pd.read_csv(im, index_col=[0,1])
-        df_im.columns = df_im.columns.astype(int)
+        with self.instrumentation.stage('load_inputs') as metrics:
+            df_iax = read_csv_columns(iax, dtype=self.dtype)
+            df_im = read_csv_columns(im, dtype=self.dtype)
+            metrics['input_bytes'] = nbytes(df_iax, df_im)
 
-        if self.partitioning_strategy == 'type':
-            df_im.sort_index(axis=0, level=(0, 1), inplace=True)
+        segment_indexes = self.get_timepoints(taxis, tmin, tmax, df_im.columns)
+        self.start_progress(len(segment_indexes))
+        im_part_pos, im_part_neg = self.calculate_from_frames(df_im, df_iax, segment_indexes)
+        self.finish_progress()
+        return im_part_pos, im_part_neg
+
+    def calculate_currentscape_streaming(self, iax: str, im: str, taxis: np.array, tmin: int, tmax: int,
+                                         output_dir: str, chunk_size: int = 500) -> tuple[pd.DataFrame, pd.DataFrame]:
+        """
+        Calculates the currentscape in time chunks with bounded memory.
+
+        The membrane and axial currents are parsed once and kept on disk in timepoint-major binary files (see
+        `ColumnChunkReader`), from which they are read chunk by chunk (only the columns of the chunk are kept in
+        memory). Each chunk is partitioned on its own and the results are appended to a `CurrentscapeStore` in
+        `output_dir`. Peak memory is therefore set by `chunk_size` and not by the length of the traces.
+
+        Args:
+            iax (str): Path to the axial current CSV file (see `calculate_currentscape`).
+            im (str): Path to the membrane current CSV file (see `calculate_currentscape`).
+            taxis (np.array): Array containing time values corresponding to the currents data.
+            tmin (int): Minimum time value for the selected time interval.
+            tmax (int): Maximum time value for the selected time interval.
+            output_dir (str): Directory of the output store.
+            chunk_size (int): The number of timepoints partitioned at once.
+
+        Returns:
+            Tuple: The positive and negative currentscape (im_part_pos, im_part_neg), memory-mapped from the store.
+        """
+        print("Calculating currentscape in chunks...")
+        os.makedirs(output_dir, exist_ok=True)
+        with tempfile.TemporaryDirectory(dir=output_dir) as input_dir:
+            with self.instrumentation.stage('convert_inputs'):
+                iax_reader = ColumnChunkReader(iax, input_dir, self.dtype)
+                im_reader = ColumnChunkReader(im, input_dir, self.dtype)
+            return self._calculate_chunks(iax_reader, im_reader, taxis, tmin, tmax, output_dir, chunk_size)
+
+    def _calculate_chunks(self, iax_reader: ColumnChunkReader, im_reader: ColumnChunkReader, taxis: np.array,
+                          tmin: int, tmax: int, output_dir: str, chunk_size: int) -> tuple[pd.DataFrame, pd.DataFrame]:
+        """
+        Partitions the chunks of timepoints read from the converted inputs (see `calculate_currentscape_streaming`).
+        """
+        segment_indexes = self.get_timepoints(taxis, tmin, tmax, im_reader.columns)
+        store = CurrentscapeStore(output_dir, segment_indexes)
+        self.start_progress(len(segment_indexes))
 
+        diagnostics = {'coarse_graining_error': [], 'error_bound': [], 'exact_timepoints': []}
+        for start in range(0, len(segment_indexes), chunk_size):
+            chunk = segment_indexes[start:start + chunk_size]
+            for name in diagnostics:
+                setattr(self, name, None)
+            print(f"Partitioning timepoints {chunk[0]}-{chunk[-1]}")
+            with self.instrumentation.stage('load_inputs') as metrics:
+                df_iax = iax_reader.read(chunk)
+                df_im = im_reader.read(chunk)
+                metrics['input_bytes'] = nbytes(df_iax, df_im)
+            im_part_pos, im_part_neg = self.calculate_from_frames(df_im, df_iax, chunk)
+            with self.instrumentation.stage('store'):
+                store.append(im_part_pos, im_part_neg)
+            del df_iax, df_im, im_part_pos, im_part_neg
+
+            for name, chunks in diagnostics.items():
+                if getattr(self, name) is not None:
+                    chunks.append(getattr(self, name))
+        for name, chunks in diagnostics.items():
+            setattr(self, name, pd.concat(chunks) if chunks else None)
+        self.finish_progress()
+        return store.load()
+
+    def start_progress(self, n_timepoints: int) -> None:
+        """
+        Creates the progress reporter of a calculation of `n_timepoints` timepoints, if a callback is registered.
+        """
+        self.progress = None
+        if self.progress_callback is not None:
+            self.progress = ProgressReporter(self.progress_callback, self.progress_interval)
+            self.progress.expect(n_timepoints)
+
+    def finish_progress(self) -> None:
+        """
+        Reports the final progress of the calculation.
+        """
+        if self.progress is not None:
+            self.progress.finish()
+            self.progress = None
+
+    def get_timepoints(self, taxis: np.array, tmin: int, tmax: int, columns: pd.Index) -> list:
+        """
+        Returns the timepoints (column labels) of the selected time interval.
+
+        The columns of the current files are labeled by their index on the time axis, so files preprocessed for an
+        analysis window only contain the columns of the window.
+        """
         # if no timepoints is selected, we perform the partitioning on the whole dataframe
         if tmin and tmax is None:
-            t_max = df_im.shape[1]
-            segment_indexes = list(range(t_max))
+            segment_indexes = list(columns)
         else:
             segment_indexes = np.flatnonzero((taxis > tmin) & (taxis < tmax))
+            missing = np.setdiff1d(segment_indexes, columns)
+            if len(missing) > 0:
+                raise ValueError(f"The current files do not contain {len(missing)} timepoints of the selected "
+                                 f"interval ({tmin}, {tmax}) ms. Preprocess them with the same analysis window.")
+        return segment_indexes
 
-        # Perform the partitioning
-        im_part_pos, im_part_neg = partition_iax(df_im, df_iax, timepoints=segment_indexes, target=self.target,
-                                                 partition_by=self.partitioning_strategy,
-                                                 regions_list_directory=self.regions_list_directory)
+    def calculate_from_frames(self, df_im: pd.DataFrame, df_iax: pd.DataFrame,
+                              segment_indexes: list) -> tuple[pd.DataFrame, pd.DataFrame]:
+        """
+        Calculates the currentscape from membrane and axial current DataFrames, applying the optional
+        coarse-graining.
+
+        Args:
+            df_im (pd.DataFrame): Membrane currents indexed by (segment, itype).
+            df_iax (pd.DataFrame): Axial currents indexed by (ref, par).
+            segment_indexes (list): The timepoints to partition.
+
+        Returns:
+            Tuple: The positive and negative currentscape (im_part_pos, im_part_neg).
+        """
+        if any(dtype != self.dtype for dtype in (*df_im.dtypes, *df_iax.dtypes)):
+            df_im = df_im.astype(self.dtype)
+            df_iax = df_iax.astype(self.dtype)
+        if isinstance(self.partitioning_strategy, str) and self.partitioning_strategy == 'type':
+            df_im.sort_index(axis=0, level=(0, 1), inplace=True)
+
+        if self.coarse_grain is None:
+            # Perform the partitioning
+            im_part_pos, im_part_neg = self.partition(df_im, df_iax, segment_indexes)
+            return im_part_pos, im_part_neg
+
+        # Perform the partitioning on the coarse-grained graph
+        run_length = parse_coarse_grain(self.coarse_grain)
+        keep = {'soma', self.target.split('(')[0]}
+        df_im_coarse, df_iax_coarse = coarse_grain_currents(df_im, df_iax, run_length, keep)
+        print(f"Coarse-grained partitioning graph: {df_iax.shape[0]} -> {df_iax_coarse.shape[0]} edges")
+        im_part_pos, im_part_neg = self.partition(df_im_coarse, df_iax_coarse, segment_indexes)
+
+        if self.validate_coarse_graining:
+            im_part_pos_full, im_part_neg_full = self.partition(df_im, df_iax, segment_indexes, exact=True)
+            self.coarse_graining_error = coarse_graining_error(im_part_pos, im_part_neg,
+                                                              im_part_pos_full, im_part_neg_full)
+            print("Maximal coarse-graining error of current shares (%): "
+                  f"{self.coarse_graining_error['share_error_pos'].max():.3g} (positive), "
+                  f"{self.coarse_graining_error['share_error_neg'].max():.3g} (negative)")
         return im_part_pos, im_part_neg
+
+    def partition(self, df_im: pd.DataFrame, df_iax: pd.DataFrame, segment_indexes: list,
+                  exact: bool = False) -> tuple[pd.DataFrame, pd.DataFrame]:
+        """
+        Partitions the membrane and axial currents at the given timepoints.
+
+        Args:
+            df_im (pd.DataFrame): Membrane currents indexed by (segment, itype).
+            df_iax (pd.DataFrame): Axial currents indexed by (ref, par).
+            segment_indexes (list): The timepoints to partition.
+            exact (bool): If True, every timepoint is partitioned exactly, even if a tolerance or an adaptive
+                resolution is set.
+
+        Returns:
+            Tuple: The positive and negative currentscape (im_part_pos, im_part_neg).
+        """
+        # 'edges' counts the processed edges of all timepoints, so that 'edges_per_s' is the partitioning throughput
+        with self.instrumentation.stage('partition', timepoints=len(segment_indexes),
+                                        edges=len(segment_indexes) * df_iax.shape[0]) as metrics:
+            im_part_pos, im_part_neg = self._partition(df_im, df_iax, segment_indexes, exact)
+            metrics['graph_edges'] = df_iax.shape[0]
+            metrics['output_bytes'] = nbytes(im_part_pos, im_part_neg)
+        return im_part_pos, im_part_neg
+
+    def _partition(self, df_im: pd.DataFrame, df_iax: pd.DataFrame, segment_indexes: list,
+                   exact: bool) -> tuple[pd.DataFrame, pd.DataFrame]:
+        if exact or (self.tolerance is None and self.adaptive_stride is None):
+            return partition_iax(df_im, df_iax, timepoints=segment_indexes, target=self.target,
+                                 partition_by=self.partitioning_strategy,
+                                 regions_list_directory=self.regions_list_directory, progress=self.progress,
+                                 catalog=self.catalog)
+
+        if self.adaptive_stride is not None:
+            im_part_pos, im_part_neg, self.exact_timepoints, self.error_bound = partition_iax_adaptive(
+                df_im, df_iax, timepoints=segment_indexes, target=self.target, partition_by=self.partitioning_strategy,
+                regions_list_directory=self.regions_list_directory, stride=self.adaptive_stride,
+                threshold=self.adaptive_threshold, tolerance=self.tolerance, progress=self.progress,
+                catalog=self.catalog)
+            if self.tolerance is None:
+                return im_part_pos, im_part_neg
+        else:
+            im_part_pos, im_part_neg, self.error_bound = partition_iax_approximate(
+                df_im, df_iax, timepoints=segment_indexes, target=self.target, partition_by=self.partitioning_strategy,
+                regions_list_directory=self.regions_list_directory, tolerance=self.tolerance,
+                progress=self.progress, catalog=self.catalog)
+        print("Maximal error bound of the approximate partitioning (nA): "
+              f"{self.error_bound['error_bound_pos'].max():.3g} (positive), "
+              f"{self.error_bound['error_bound_neg'].max():.3g} (negative)")
+        return im_part_pos, im_part_neg
+
+
+def read_csv_columns(path: str, columns: list = None, dtype: np.dtype = np.float64) -> pd.DataFrame:
+    """
+    Reads the selected integer-labeled columns of a current CSV file indexed by multiindex (0, 1).
+
+    Args:
+        path (str): Path to the CSV file.
+        columns (list or None): The column labels (timepoints) to read, all columns if None.
+        dtype (np.dtype): The type the currents are parsed into.
+
+    Returns:
+        pd.DataFrame: The selected columns with integer-type labels.
+    """
+    header = pd.read_csv(path, index_col=[0, 1], nrows=0).columns
+    positions = np.arange(len(header)) if columns is None else pd.Index(header.astype(int)).get_indexer(columns)
+    df = pd.read_csv(path, index_col=[0, 1], usecols=[0, 1] + list(positions + 2),
+                     dtype=dict.fromkeys(header[positions], dtype))
+    df.columns = df.columns.astype(int)
+    return df
@@ -0,0 +1,145 @@
+import numpy as np
+import pandas as pd
+
+from currentscape_calculator.partitioning_algorithm import prepare_partitioning, partition_timepoints, \
+    add_residual_category
+from currentscape_calculator.progress import ProgressReporter
+from SegmentCatalog import SegmentCatalog
+
+
+def partition_iax_adaptive(im: pd.DataFrame, iax: pd.DataFrame, timepoints: list, target: str, partition_by: str,
+                           regions_list_directory: str, stride: int = 10, threshold: float = 5.0,
+                           total_threshold: float = 0.2, sign_threshold: float = 0.01, tolerance: float = None,
+                           progress: ProgressReporter = None,
+                           catalog: SegmentCatalog = None) -> tuple[pd.DataFrame, pd.DataFrame, pd.Series,
+                                                                    pd.DataFrame]:
+    """
+    Partitions the axial currents with an adaptive temporal resolution.
+
+    The currentscape is first calculated at every `stride`-th timepoint. Each interval between two calculated
+    timepoints is then bisected recursively as long as
+        - the current shares at its ends differ by more than `threshold` percentage points,
+        - the total current at its ends differs by more than `total_threshold` (relative change), or
+        - the sign of an axial current changes within the interval (the partitioning order changes), unless the
+          current stays below `sign_threshold` of the largest axial current in the interval (near-zero currents
+          flipping because of noise barely change the currentscape).
+    The timepoints that are not calculated are filled by linear interpolation between their calculated neighbours.
+
+    Args:
+        im, iax, timepoints, target, partition_by, regions_list_directory, catalog:
+            See `partition_iax`.
+        stride : int
+            Distance (in samples) between the initially calculated timepoints.
+        threshold : float
+            Maximal change of the current shares (percentage points) between calculated timepoints.
+        total_threshold : float
+            Maximal relative change of the total positive or negative current between calculated timepoints.
+        sign_threshold : float
+            Sign changes of axial currents whose absolute value stays below this fraction of the largest absolute
+            axial current in the interval are ignored.
+        tolerance : float or None
+            If given, the approximate partitioning of `partition_iax_approximate` is used at each calculated timepoint.
+        progress : ProgressReporter or None
+            Receives the number of calculated timepoints.
+
+    Returns
+        tuple[DataFrame, DataFrame, Series, DataFrame]
+            The positive and negative currents of the target node at all timepoints, a boolean Series marking the
+            timepoints that were calculated exactly (not interpolated), and the error bound of the approximate
+            partitioning at the calculated timepoints (None if no tolerance is given).
+    """
+    im_pos, im_neg, iax = prepare_partitioning(im, iax, target, partition_by, regions_list_directory, timepoints,
+                                               catalog)
+    if tolerance is not None:
+        im_pos = add_residual_category(im_pos)
+        im_neg = add_residual_category(im_neg)
+    # The catalog is shared by all refinement passes
+    if catalog is None:
+        catalog = SegmentCatalog.from_currents(im_pos, iax)
+
+    timepoints = np.asarray(timepoints)
+    n_timepoints = len(timepoints)
+    calculated = np.zeros(n_timepoints, dtype=bool)
+    if n_timepoints == 0:
+        error_bound = None if tolerance is None else \
+            pd.DataFrame(columns=['error_bound_pos', 'error_bound_neg'], dtype=np.float64)
+        return (im_pos.loc[target, []], im_neg.loc[target, []], pd.Series(calculated, index=timepoints, name='exact'),
+                error_bound)
+    iax_values = iax[timepoints].to_numpy(dtype=np.float64)
+    error_bounds = []
+
+    # The currents of the target node (im_pos and im_neg share their index), kept up to date by `calculate`
+    target_rows = np.flatnonzero(im_pos.index.get_level_values(0) == target)
+    columns = im_pos.columns.get_indexer(timepoints)
+    target_pos = np.zeros((len(target_rows), n_timepoints))
+    target_neg = np.zeros((len(target_rows), n_timepoints))
+
+    def calculate(positions):
+        error_bound = partition_timepoints(im_pos, im_neg, iax, list(timepoints[positions]), target, tolerance,
+                                           progress, catalog)
+        if error_bound is not None:
+            error_bounds.append(error_bound)
+        calculated[positions] = True
+        target_pos[:, positions] = im_pos.iloc[target_rows, columns[positions]].to_numpy(dtype=np.float64)
+        target_neg[:, positions] = im_neg.iloc[target_rows, columns[positions]].to_numpy(dtype=np.float64)
+
+    # Initial coarse pass
+    positions = np.unique(np.append(np.arange(0, n_timepoints, stride), n_timepoints - 1))
+    calculate(positions)
+
+    # Bisect the intervals that change too much, one level at a time
+    intervals = list(zip(positions[:-1], positions[1:]))
+    while intervals:
+        refined = [(start, end) for start, end in intervals
+                   if end - start > 1 and needs_refinement(target_pos, target_neg, iax_values, start, end, threshold,
+                                                           total_threshold, sign_threshold)]
+        if not refined:
+            break
+        midpoints = [(start + end) // 2 for start, end in refined]
+        calculate(np.array(midpoints))
+        intervals = [interval for (start, end), mid in zip(refined, midpoints)
+                     for interval in ((start, mid), (mid, end))]
+    print(f"Adaptive partitioning calculated {calculated.sum()} of {n_timepoints} timepoints")
+
+    part_pos = interpolate_timepoints(im_pos.loc[target, list(timepoints)], calculated)
+    part_neg = interpolate_timepoints(im_neg.loc[target, list(timepoints)], calculated)
+    exact = pd.Series(calculated, index=timepoints, name='exact')
+    error_bound = pd.concat(error_bounds).sort_index() if error_bounds else None
+    return part_pos, part_neg, exact, error_bound
+
+
+def needs_refinement(part_pos: np.ndarray, part_neg: np.ndarray, iax_values: np.ndarray, start: int, end: int,
+                     threshold: float, total_threshold: float, sign_threshold: float = 0.01) -> bool:
+    """
+    Decides whether the interval between two calculated timepoints (given by their positions) has to be bisected,
+    given the (itype x timepoint) positive and negative currents of the target and the (edge x timepoint) axial
+    currents.
+    """
+    # An axial current changing its sign changes the partitioning order, which matters if the current is not tiny
+    iax_interval = iax_values[:, start:end + 1]
+    signs = np.sign(iax_interval)
+    flipped = (signs != signs[:, [0]]).any(axis=1)
+    if flipped.any():
+        magnitude = np.abs(iax_interval[flipped]).max(axis=1)
+        if (magnitude > sign_threshold * np.abs(iax_interval).max()).any():
+            return True
+
+    for part in (part_pos, part_neg):
+        values = part[:, [start, end]]
+        totals = values.sum(axis=0)
+        if np.abs(totals[1] - totals[0]) > total_threshold * np.abs(totals).max():
+            return True
+        shares = np.divide(values, totals, out=np.zeros_like(values), where=totals != 0)
+        if np.abs(shares[:, 1] - shares[:, 0]).max(initial=0) * 100 > threshold:
+            return True
+    return False
+
+
+def interpolate_timepoints(part: pd.DataFrame, calculated: np.ndarray) -> pd.DataFrame:
+    """
+    Replaces the columns that were not calculated by linear interpolation between the calculated columns.
+    """
+    values = part.to_numpy(dtype=np.float64)
+    positions = np.arange(values.shape[1])
+    interpolated = np.array([np.interp(positions, positions[calculated], row[calculated]) for row in values])
+    return pd.DataFrame(data=interpolated.astype(part.dtypes.iloc[0]), index=part.index, columns=part.columns)
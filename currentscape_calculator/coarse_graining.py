@@ -0,0 +1,129 @@
+import numpy as np
+import pandas as pd
+
+from typing import Union
+
+from currentscape_calculator.partitioning_algorithm import create_grouping_matrix
+
+
+def get_coarse_node_names(segments: pd.Index, run_length: int = None, keep: list[str] = ()) -> pd.Series:
+    """
+    Maps each node of the partitioning graph to the node it is collapsed into.
+
+    With `run_length=None` every segment of a section (including its 0 and 1 end nodes) is collapsed into a single
+    node named after the section (e.g. 'dend5_0(0.1)', 'dend5_0(0.3)' -> 'dend5_0'), in the same way as the target
+    section is merged before partitioning. With an integer `run_length`, consecutive runs of `run_length` internal
+    segments are collapsed into a node named after the first segment of the run; the end nodes join the first and
+    last run of their section.
+
+    Args:
+        segments (pd.Index): The node names (e.g. 'dend5_0(0.5)'). Nodes without a position, such as the merged
+            'soma', are kept as they are.
+        run_length (int or None): The number of segments per collapsed node, or None to collapse whole sections.
+        keep (list[str]): Sections that are not collapsed (e.g. the target section).
+
+    Returns:
+        pd.Series: The coarse node name of each unique node, indexed by the original node name.
+    """
+    nodes = pd.Index(segments).unique()
+    sections = nodes.str.split('(').str[0].str.strip()
+    has_position = nodes.str.contains('(', regex=False)
+    collapse = pd.Series(has_position & ~sections.isin(keep), index=nodes)
+    coarse_names = pd.Series(nodes, index=nodes)
+
+    if run_length is None:
+        coarse_names[collapse.values] = sections[collapse.values]
+        return coarse_names
+
+    df = pd.DataFrame({'section': sections, 'node': nodes})[collapse.values]
+    df['x'] = df['node'].str.split('(').str[1].str.rstrip(')').astype(float)
+    for section, df_section in df.groupby('section', sort=False):
+        df_section = df_section.sort_values('x')
+        internal = df_section[(df_section['x'] > 0) & (df_section['x'] < 1)]
+        if internal.empty:
+            continue
+        run_names = internal['node'].values[::run_length]
+        runs = np.arange(len(internal)) // run_length
+        coarse_names[internal['node'].values] = run_names[runs]
+        coarse_names[df_section['node'][df_section['x'] == 0].values] = run_names[0]
+        coarse_names[df_section['node'][df_section['x'] == 1].values] = run_names[-1]
+    return coarse_names
+
+
+def coarse_grain_currents(im: pd.DataFrame, iax: pd.DataFrame, run_length: int = None,
+                          keep: list[str] = ('soma',)) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Shrinks the partitioning graph by collapsing the internal nodes of each section (or each run of segments) into
+    a single node.
+
+    The membrane currents of the collapsed nodes are summed by current type and the axial currents between them are
+    removed, while the axial currents crossing the boundary of a collapsed node are kept. The total current entering
+    the kept sections is therefore unchanged, only the attribution of currents within collapsed nodes is lost.
+
+    Args:
+        im (pd.DataFrame): Membrane currents indexed by (segment, itype).
+        iax (pd.DataFrame): Axial currents indexed by (ref, par).
+        run_length (int or None): The number of segments per collapsed node, or None to collapse whole sections.
+        keep (list[str]): Sections that are not collapsed. The target section should always be kept.
+
+    Returns:
+        tuple[pd.DataFrame, pd.DataFrame]: The coarse-grained membrane and axial currents.
+    """
+    coarse_names = get_coarse_node_names(im.index.get_level_values(0).append(iax.index.get_level_values(0))
+                                         .append(iax.index.get_level_values(1)), run_length, keep)
+
+    # Sum membrane currents of the collapsed nodes by current type
+    segments = coarse_names.reindex(im.index.get_level_values(0)).values
+    segment_codes, coarse_segments = pd.factorize(segments)
+    itype_codes, itypes = pd.factorize(im.index.get_level_values(1))
+    group_codes = segment_codes * len(itypes) + itype_codes
+    grouping_matrix = create_grouping_matrix(group_codes, len(coarse_segments) * len(itypes))
+    multiindex = pd.MultiIndex.from_product([coarse_segments, itypes], names=im.index.names)
+    values = grouping_matrix @ im.to_numpy(dtype=np.float64)
+    im_coarse = pd.DataFrame(data=values.astype(np.result_type(*im.dtypes)), index=multiindex, columns=im.columns)
+
+    # Keep the axial currents between different coarse nodes only
+    ref = coarse_names.reindex(iax.index.get_level_values(0)).values
+    par = coarse_names.reindex(iax.index.get_level_values(1)).values
+    external = ref != par
+    multiindex = pd.MultiIndex.from_arrays([ref[external], par[external]], names=iax.index.names)
+    iax_coarse = pd.DataFrame(data=iax.values[external], index=multiindex, columns=iax.columns)
+    return im_coarse, iax_coarse
+
+
+def coarse_graining_error(part_pos: pd.DataFrame, part_neg: pd.DataFrame, part_pos_full: pd.DataFrame,
+                          part_neg_full: pd.DataFrame) -> pd.DataFrame:
+    """
+    Compares a coarse-grained currentscape with the full-resolution one.
+
+    Args:
+        part_pos, part_neg (pd.DataFrame): Positive and negative currentscape of the coarse-grained graph.
+        part_pos_full, part_neg_full (pd.DataFrame): Positive and negative currentscape of the full graph.
+
+    Returns:
+        pd.DataFrame: Indexed by timepoint, with the largest absolute difference of the current shares
+        ('share_error_pos', 'share_error_neg', in percentage points) and the relative difference of the total current
+        ('total_error_pos', 'total_error_neg') at each timepoint.
+    """
+    error = {}
+    for sign, part, part_full in (('pos', part_pos, part_pos_full), ('neg', part_neg, part_neg_full)):
+        part = part.reindex(index=part_full.index, columns=part_full.columns, fill_value=0).astype(np.float64)
+        part_full = part_full.astype(np.float64)
+        total = part.sum(axis=0)
+        total_full = part_full.sum(axis=0)
+        shares = part.div(total.where(total != 0), axis=1).fillna(0)
+        shares_full = part_full.div(total_full.where(total_full != 0), axis=1).fillna(0)
+        error[f'share_error_{sign}'] = (shares - shares_full).abs().max(axis=0) * 100
+        error[f'total_error_{sign}'] = ((total - total_full).abs() / total_full.abs().where(total_full != 0)).fillna(0)
+    return pd.DataFrame(error)
+
+
+def parse_coarse_grain(coarse_grain: Union[str, int, None]) -> Union[int, None]:
+    """
+    Converts the coarse-graining mode ('section' or a run length) to the `run_length` of `coarse_grain_currents`.
+    """
+    if coarse_grain == 'section':
+        return None
+    if isinstance(coarse_grain, (int, np.integer)) and coarse_grain > 0:
+        return int(coarse_grain)
+    raise ValueError(f"Coarse-graining must be 'section' or a positive number of segments, got {coarse_grain!r}")
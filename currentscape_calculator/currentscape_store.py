@@ -0,0 +1,133 @@
+import os
+import numpy as np
+import pandas as pd
+
+
+class CurrentscapeStore:
+    """
+    On-disk store of a currentscape that is written in time chunks.
+
+    The positive and negative currentscapes are stored as (itype x timepoint) arrays in 'part_pos.npy' and
+    'part_neg.npy', which are preallocated and filled chunk by chunk through memory maps, so only the current chunk
+    has to be held in memory. The current types are stored in 'itypes.csv' and the timepoints in 'timepoints.npy'.
+
+    Attributes:
+        directory (str): The directory of the store.
+        timepoints (np.ndarray): The timepoints (column labels) of the currentscape.
+        n_written (int): The number of timepoints written so far.
+    """
+    def __init__(self, directory: str, timepoints: np.ndarray) -> None:
+        self.directory = directory
+        self.timepoints = np.asarray(timepoints)
+        self.n_written = 0
+        self.itypes = None
+        self._part_pos = None
+        self._part_neg = None
+        os.makedirs(self.directory, exist_ok=True)
+        np.save(os.path.join(self.directory, 'timepoints.npy'), self.timepoints)
+
+    def append(self, part_pos: pd.DataFrame, part_neg: pd.DataFrame) -> None:
+        """
+        Writes the next chunk of timepoints of the positive and negative currentscape.
+
+        Args:
+            part_pos (pd.DataFrame): Positive currents of the chunk, indexed by itype.
+            part_neg (pd.DataFrame): Negative currents of the chunk, indexed by itype.
+        """
+        if self._part_pos is not None:
+            # The rows of the store are fixed by the first chunk
+            new_itypes = part_pos.index.union(part_neg.index).difference(self.itypes)
+            if len(new_itypes) > 0:
+                raise ValueError(f"Current types missing from the first chunk of the store: {list(new_itypes)}")
+        else:
+            self.itypes = part_pos.index
+            shape = (part_pos.shape[0], len(self.timepoints))
+            dtype = part_pos.dtypes.iloc[0]
+            self._part_pos = np.lib.format.open_memmap(os.path.join(self.directory, 'part_pos.npy'), mode='w+',
+                                                       dtype=dtype, shape=shape)
+            self._part_neg = np.lib.format.open_memmap(os.path.join(self.directory, 'part_neg.npy'), mode='w+',
+                                                       dtype=dtype, shape=shape)
+            pd.Series(self.itypes, name='itype').to_csv(os.path.join(self.directory, 'itypes.csv'), index=False)
+
+        n_chunk = part_pos.shape[1]
+        chunk = slice(self.n_written, self.n_written + n_chunk)
+        self._part_pos[:, chunk] = part_pos.reindex(self.itypes, fill_value=0).values
+        self._part_neg[:, chunk] = part_neg.reindex(self.itypes, fill_value=0).values
+        self._part_pos.flush()
+        self._part_neg.flush()
+        self.n_written += n_chunk
+
+    def load(self) -> tuple[pd.DataFrame, pd.DataFrame]:
+        """
+        Loads the positive and negative currentscape as memory-mapped DataFrames.
+        """
+        return load_currentscape_store(self.directory)
+
+
+def load_currentscape_store(directory: str) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Loads the positive and negative currentscape of a `CurrentscapeStore` directory.
+
+    Args:
+        directory (str): The directory of the store.
+
+    Returns:
+        tuple[pd.DataFrame, pd.DataFrame]: The positive and negative currentscape (itype x timepoint), backed by
+        read-only memory maps.
+    """
+    itypes = pd.read_csv(os.path.join(directory, 'itypes.csv'))['itype'].values
+    timepoints = np.load(os.path.join(directory, 'timepoints.npy'))
+    part_pos = np.load(os.path.join(directory, 'part_pos.npy'), mmap_mode='r')
+    part_neg = np.load(os.path.join(directory, 'part_neg.npy'), mmap_mode='r')
+    index = pd.Index(itypes, name='itype')
+    return (pd.DataFrame(data=part_pos, index=index, columns=timepoints),
+            pd.DataFrame(data=part_neg, index=index, columns=timepoints))
+
+
+# Number of values parsed at once by `ColumnChunkReader` (32 MB in float64)
+ROW_CHUNK_VALUES = 2 ** 22
+
+
+class ColumnChunkReader:
+    """
+    Reads chunks of columns (timepoints) of a current CSV file indexed by multiindex (0, 1), parsing the file once.
+
+    A CSV file can only be read row by row, so reading a chunk of columns with `usecols` parses the whole file again.
+    Instead, the file is parsed once in chunks of `row_chunk_size` rows (by default `ROW_CHUNK_VALUES` values), and
+    each row chunk is written transposed (timepoint x row) to a .npy file in `directory`. A chunk of timepoints is then
+    a contiguous slice of each file, read through memory maps, so the cost of reading all chunks is bounded by the size
+    of the data.
+
+    Attributes:
+        index (pd.MultiIndex): The rows of the file.
+        columns (pd.Index): The integer column labels (timepoints) of the file.
+    """
+    def __init__(self, path: str, directory: str, dtype: np.dtype = np.float64, row_chunk_size: int = None) -> None:
+        header = pd.read_csv(path, index_col=[0, 1], nrows=0).columns
+        if row_chunk_size is None:
+            row_chunk_size = max(1, ROW_CHUNK_VALUES // max(1, len(header)))
+        self.columns = header.astype(int)
+        os.makedirs(directory, exist_ok=True)
+        name = os.path.splitext(os.path.basename(path))[0]
+        self._files = []
+        indexes = []
+        reader = pd.read_csv(path, index_col=[0, 1], dtype=dict.fromkeys(header, dtype), chunksize=row_chunk_size)
+        for k, rows in enumerate(reader):
+            file = os.path.join(directory, f'{name}_{k}.npy')
+            np.save(file, np.ascontiguousarray(rows.to_numpy().T))
+            self._files.append(file)
+            indexes.append(rows.index)
+        self.index = indexes[0].append(indexes[1:]) if indexes else pd.MultiIndex.from_arrays([[], []])
+
+    def read(self, columns: list) -> pd.DataFrame:
+        """
+        Reads the given column labels (timepoints). Only the rows of these timepoints are read from the files.
+
+        Returns:
+            pd.DataFrame: The selected columns, indexed like the file.
+        """
+        positions = self.columns.get_indexer(columns)
+        if (positions < 0).any():
+            raise KeyError(f"{int((positions < 0).sum())} columns are missing from the file.")
+        values = np.concatenate([np.load(file, mmap_mode='r')[positions] for file in self._files], axis=1)
+        return pd.DataFrame(data=values.T, index=self.index, columns=self.columns[positions])
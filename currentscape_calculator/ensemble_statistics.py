@@ -0,0 +1,189 @@
+import os
+import numpy as np
+import pandas as pd
+
+
+class EnsembleStatistics:
+    """
+    Streaming summary of the currentscapes of an ensemble of trials.
+
+    The currentscape of each trial is reduced into the summary as soon as it is added, so memory use does not depend
+    on the number of trials. For the positive and negative currents ('part_pos', 'part_neg') and their normalized
+    shares in percent ('shares_pos', 'shares_neg'), the mean and variance of each (itype, timepoint) are updated with
+    Welford's algorithm. The distribution of the shares is additionally sketched with a fixed-bin histogram over
+    0-100 % and the exact minimum and maximum of each (itype, timepoint), from which quantiles are estimated.
+
+    Current types that are missing from a trial (e.g. a region without currents) count as zero currents, so all
+    statistics are over all trials.
+
+    Attributes:
+        timepoints (np.ndarray): The timepoints (column labels) of the currentscapes.
+        itypes (pd.Index): The current types seen so far.
+        n_trials (int): The number of trials added so far.
+        n_bins (int): The number of histogram bins of the share sketches.
+    """
+    QUANTITIES = ('part_pos', 'part_neg', 'shares_pos', 'shares_neg')
+    SHARES = ('shares_pos', 'shares_neg')
+
+    def __init__(self, timepoints: np.ndarray = None, n_bins: int = 100) -> None:
+        self.timepoints = None if timepoints is None else np.asarray(timepoints)
+        self.itypes = pd.Index([], name='itype')
+        self.n_trials = 0
+        self.n_bins = n_bins
+        self._mean = {}
+        self._m2 = {}
+        self._histograms = {}
+        self._min = {}
+        self._max = {}
+
+    def add(self, part_pos: pd.DataFrame, part_neg: pd.DataFrame) -> None:
+        """
+        Adds the currentscape of a trial to the summary.
+
+        Args:
+            part_pos (pd.DataFrame): Positive currents of the trial (itype x timepoint).
+            part_neg (pd.DataFrame): Negative currents of the trial (itype x timepoint).
+        """
+        if self.timepoints is None:
+            self.timepoints = np.asarray(part_pos.columns)
+        for part in (part_pos, part_neg):
+            if len(part.columns) != len(self.timepoints) or (np.asarray(part.columns) != self.timepoints).any():
+                raise ValueError("The timepoints of the trial do not match the timepoints of the ensemble.")
+        self._add_itypes(part_pos.index.union(part_neg.index).difference(self.itypes, sort=False))
+
+        values = {'part_pos': part_pos.reindex(self.itypes, fill_value=0).to_numpy(dtype=np.float64),
+                  'part_neg': part_neg.reindex(self.itypes, fill_value=0).to_numpy(dtype=np.float64)}
+        values['shares_pos'] = get_shares(values['part_pos'])
+        values['shares_neg'] = get_shares(values['part_neg'])
+
+        self.n_trials += 1
+        for quantity, x in values.items():
+            delta = x - self._mean[quantity]
+            self._mean[quantity] += delta / self.n_trials
+            self._m2[quantity] += delta * (x - self._mean[quantity])
+        for quantity in self.SHARES:
+            bins = np.clip((values[quantity] / 100 * self.n_bins).astype(np.int64), 0, self.n_bins - 1)
+            np.add.at(self._histograms[quantity], (*np.indices(bins.shape), bins), 1)
+            np.minimum(self._min[quantity], values[quantity], out=self._min[quantity])
+            np.maximum(self._max[quantity], values[quantity], out=self._max[quantity])
+
+    def mean(self, quantity: str) -> pd.DataFrame:
+        """
+        Returns the mean of a quantity ('part_pos', 'part_neg', 'shares_pos' or 'shares_neg') over the trials.
+        """
+        return self._to_frame(self._mean[quantity])
+
+    def variance(self, quantity: str) -> pd.DataFrame:
+        """
+        Returns the sample variance of a quantity over the trials (NaN for less than two trials).
+        """
+        if self.n_trials < 2:
+            return self._to_frame(np.full_like(self._m2[quantity], np.nan))
+        return self._to_frame(self._m2[quantity] / (self.n_trials - 1))
+
+    def std(self, quantity: str) -> pd.DataFrame:
+        """
+        Returns the sample standard deviation of a quantity over the trials.
+        """
+        return np.sqrt(self.variance(quantity))
+
+    def quantile(self, quantity: str, q: float) -> pd.DataFrame:
+        """
+        Estimates a quantile of the shares ('shares_pos' or 'shares_neg') from the histogram sketch, by linear
+        interpolation within the bin of the quantile, bounded by the minimum and maximum share of the trials.
+
+        The estimated quantile is the smallest share such that at least a fraction `q` of the trials are at or below
+        it (`np.quantile` with method='inverted_cdf'), with an error of at most the bin width (100 / n_bins %). The
+        default method of `np.quantile` interpolates between the shares of neighbouring trials instead, and can
+        differ from this quantile by more than a bin width when the trials are few or far apart.
+        """
+        if quantity not in self.SHARES:
+            raise ValueError(f"Quantiles are only sketched for {', '.join(self.SHARES)}.")
+        cumulative = np.cumsum(self._histograms[quantity], axis=-1)
+        rank = q * self.n_trials
+        bins = np.minimum((cumulative < rank).sum(axis=-1), self.n_bins - 1)
+        below = np.take_along_axis(cumulative, bins[..., None], axis=-1)[..., 0] - \
+            np.take_along_axis(self._histograms[quantity], bins[..., None], axis=-1)[..., 0]
+        in_bin = np.take_along_axis(self._histograms[quantity], bins[..., None], axis=-1)[..., 0]
+        fraction = np.divide(rank - below, in_bin, out=np.zeros(bins.shape), where=in_bin > 0)
+        estimate = (bins + np.clip(fraction, 0, 1)) * 100 / self.n_bins
+        return self._to_frame(np.clip(estimate, self._min[quantity], self._max[quantity]))
+
+    def save(self, directory: str) -> None:
+        """
+        Saves the summary to a directory: the accumulators in 'ensemble.npz' (see `load_ensemble_statistics`),
+        the current types in 'itypes.csv', and the mean and standard deviation of each quantity and the 5 %, 50 %
+        and 95 % quantiles of the shares as CSV files.
+        """
+        os.makedirs(directory, exist_ok=True)
+        accumulators = {f'{statistic}_{quantity}': values
+                        for statistic, arrays in (('mean', self._mean), ('m2', self._m2),
+                                                  ('histogram', self._histograms), ('min', self._min),
+                                                  ('max', self._max))
+                        for quantity, values in arrays.items()}
+        np.savez(os.path.join(directory, 'ensemble.npz'), timepoints=self.timepoints, n_trials=self.n_trials,
+                 n_bins=self.n_bins, **accumulators)
+        pd.Series(self.itypes, name='itype').to_csv(os.path.join(directory, 'itypes.csv'), index=False)
+
+        for quantity in self.QUANTITIES:
+            self.mean(quantity).to_csv(os.path.join(directory, f'{quantity}_mean.csv'))
+            self.std(quantity).to_csv(os.path.join(directory, f'{quantity}_std.csv'))
+        for quantity in self.SHARES:
+            for q in (0.05, 0.5, 0.95):
+                self.quantile(quantity, q).to_csv(os.path.join(directory, f'{quantity}_q{int(q * 100):02d}.csv'))
+
+    def _add_itypes(self, itypes: pd.Index) -> None:
+        # New current types were zero in all previous trials
+        n_timepoints = len(self.timepoints)
+        for quantity in self.QUANTITIES:
+            self._mean[quantity] = self._append_rows(self._mean.get(quantity), len(itypes), (n_timepoints,))
+            self._m2[quantity] = self._append_rows(self._m2.get(quantity), len(itypes), (n_timepoints,))
+        for quantity in self.SHARES:
+            histogram = self._append_rows(self._histograms.get(quantity), len(itypes), (n_timepoints, self.n_bins),
+                                          dtype=np.uint32)
+            histogram[len(self.itypes):, :, 0] = self.n_trials
+            self._histograms[quantity] = histogram
+            # Bounds of the shares, empty before the first trial
+            self._min[quantity] = self._append_rows(self._min.get(quantity), len(itypes), (n_timepoints,))
+            self._max[quantity] = self._append_rows(self._max.get(quantity), len(itypes), (n_timepoints,))
+            if self.n_trials == 0:
+                self._min[quantity][:] = np.inf
+                self._max[quantity][:] = -np.inf
+        self.itypes = self.itypes.append(itypes).rename('itype')
+
+    @staticmethod
+    def _append_rows(array: np.ndarray, n_rows: int, shape: tuple, dtype=np.float64) -> np.ndarray:
+        rows = np.zeros((n_rows, *shape), dtype=dtype)
+        return rows if array is None else np.concatenate((array, rows))
+
+    def _to_frame(self, values: np.ndarray) -> pd.DataFrame:
+        return pd.DataFrame(data=values, index=self.itypes, columns=self.timepoints)
+
+
+def get_shares(part: np.ndarray) -> np.ndarray:
+    """
+    Returns the shares (%) of the current types in the total current of each timepoint (0 where the total is 0).
+    """
+    total = part.sum(axis=0)
+    return np.divide(part * 100, total, out=np.zeros_like(part), where=total != 0)
+
+
+def load_ensemble_statistics(directory: str) -> EnsembleStatistics:
+    """
+    Loads the summary saved by `EnsembleStatistics.save`, e.g. to add more trials to it.
+    """
+    data = np.load(os.path.join(directory, 'ensemble.npz'))
+    statistics = EnsembleStatistics(data['timepoints'], int(data['n_bins']))
+    statistics.n_trials = int(data['n_trials'])
+    statistics.itypes = pd.Index(pd.read_csv(os.path.join(directory, 'itypes.csv'))['itype'].values, name='itype')
+    for quantity in EnsembleStatistics.QUANTITIES:
+        statistics._mean[quantity] = data[f'mean_{quantity}']
+        statistics._m2[quantity] = data[f'm2_{quantity}']
+    for quantity in EnsembleStatistics.SHARES:
+        statistics._histograms[quantity] = data[f'histogram_{quantity}']
+        # Summaries saved without the bounds of the shares are bounded by 0 and 100 %
+        shape = statistics._histograms[quantity].shape[:-1]
+        statistics._min[quantity] = data[f'min_{quantity}'] if f'min_{quantity}' in data.files else np.zeros(shape)
+        statistics._max[quantity] = data[f'max_{quantity}'] if f'max_{quantity}' in data.files else \
+            np.full(shape, 100.0)
+    return statistics
@@ -0,0 +1,219 @@
+import os
+import numpy as np
+import pandas as pd
+
+from typing import Callable, Union
+
+# Regions defined by the files in the region list directory. A section belonging to more than one region is
+# assigned to the first one in this list.
+REGION_NAMES = ['distal', 'oblique_trunk', 'axon', 'basal', 'soma']
+
+# Categories of the membrane current types
+CURRENT_CATEGORIES = {'intrinsic': ['capacitive', 'car', 'kad', 'kap', 'kdr', 'kslow', 'nad', 'nax', 'passive'],
+                      'synaptic': ['AMPA', 'GABA', 'GABA_B', 'NMDA']}
+
+# Default somatic distance bins (um) used when partitioning by 'distance'
+DISTANCE_BINS = [0, 100, 200, 300, 400, 600, 1000]
+
+# A grouping scheme maps the (segment, itype) index of the membrane currents to one label per row
+GroupingScheme = Callable[[pd.MultiIndex], np.ndarray]
+
+
+def get_grouping_scheme(partition_by: Union[str, GroupingScheme, dict, pd.Series],
+                        regions_list_directory: str = None) -> GroupingScheme:
+    """
+    Resolves a partitioning strategy to a grouping scheme.
+
+    Args:
+        partition_by : str, callable, dict or pd.Series
+            Either 'region', a grouping scheme (callable taking the (segment, itype) MultiIndex and returning one
+            label per row), or a mapping from (segment, itype) tuples to labels.
+        regions_list_directory : str
+            Directory containing the region list files. Required when partitioning by 'region'.
+
+    Returns:
+        GroupingScheme: A callable returning the group label of each (segment, itype) row.
+    """
+    if isinstance(partition_by, str):
+        if partition_by == 'region':
+            if regions_list_directory is None:
+                raise ValueError(
+                    'The directory containing the files defining the region for each dendritic branch is missing.')
+            return region_grouping(regions_list_directory)
+        raise ValueError(f"Unknown partitioning strategy: {partition_by}")
+    if isinstance(partition_by, (dict, pd.Series)):
+        return mapping_grouping(partition_by)
+    if callable(partition_by):
+        return partition_by
+    raise TypeError(f"Unsupported partitioning strategy: {partition_by!r}")
+
+
+def apply_grouping(im: pd.DataFrame, grouping: GroupingScheme) -> pd.DataFrame:
+    """
+    Relabels the current types of the membrane currents by the group labels of a grouping scheme.
+
+    The segment level of the index is kept, so the rows of each segment can be summed by their new label
+    (see `calc_im_by_region`).
+
+    Args:
+        im (pd.DataFrame): Membrane currents indexed by a (segment, itype) MultiIndex.
+        grouping (GroupingScheme): The grouping scheme to apply.
+
+    Returns:
+        pd.DataFrame: The membrane currents indexed by (segment, group label). Labels are not unique per segment.
+    """
+    labels = np.asarray(grouping(im.index))
+    multiindex = pd.MultiIndex.from_arrays([im.index.get_level_values(0), labels], names=['segment', 'itype'])
+    return pd.DataFrame(data=im.values, index=multiindex, columns=im.columns)
+
+
+def get_current_categories(itypes: pd.Index, current_categories: dict = CURRENT_CATEGORIES) -> np.ndarray:
+    """
+    Returns the category (e.g. 'intrinsic' or 'synaptic') of each current type, or 'Unknown' if it is not listed.
+    """
+    category_dict = {itype: category for category, values in current_categories.items() for itype in values}
+    codes, uniques = pd.factorize(itypes)
+    categories = np.array([category_dict.get(itype, 'Unknown') for itype in uniques], dtype=object)
+    return categories[codes]
+
+
+def get_segment_labels(segments: pd.Index, segment_labels: Union[dict, pd.Series]) -> np.ndarray:
+    """
+    Looks up the label of each segment.
+
+    The label is searched by the segment name (e.g. 'dend5_0(0.5)'), then by the midpoint of its section
+    (so merged sections such as 'soma' take the label of 'soma(0.5)') and finally by the section name.
+    Segments without a label are labeled 'Unknown'.
+    """
+    segment_labels = dict(segment_labels)
+    codes, uniques = pd.factorize(segments)
+    labels = []
+    for segment in uniques:
+        section = segment.split('(')[0].strip()
+        for key in (segment, f'{section}(0.5)', section):
+            if key in segment_labels:
+                labels.append(segment_labels[key])
+                break
+        else:
+            labels.append('Unknown')
+    return np.array(labels, dtype=object)[codes]
+
+
+def segment_grouping(segment_labels: Union[dict, pd.Series],
+                     current_categories: dict = CURRENT_CATEGORIES) -> GroupingScheme:
+    """
+    Creates a grouping scheme from a mapping of segments (or sections) to labels.
+
+    Args:
+        segment_labels (dict or pd.Series): Maps segment names (e.g. 'dend5_0(0.5)') or section names
+            (e.g. 'dend5_0') to labels.
+        current_categories (dict or None): Categories of the current types. If given, the segment label is combined
+            with the category of the current type (e.g. 'distal_synaptic'). If None, only the segment label is used.
+
+    Returns:
+        GroupingScheme: A callable returning the group label of each (segment, itype) row.
+    """
+    def grouping(index: pd.MultiIndex) -> np.ndarray:
+        labels = get_segment_labels(index.get_level_values(0), segment_labels).astype(str)
+        if current_categories is None:
+            return labels
+        categories = get_current_categories(index.get_level_values(1), current_categories).astype(str)
+        return np.char.add(np.char.add(labels, '_'), categories).astype(object)
+    return grouping
+
+
+def mapping_grouping(mapping: Union[dict, pd.Series]) -> GroupingScheme:
+    """
+    Creates a grouping scheme from a mapping of (segment, itype) tuples to labels.
+    Rows that are missing from the mapping are labeled 'Unknown'.
+    """
+    mapping = pd.Series(mapping)
+
+    def grouping(index: pd.MultiIndex) -> np.ndarray:
+        labels = mapping.reindex(index).fillna('Unknown')
+        return labels.values.astype(object)
+    return grouping
+
+
+def region_grouping(regions_list_directory: str, region_names: list[str] = REGION_NAMES,
+                    current_categories: dict = CURRENT_CATEGORIES) -> GroupingScheme:
+    """
+    Creates a grouping scheme that labels each current by its region and category (e.g. 'axon_intrinsic').
+
+    Args:
+        regions_list_directory (str): The directory containing a '<region>.txt' file for each region, listing the
+            sections that belong to the region.
+        region_names (list[str]): The regions to read from the directory.
+        current_categories (dict): Categories of the current types.
+
+    Returns:
+        GroupingScheme: A callable returning the group label of each (segment, itype) row.
+    """
+    section_regions = {}
+    for region in region_names:
+        with open(os.path.join(regions_list_directory, region + '.txt'), 'r') as file:
+            sections = file.read().strip().split('\n')
+        for section in sections:
+            section_regions.setdefault(section.strip(), region)
+    return segment_grouping(section_regions, current_categories)
+
+
+def distance_grouping(distances: pd.Series, bin_edges: list[float],
+                      current_categories: dict = CURRENT_CATEGORIES) -> GroupingScheme:
+    """
+    Creates a grouping scheme that labels each current by the somatic distance bin of its segment
+    (e.g. '100-200um_synaptic').
+
+    Args:
+        distances (pd.Series): Distance of each segment from the soma in um, indexed by segment name.
+        bin_edges (list[float]): Edges of the distance bins. Segments outside the bins are labeled 'Unknown'.
+        current_categories (dict or None): Categories of the current types.
+
+    Returns:
+        GroupingScheme: A callable returning the group label of each (segment, itype) row.
+    """
+    bin_labels = [f'{lower:g}-{upper:g}um' for lower, upper in zip(bin_edges[:-1], bin_edges[1:])]
+    bins = pd.cut(distances, bins=bin_edges, labels=bin_labels, include_lowest=True)
+    return segment_grouping(bins.dropna().astype(str), current_categories)
+
+
+def branch_order_grouping(branch_orders: pd.Series, max_order: int = None,
+                          current_categories: dict = CURRENT_CATEGORIES) -> GroupingScheme:
+    """
+    Creates a grouping scheme that labels each current by the branch order of its section (e.g. 'order3_intrinsic').
+
+    Args:
+        branch_orders (pd.Series): Branch order of each section (or segment), indexed by name.
+        max_order (int or None): Branch orders above this value are grouped together.
+        current_categories (dict or None): Categories of the current types.
+
+    Returns:
+        GroupingScheme: A callable returning the group label of each (segment, itype) row.
+    """
+    orders = branch_orders.astype(int)
+    if max_order is not None:
+        orders = orders.clip(upper=max_order)
+    labels = 'order' + orders.astype(str)
+    if max_order is not None:
+        labels[orders == max_order] = f'order{max_order}+'
+    return segment_grouping(labels, current_categories)
+
+
+def csv_grouping(path: str, current_categories: dict = CURRENT_CATEGORIES) -> GroupingScheme:
+    """
+    Creates a grouping scheme from a CSV file.
+
+    The file either has 'segment' and 'label' columns (segment or section names mapped to labels, combined with
+    the current categories) or 'segment', 'itype' and 'label' columns (a complete (segment, itype) mapping).
+
+    Args:
+        path (str): Path to the CSV file.
+        current_categories (dict or None): Categories of the current types, used for segment-level files.
+
+    Returns:
+        GroupingScheme: A callable returning the group label of each (segment, itype) row.
+    """
+    df = pd.read_csv(path, dtype=str)
+    if 'itype' in df.columns:
+        return mapping_grouping(df.set_index(['segment', 'itype'])['label'])
+    return segment_grouping(df.set_index('segment')['label'], current_categories)
@@ -4,13 +4,21 @@ import numpy as np
 import pandas as pd
 import networkx as nx
 
-from tqdm import tqdm
-from currentscape_calculator.partitioning_order import create_directed_graph, get_partitioning_order
+from scipy import sparse
+from Precision import ACCUMULATION_DTYPE
+from SegmentCatalog import SegmentCatalog
+from currentscape_calculator.progress import ProgressReporter
+from currentscape_calculator.partitioning_order import create_directed_graph, create_graph_from_edges, \
+    get_partitioning_order
+from currentscape_calculator.grouping import REGION_NAMES, CURRENT_CATEGORIES, get_grouping_scheme, apply_grouping, region_grouping
 
+# Maximal number of values of the (timepoint, node, itype) arrays partitioned at once
+NODE_ARRAY_VALUES = 2 ** 22
 
 
 def partition_iax(im: pd.DataFrame, iax: pd.DataFrame, timepoints: list, target: str, partition_by: str,
-                  regions_list_directory: str) -> tuple[pd.DataFrame, pd.DataFrame]:
+                  regions_list_directory: str, progress: ProgressReporter = None,
+                  catalog: SegmentCatalog = None) -> tuple[pd.DataFrame, pd.DataFrame]:
     """
     Partitions the axial currents based on the target node and partitioning criteria.
     It prepares region-specific indices and recalculates membrane if required.
@@ -21,14 +29,21 @@ def partition_iax(im: pd.DataFrame, iax: pd.DataFrame, timepoints: list, target:
         iax : DataFrame
             A DataFrame containing axial currents indexed by reference and parent segments.
         timepoints : list
-            A list of time points at which the partitioning is performed.
+            A list of time points (column labels) at which the partitioning is performed.
         target : str
             The name of the target node segment for partitioning.
-        partition_by : str
-            Partitioning strategy. Can be either 'type' or 'region'
+        partition_by : str, callable, dict or pd.Series
+            Partitioning strategy. Can be either 'type', 'region' or a user-defined grouping scheme: a callable
+            mapping the (segment, itype) index to one label per row, or a mapping from (segment, itype) tuples to
+            labels (see `currentscape_calculator.grouping`).
         regions_list_directory : str
             Directory path containing data about regions for each dendritic branch. This is necessary when partitioning
             by 'region'.
+        progress : ProgressReporter or None
+            Receives the number of partitioned timepoints (see `currentscape_calculator.progress`).
+        catalog : SegmentCatalog or None
+            The catalog of the model (see `ModelSimulator`), extended with the merged nodes and groups. If None, a
+            catalog of the given currents is created.
 
     Returns
         tuple[DataFrame, DataFrame]
@@ -36,71 +51,269 @@ def partition_iax(im: pd.DataFrame, iax: pd.DataFrame, timepoints: list, target:
             1. Positive membrane currents indexed by the target node and specified timepoints.
             2. Negative membrane currents indexed by the target node and specified timepoints.
     """
+    im_pos, im_neg, iax = prepare_partitioning(im, iax, target, partition_by, regions_list_directory, timepoints,
+                                               catalog)
+    partition_timepoints(im_pos, im_neg, iax, timepoints, target, progress=progress, catalog=catalog)
+    return im_pos.loc[target, list(timepoints)], im_neg.loc[target, list(timepoints)]
+
+
+def partition_iax_approximate(im: pd.DataFrame, iax: pd.DataFrame, timepoints: list, target: str, partition_by: str,
+                              regions_list_directory: str, tolerance: float, progress: ProgressReporter = None,
+                              catalog: SegmentCatalog = None) -> tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+    """
+    Approximate version of `partition_iax` that skips subtrees carrying small axial currents.
+
+    At each timepoint, edges whose absolute axial current is below `tolerance` are left out of the partitioning graph,
+    so the traversal stops at them and the subtrees beyond them are never visited. The current crossing a cut edge is
+    added to the 'residual' current type of the node on the target side instead of being partitioned by the membrane
+    currents of the subtree.
+    The residual current then propagates to the target like any other current type, so the current whose identity
+    is lost at the target is bounded by the sum of the absolute axial currents of the cut edges.
+
+    Args:
+        im, iax, timepoints, target, partition_by, regions_list_directory, progress, catalog:
+            See `partition_iax`.
+        tolerance : float
+            Axial currents (nA) below this absolute value are not partitioned.
+
+    Returns
+        tuple[DataFrame, DataFrame, DataFrame]
+            The positive and negative currents of the target node (including the 'residual' current type) and the
+            error bound of each timepoint (columns 'error_bound_pos' and 'error_bound_neg', in nA).
+    """
+    im_pos, im_neg, iax = prepare_partitioning(im, iax, target, partition_by, regions_list_directory, timepoints,
+                                               catalog)
+    im_pos = add_residual_category(im_pos)
+    im_neg = add_residual_category(im_neg)
+    error_bound = partition_timepoints(im_pos, im_neg, iax, timepoints, target, tolerance=tolerance,
+                                       progress=progress, catalog=catalog)
+    return im_pos.loc[target, list(timepoints)], im_neg.loc[target, list(timepoints)], error_bound
+
+
+def prepare_partitioning(im: pd.DataFrame, iax: pd.DataFrame, target: str, partition_by: str,
+                         regions_list_directory: str, timepoints: list = None,
+                         catalog: SegmentCatalog = None) -> tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+    """
+    Prepares the membrane and axial currents for partitioning: selects the timepoints, moves the root node to the
+    target, applies the grouping of the partitioning strategy and separates positive and negative membrane currents.
+
+    Args:
+        im, iax, target, partition_by, regions_list_directory, catalog:
+            See `partition_iax`.
+        timepoints : list or None
+            The timepoints (column labels) to keep. All other columns are dropped before any processing.
+            If None, all columns are kept.
+
+    Returns
+        tuple[DataFrame, DataFrame, DataFrame]
+            The positive membrane currents, negative membrane currents and axial currents.
+    """
+    if timepoints is not None:
+        im = select_timepoints(im, timepoints)
+        iax = select_timepoints(iax, timepoints)
 
     if (target != 'soma'):
         print('updating current files to the new target node:', target)
         ## we need to start with modifying the DataFrames containing the axial and membrane currents
         ## first: membrane currents
         ##        merging the segments belonging to the target section
-        im = merge_dendritic_section_imembrane(im, target)
+        im = merge_dendritic_section_imembrane(im, target, catalog)
         ## second: axial currents
         ##         removing internal nodes of the target
-        iax = merge_dendritic_section_iax(iax, target)
+        iax = merge_dendritic_section_iax(iax, target, catalog)
         ##         changing the axial current directions between the soma and the target to reflect the new target node
         iax = update_root_node(iax, target)
         print('current files updated')
 
-    if (partition_by == 'region'):
-        if (regions_list_directory is None):
-            raise ValueError(
-                'The directory containing the files defining the region for each dendritic branch is missing.')
-
-        ## reindexing the currents by their region... / loosing their identity
-        df_index_orig = pd.DataFrame((np.array((im.index.get_level_values(0), im.index.get_level_values(1))).T),
-                                     columns=['segment', 'itype'])
-        df_index_region_specific = create_region_specific_index(df_index_orig, regions_list_directory)
-        multiindex = pd.MultiIndex.from_frame(df_index_region_specific)
-        im = pd.DataFrame(data=im.values, index=multiindex)
+    # Grouping schemes may be mappings (e.g. a pd.Series), which cannot be compared to a string
+    by_type = isinstance(partition_by, str) and partition_by == 'type'
+    if (not by_type):
+        ## reindexing the currents by their group (e.g. region)... / loosing their identity
+        grouping = get_grouping_scheme(partition_by, regions_list_directory)
+        im = apply_grouping(im, grouping)
 
     # Separate DataFrames for positive and negative membrane currents
     im_pos = im.clip(lower=0)  # Positive currents only
     im_neg = im.clip(upper=0)  # Negative currents only
-    if (partition_by == 'region'):
-        print('recalculating membrane currents by region')
+    if (not by_type):
+        print('recalculating membrane currents by group')
         im_pos = calc_im_by_region(im_pos)
         im_neg = calc_im_by_region(im_neg)
-        print('membrane currents by region calculated')
-
-    for tp in tqdm(timepoints):
-        dg = create_directed_graph(iax, tp)
-
-        partitioning_order_out = get_partitioning_order(dg, target,
-                                                        'out')  # axial current always POSITIVE, we use the POSITIVE membrane currents
-        for segment_pair in partitioning_order_out:
-            ref = segment_pair[0]
-            par = segment_pair[1]
-            iax_tp = iax.loc[(ref, par), tp]
-            im_tp = im_pos.loc[ref, tp]
-            sum_im_tp = im_tp.sum()
-            # iax_tp either POSITIVE or NEGATIVE
-            if ((iax_tp > 0) & (sum_im_tp != 0)):
-                partition_iax_single(ref, par, tp, im_pos, iax_tp)
-
-        partitioning_order_in = get_partitioning_order(dg, target,
-                                                       'in')  # axial current always NEGATIVE, we use the NEGATIVE membrane currents
-        for segment_pair in partitioning_order_in:
-            ref = segment_pair[0]
-            par = segment_pair[1]
-            iax_tp = iax.loc[(ref, par), tp]
-            im_tp = im_neg.loc[ref, tp]
-            sum_im_tp = im_tp.sum()
-            # iax_tp either POSITIVE or NEGATIVE
-            if ((iax_tp < 0) & (sum_im_tp != 0)):
-                partition_iax_single(ref, par, tp, im_neg, iax_tp)
-
-    return im_pos.iloc[:, timepoints].loc[target], im_neg.iloc[:, timepoints].loc[target]
-
-def merge_dendritic_section_imembrane(df: pd.DataFrame, section: str) -> pd.DataFrame:
+        print('membrane currents by group calculated')
+    return im_pos, im_neg, iax
+
+
+def partition_timepoints(im_pos: pd.DataFrame, im_neg: pd.DataFrame, iax: pd.DataFrame, timepoints: list,
+                         target: str, tolerance: float = None, progress: ProgressReporter = None,
+                         catalog: SegmentCatalog = None) -> pd.DataFrame:
+    """
+    Partitions the axial currents at each timepoint, updating the rows of the target node in `im_pos` and `im_neg`
+    in place.
+
+    The nodes and current types are encoded by a `SegmentCatalog`, so the partitioning itself works on integer
+    graph nodes and (timepoint, node, itype) arrays. The arrays are built for chunks of timepoints of at most
+    `NODE_ARRAY_VALUES` values, so they never hold more than a slice of the currents. The partitioned currents are
+    accumulated in these arrays in `ACCUMULATION_DTYPE` and rounded once to the type of `im_pos` and `im_neg`.
+
+    Args:
+        im_pos, im_neg : DataFrame
+            Positive and negative membrane currents prepared by `prepare_partitioning`. When `tolerance` is given,
+            they must contain the 'residual' current type (see `add_residual_category`).
+        iax : DataFrame
+            Axial currents indexed by reference and parent segments.
+        timepoints : list
+            The timepoints to partition.
+        target : str
+            The name of the target node.
+        tolerance : float or None
+            If given, edges with an absolute axial current below the tolerance are left out of the graph and their
+            current is added to the 'residual' current type (see `partition_iax_approximate`).
+        progress : ProgressReporter or None
+            Receives the number of partitioned timepoints.
+        catalog : SegmentCatalog or None
+            The catalog encoding the nodes and current types, created from the currents if None.
+
+    Returns
+        DataFrame or None
+            The error bound of each timepoint if `tolerance` is given, otherwise None.
+    """
+    if catalog is None:
+        catalog = SegmentCatalog.from_currents(im_pos, iax)
+    target_code = catalog.encode_segments([target])[0]
+    residual_code = catalog.encode_itypes(['residual'])[0] if tolerance is not None else None
+    ref_codes = catalog.encode_segments(iax.index.get_level_values('ref'))
+    par_codes = catalog.encode_segments(iax.index.get_level_values('par'))
+    edge_rows = {edge: row for row, edge in enumerate(zip(ref_codes.tolist(), par_codes.tolist()))}
+    # im_pos and im_neg share their (segment, itype) index
+    segment_codes = catalog.encode_segments(im_pos.index.get_level_values(0))
+    itype_codes = catalog.encode_itypes(im_pos.index.get_level_values(1))
+    target_rows = np.flatnonzero(segment_codes == target_code)
+
+    timepoints = list(timepoints)
+    iax_values = iax.loc[:, timepoints].to_numpy().T
+    error_bounds = np.zeros((len(timepoints), 2))
+    chunk_size = max(NODE_ARRAY_VALUES // (len(catalog) * len(catalog.itypes)), 1)
+
+    if progress is not None:
+        progress.schedule(len(timepoints))
+    for start in range(0, len(timepoints), chunk_size):
+        columns = im_pos.columns.get_indexer(timepoints[start:start + chunk_size])
+        values_pos = get_node_array(im_pos, columns, segment_codes, itype_codes, catalog)
+        values_neg = get_node_array(im_neg, columns, segment_codes, itype_codes, catalog)
+        for i in range(len(columns)):
+            iax_tp = iax_values[start + i]
+            cut_edges = None
+            if tolerance is None:
+                dg = create_graph_from_edges(ref_codes, par_codes, iax_tp)
+            else:
+                # Edges below the tolerance are never traversed, only their parent nodes and currents are kept
+                small = np.abs(iax_tp) < tolerance
+                dg = create_graph_from_edges(ref_codes[~small], par_codes[~small], iax_tp[~small])
+                dg.add_node(target_code)
+                cut_edges = (par_codes[small], iax_tp[small])
+            # axial current always POSITIVE, we use the POSITIVE membrane currents
+            error_bounds[start + i, 0] = partition_graph(values_pos[i], dg, iax_tp, edge_rows, target_code, 'out',
+                                                         cut_edges, residual_code)
+            # axial current always NEGATIVE, we use the NEGATIVE membrane currents
+            error_bounds[start + i, 1] = partition_graph(values_neg[i], dg, iax_tp, edge_rows, target_code, 'in',
+                                                         cut_edges, residual_code)
+            if progress is not None:
+                progress.update()
+        set_node_array(im_pos, values_pos, columns, target_rows, itype_codes[target_rows], target_code)
+        set_node_array(im_neg, values_neg, columns, target_rows, itype_codes[target_rows], target_code)
+
+    if tolerance is None:
+        return None
+    return pd.DataFrame(error_bounds, index=timepoints, columns=['error_bound_pos', 'error_bound_neg'])
+
+
+def partition_graph(im_tp: np.ndarray, dg: nx.DiGraph, iax_tp: np.ndarray, edge_rows: dict, target: int,
+                    direction: str, cut_edges: tuple[np.ndarray, np.ndarray] = None, residual: int = None) -> float:
+    """
+    Partitions the axial currents of a single timepoint in one direction, updating `im_tp` in place.
+
+    Args:
+        im_tp (np.ndarray): The (node, itype) membrane currents of the timepoint, positive for the "out" and
+            negative for the "in" direction.
+        dg (nx.DiGraph): The directed graph of the timepoint, with integer nodes.
+        iax_tp (np.ndarray): The axial current of each edge at the timepoint.
+        edge_rows (dict): The row in `iax_tp` of each (ref, par) edge.
+        target (int): The code of the target node.
+        direction (str): "out" (positive axial currents) or "in" (negative axial currents).
+        cut_edges (tuple[np.ndarray, np.ndarray] or None): The parent node codes and axial currents of the edges
+            left out of `dg`. The current of those reached from the target is added to the `residual` current type
+            of their parent node.
+        residual (int or None): The itype code of the 'residual' current type.
+
+    Returns:
+        float: The error bound (sum of the absolute currents of the cut edges reached from the target), zero if
+        `cut_edges` is None.
+    """
+    sign = 1 if direction == 'out' else -1
+    error_bound = 0.0
+    partitioning_order = get_partitioning_order(dg, target, direction)
+    iax_order = iax_tp[[edge_rows[pair] for pair in partitioning_order]]
+    if cut_edges is not None:
+        cut_par, cut_iax = cut_edges
+        reached = np.zeros(len(im_tp), dtype=bool)
+        reached[target] = True
+        reached[[ref for ref, _ in partitioning_order]] = True
+        folded = reached[cut_par] & (sign * cut_iax > 0)
+        np.add.at(im_tp[:, residual], cut_par[folded], cut_iax[folded])
+        error_bound = float(np.abs(cut_iax[folded]).sum())
+
+    for (ref, par), iax_edge in zip(partitioning_order, iax_order.tolist()):
+        # iax_edge either POSITIVE or NEGATIVE
+        if (sign * iax_edge > 0) & (im_tp[ref].sum() != 0):
+            partition_iax_single(ref, par, im_tp, iax_edge)
+    return error_bound
+
+
+def get_node_array(im: pd.DataFrame, columns: np.ndarray, segment_codes: np.ndarray, itype_codes: np.ndarray,
+                   catalog: SegmentCatalog) -> np.ndarray:
+    """
+    Converts the given column positions of membrane currents indexed by (segment, itype) to a (timepoint, node code,
+    itype code) array of type `ACCUMULATION_DTYPE`, given the codes of the rows. Combinations missing from the
+    DataFrame are zero.
+    """
+    values = im.iloc[:, columns].to_numpy()
+    array = np.zeros((len(columns), len(catalog), len(catalog.itypes)), dtype=ACCUMULATION_DTYPE)
+    array[:, segment_codes, itype_codes] = values.T
+    return array
+
+
+def set_node_array(im: pd.DataFrame, array: np.ndarray, columns: np.ndarray, rows: np.ndarray,
+                   itype_codes: np.ndarray, node: int) -> None:
+    """
+    Writes the currents of a node from a (timepoint, node code, itype code) array back into the given rows (with the
+    given itype codes) and column positions of `im`, in place, rounded to the type of `im`.
+    """
+    dtype = np.result_type(*im.dtypes)
+    im.iloc[rows, columns] = array[:, node, itype_codes].T.astype(dtype)
+
+
+def select_timepoints(df: pd.DataFrame, timepoints: list) -> pd.DataFrame:
+    """
+    Selects the columns of the given timepoints, without copying if all columns are selected in order.
+    """
+    timepoints = list(timepoints)
+    if list(df.columns) == timepoints:
+        return df
+    return df.loc[:, timepoints]
+
+
+def add_residual_category(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Adds a zero-valued 'residual' current type to every segment of a (segment, itype) indexed DataFrame.
+    """
+    segments = df.index.get_level_values(0).unique()
+    itypes = df.index.get_level_values(1).unique().append(pd.Index(['residual']))
+    multi_index = pd.MultiIndex.from_product([segments, itypes], names=df.index.names)
+    return df.reindex(multi_index, fill_value=0)
+
+
+def merge_dendritic_section_imembrane(df: pd.DataFrame, section: str,
+                                      catalog: SegmentCatalog = None) -> pd.DataFrame:
     """
     Merges data for a specific dendritic section, summing  the values for each `itype` across the segments of the section
 
@@ -114,6 +327,9 @@ def merge_dendritic_section_imembrane(df: pd.DataFrame, section: str) -> pd.Data
         The name of the dendritic section to be processed. This will be used to select the rows that belong to the
         given section.
 
+    catalog : SegmentCatalog or None
+        The catalog encoding the segments, a new catalog if None.
+
     Returns:
     --------
     pd.DataFrame
@@ -121,7 +337,9 @@ def merge_dendritic_section_imembrane(df: pd.DataFrame, section: str) -> pd.Data
         for that section grouped by `itype`. The new DataFrame has the dendritic segment and `itype` as a two-level index.
     """
 
-    df_dend = df[df.index.get_level_values(0).str.startswith(f'{section}(')]  # select all rows belonging to the given segment
+    catalog = catalog if catalog is not None else SegmentCatalog()
+    df_dend = df[catalog.in_section(catalog.encode_segments(df.index.get_level_values(0)),
+                                    section)]  # select all rows belonging to the given section
     df_summed_by_itype = df_dend.groupby(level='itype').sum()  # sum dataframe by current type for each time point
     df_summed_by_itype = df_summed_by_itype.reset_index()
     df_summed_by_itype['segment'] = section
@@ -132,7 +350,8 @@ def merge_dendritic_section_imembrane(df: pd.DataFrame, section: str) -> pd.Data
     return df_merged_dendritic_segment
 
 
-def merge_dendritic_section_iax(df: pd.DataFrame, section: str) -> pd.DataFrame:
+def merge_dendritic_section_iax(df: pd.DataFrame, section: str,
+                                catalog: SegmentCatalog = None) -> pd.DataFrame:
     """
    This function selects the axial current connections that are external to the specified dendritic section
    (i.e., connections between parent and children nodes) and merges them back into the dataframe after
@@ -144,6 +363,8 @@ def merge_dendritic_section_iax(df: pd.DataFrame, section: str) -> pd.DataFrame:
            (reference) and 'par' (parent) segments.
        section : str
            The dendritic section identifier for which external axial current connections are to be merged.
+       catalog : SegmentCatalog or None
+           The catalog encoding the segments, a new catalog if None.
 
    Returns:
        pd.DataFrame
@@ -154,25 +375,26 @@ def merge_dendritic_section_iax(df: pd.DataFrame, section: str) -> pd.DataFrame:
        - Internal axial current connections, both as reference and parent, are removed from the dataframe.
        - The function specifically renames certain index values that correspond to internal and section-end-external segments.
    """
-    # Select external iax connections (between parent and children nodes)
-    # these are just references to the original dataframe, not making copies
-    df_segment_ref = df[df.index.get_level_values('ref').str.startswith(f'{section}(')]  # select iax rows where segment is the reference
-    df_segment_par = df[df.index.get_level_values('par').str.startswith(f'{section}(')]  # select iax rows where segment is the parent
-    # this is now a new copy - so renaming does not affects the original dataframe
-    df_external = pd.concat([df_segment_ref, df_segment_par]).drop_duplicates(keep=False)  # this keeps rows that are unique (meaning that they connect to external nodes)
-
-    # Rename index
-    iref = df.index.get_level_values('ref').str.startswith(f'{section}(')
-    first_internal_name = df.index.get_level_values('ref')[iref].sort_values()[0] # we assume that sorting will sort it correctly: The first element is the first internal node
-    last_terminal_name = df.index.get_level_values('ref')[iref].sort_values()[-1] # and the last is the terminal node
+    catalog = catalog if catalog is not None else SegmentCatalog()
+    ref_codes = catalog.encode_segments(df.index.get_level_values('ref'))
+    par_codes = catalog.encode_segments(df.index.get_level_values('par'))
+    ref_internal = catalog.in_section(ref_codes, section)  # iax rows where a segment of the section is the reference
+    par_internal = catalog.in_section(par_codes, section)  # iax rows where a segment of the section is the parent
+
+    # Select external iax connections (between parent and children nodes), this is a new copy
+    df_external = df[ref_internal ^ par_internal].copy()
+
+    # Rename the first internal node and the terminal node of the section to the section name
+    positions = catalog.positions[ref_codes[ref_internal]]
+    first_internal_name = catalog.segments[ref_codes[ref_internal][np.argmin(positions)]]
+    last_terminal_name = catalog.segments[ref_codes[ref_internal][np.argmax(positions)]]
     rename_dict = {first_internal_name: section,
                    last_terminal_name: section}
     df_external.rename(index=rename_dict, level='ref', inplace=True)
     df_external.rename(index=rename_dict, level='par', inplace=True)
 
     # Remove segment iax rows (both external and internal)
-    df_internal_idx = pd.concat([df_segment_ref, df_segment_par]).drop_duplicates().index
-    df.drop(df_internal_idx, inplace=True)
+    df = df[~(ref_internal | par_internal)]
 
     # Concatenate updated external iax rows
     df_merged_dendritic_section = pd.concat([df, df_external])
@@ -231,7 +453,8 @@ def update_root_node(df_merged: pd.DataFrame, section: str) -> pd.DataFrame:
     df_updated = df_updated.set_index(['ref', 'par'])
     return df_updated
 
-def create_region_specific_index(df: pd.DataFrame, input_dir: str) -> pd.DataFrame:
+def create_region_specific_index(df: pd.DataFrame, input_dir: str, fnames_regions: list[str] = REGION_NAMES,
+                                 type_dict: dict = CURRENT_CATEGORIES) -> pd.DataFrame:
     """
     Creates region-specific index by mapping each segment to a predefined region
     and categorizing intrinsic and synaptic types.
@@ -244,6 +467,12 @@ def create_region_specific_index(df: pd.DataFrame, input_dir: str) -> pd.DataFra
             The directory containing text files corresponding to different regions.
             Each file should have a list of segment names associated with that region.
 
+        fnames_regions : list[str]
+            The regions (file names without extension) to read from `input_dir`.
+
+        type_dict : dict
+            Categories of the current types (e.g. 'intrinsic' and 'synaptic').
+
     Returns:
         pd.DataFrame
             A new DataFrame with:
@@ -256,95 +485,77 @@ def create_region_specific_index(df: pd.DataFrame, input_dir: str) -> pd.DataFra
         - The function also categorizes current types as either 'intrinsic' or 'synaptic'.
         - The final 'itype' column is a combination of the detected region and type.
     """
-
-    fnames_regions = ['distal', 'oblique_trunk', 'axon', 'basal', 'soma']
-
-    # Create a dictionary with each region's file contents split by newline
-    regions_dict = {}
-    for f in fnames_regions:
-        with open(os.path.join(input_dir, f + '.txt'), 'r') as file:
-            contents = file.read().strip()  # Read the file and strip leading/trailing whitespace
-            segments = contents.split('\n')  # Split the contents by newline
-            key = os.path.splitext(f)[0]  # Use the file name (without extension) as the key
-            regions_dict[key] = segments  # Store the list of segments as the value
-
-    region_values = []
-    segments = df['segment'].values
-    for segment in segments:
-        seg = segment.split('(')[0].strip()  # Clean the segment
-        region_value = 'Unknown'
-        # Check if the segment exists in any of the lists in regions_dict
-        for key, value in regions_dict.items():
-            if seg in value:  # Check if the cleaned segment exists in the list of segments
-                region_value = key  # Assign the corresponding region key
-                break
-        region_values.append(region_value)
-
-    # Create a dictionary that categorizes current types
-    type_dict = {'intrinsic':['capacitive', 'car', 'kad', 'kap', 'kdr', 'kslow', 'nad', 'nax', 'passive'],
-                 'synaptic':['AMPA', 'GABA', 'GABA_B', 'NMDA']}
-
-    type_values = []
-    types = df['itype'].values
-    for type in types:
-        type_value = 'Unknown'
-        for key, value in type_dict.items():
-            if type in value:
-                type_value = key
-                break
-        type_values.append(type_value)
-
-    # Combine region and current type labels
-    combined_region_and_type = []
-    for i, region_value in enumerate(region_values):
-        combined_region_and_type.append(f'{region_value}_{type_values[i]}')
+    grouping = region_grouping(input_dir, fnames_regions, type_dict)
+    index = pd.MultiIndex.from_frame(df[['segment', 'itype']])
 
     # Create dataframe that contains the region-specific multiindex
     region_specific_index = pd.DataFrame()
     region_specific_index['segment'] = df['segment']
-    region_specific_index['itype'] = combined_region_and_type
+    region_specific_index['itype'] = grouping(index)
     return region_specific_index
 
 
 def calc_im_by_region(df: pd.DataFrame) -> pd.DataFrame:
-    # Extract unique segments and currents (itypes)
-    segments = df.index.get_level_values(0).unique()
-    currents = df.index.get_level_values(1).unique()
+    """
+    Sums membrane currents that share the same (segment, itype) label.
 
-    # Create a MultiIndex from the unique values of segment and itype
-    multi_index = pd.MultiIndex.from_product([segments, currents], names=['segment', 'itype'])
+    The summation is done in a single pass by multiplying the current block with a sparse grouping matrix, where
+    each input row is assigned to exactly one (segment, itype) output row. The cost therefore scales linearly with
+    the number of rows.
 
-    # Create a new DataFrame with the MultiIndex and numerical columns initialized to zero
-    df_new = pd.DataFrame(index=multi_index, columns=df.columns)
-    df_new[:] = 0.0  # initialize numerical values to zero
+    Args:
+        df : pd.DataFrame
+            Membrane currents indexed by a (segment, itype) MultiIndex that may contain duplicate labels.
+
+    Returns:
+        pd.DataFrame
+            A DataFrame of the same type as `df` (summed in float64), indexed by the product of the unique segments
+            and itypes (in order of appearance), with missing combinations set to zero.
+    """
+    # Integer codes of the unique segments and currents (itypes)
+    segment_codes, segments = pd.factorize(df.index.get_level_values(0))
+    current_codes, currents = pd.factorize(df.index.get_level_values(1))
 
-    # Loop through each segment and group by itype, summing the numerical columns
-    for seg in segments:
-        # Group by 'itype' and sum the numerical columns for that segment
-        df_seg_grouped = df.loc[seg].groupby('itype').sum()
+    # Each input row is summed into the (segment, itype) row of the product index
+    group_codes = segment_codes * len(currents) + current_codes
+    grouping_matrix = create_grouping_matrix(group_codes, len(segments) * len(currents))
+    values = grouping_matrix @ df.to_numpy(dtype=np.float64)
 
-        # Update df_new with the grouped results
-        for itype, row in df_seg_grouped.iterrows():
-            df_new.loc[(seg, itype), :] = row
-    df_new = df_new.astype(np.float32)
+    multi_index = pd.MultiIndex.from_product([segments, currents], names=['segment', 'itype'])
+    dtype = np.result_type(*df.dtypes) if df.shape[1] > 0 else np.dtype(np.float64)
+    df_new = pd.DataFrame(data=values.astype(dtype), index=multi_index, columns=df.columns)
     return df_new
 
-def partition_iax_single(ref: str, par: str, tp: int, im_signed: pd.DataFrame, iax_tp: float) -> None:
+
+def create_grouping_matrix(group_codes: np.ndarray, n_groups: int) -> sparse.csr_matrix:
+    """
+    Creates a sparse (n_groups x n_rows) matrix that sums rows sharing the same group code.
+
+    Args:
+        group_codes (np.ndarray): The group code of each row, in the range [0, n_groups).
+        n_groups (int): The number of output groups.
+
+    Returns:
+        sparse.csr_matrix: A matrix with a single one in every column, at the row of the column's group.
+    """
+    n_rows = len(group_codes)
+    return sparse.csr_matrix((np.ones(n_rows), (group_codes, np.arange(n_rows))), shape=(n_groups, n_rows))
+
+def partition_iax_single(ref: int, par: int, im_tp: np.ndarray, iax_tp: float) -> None:
     """
     Partitions axial currents at a specific time point into membrane currents and updates the parent node's membrane currents.
 
     Parameters:
-        ref (str): The reference node (child node) in the current partitioning process.
-        par (str): The parent node in the current partitioning process.
-        tp (int): The time point for which the partitioning is performed.
-        im (DataFrame): A DataFrame containing membrane currents for each node and time point.
-        iax (DataFrame): A DataFrame containing axial currents for each reference-parent pair and time point.
+        ref (int): The code of the reference node (child node) in the current partitioning process.
+        par (int): The code of the parent node in the current partitioning process.
+        im_tp (np.ndarray): The (node, itype) membrane currents at the time point, in `ACCUMULATION_DTYPE` (see
+            `partition_timepoints`).
+        iax_tp (float): The axial current between the reference and the parent node at the time point.
 
     Returns:
-        None: The function updates the `im` DataFrame in place with the partitioned axial currents added to the parent node's membrane currents.
+        None: The function updates `im_tp` in place with the partitioned axial currents added to the parent node's membrane currents.
     """
-    im_tp = im_signed.loc[ref, tp]
+    im_ref = im_tp[ref]
     # iax_tp either POSITIVE or NEGATIVE
-    part_curr = im_tp / im_tp.sum() * iax_tp
-    updated_curr = im_signed.loc[par, tp] + part_curr
-    im_signed.loc[par, tp] = updated_curr.values.astype(np.float32)  # update original dataframe of the membrane currents
+    part_curr = im_ref / im_ref.sum() * iax_tp
+    im_tp[par] += part_curr  # update the membrane currents of the parent node
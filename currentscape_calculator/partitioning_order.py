@@ -1,4 +1,5 @@
 import networkx as nx
+import numpy as np
 import pandas as pd
 
 
@@ -16,17 +17,30 @@ def create_directed_graph(iax: pd.DataFrame, tp: int) -> nx.DiGraph:
                     - If `iax` is positive, the edge direction is `par -> ref`.
                     - If `iax` is negative, the edge direction is `ref -> par`.
     """
-    df_iax_tp = iax[tp]
-    df_iax_tp = df_iax_tp.reset_index()
-    df_iax_tp.rename(columns={tp: "iax"}, inplace=True)  # has three columns: ref, par, iax
+    return create_graph_from_edges(iax.index.get_level_values('ref'), iax.index.get_level_values('par'),
+                                   iax[tp].to_numpy())
 
-    # Create directed graph (add edges to the graph based on the sign of iax)
+
+def create_graph_from_edges(ref, par, iax_tp: np.ndarray) -> nx.DiGraph:
+    """
+    Creates a directed graph from the reference and parent nodes of the edges and their axial currents.
+
+    Parameters:
+        ref, par (array-like): The reference and parent node of each edge. The nodes can be segment names or
+                               integer segment codes (see `SegmentCatalog`).
+        iax_tp (np.ndarray): The axial current of each edge. Edges with a NaN current are skipped.
+
+    Returns:
+        DiGraph: A directed graph with the edge directions of `create_directed_graph`.
+    """
+    ref = np.asarray(ref)
+    par = np.asarray(par)
+    positive = iax_tp >= 0
+    valid = positive | (iax_tp < 0)
+    sources = np.where(positive, par, ref)[valid].tolist()  # par -> ref if 'iax_timepoint' is positive
+    targets = np.where(positive, ref, par)[valid].tolist()  # ref -> par if 'iax_timepoint' is negative
     dg = nx.DiGraph()
-    for index, row in df_iax_tp.iterrows():
-        if row['iax'] >= 0:
-            dg.add_edge(row['par'], row['ref'], iax=row['iax'])  # par -> ref if 'iax_timepoint' is positive
-        elif row['iax'] < 0:
-            dg.add_edge(row['ref'], row['par'], iax=row['iax'])  # ref -> par if 'iax_timepoint' is negative
+    dg.add_edges_from((u, v, {'iax': iax}) for u, v, iax in zip(sources, targets, iax_tp[valid].tolist()))
     return dg
 
 
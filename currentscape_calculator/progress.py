@@ -0,0 +1,173 @@
+import time
+import threading
+import multiprocessing
+
+
+class ProgressReporter:
+    """
+    Reports the progress of the partitioning to a callback at a fixed cadence.
+
+    The callback is called with a progress event (dict) with the keys
+        - 'task': The name of the reported task (e.g. 'partition').
+        - 'worker': The id of the reporting worker (None in a single process).
+        - 'completed': The number of partitioned timepoints.
+        - 'total': The number of timepoints to partition (see `expect` and `schedule`).
+        - 'elapsed': Seconds since the first scheduled timepoint.
+        - 'rate': Partitioned timepoints per second.
+        - 'eta': Estimated seconds until all timepoints are partitioned (None before the first timepoint).
+        - 'done': Whether the task is finished.
+    at most every `interval` seconds, and once when the task is finished. The partitioning loops only call `update`
+    if a reporter is given, so there is no overhead without a callback.
+
+    Attributes:
+        callback (callable): The function called with each progress event.
+        interval (float): The minimal number of seconds between two events.
+        task (str): The name of the task.
+        worker (int or None): The id of the worker.
+    """
+    def __init__(self, callback, interval: float = 10.0, task: str = 'partition', worker: int = None) -> None:
+        self.callback = callback
+        self.interval = interval
+        self.task = task
+        self.worker = worker
+        self.completed = 0
+        self.expected = 0
+        self.scheduled = 0
+        self._start = None
+        self._last_report = None
+
+    @property
+    def total(self) -> int:
+        return max(self.expected, self.scheduled)
+
+    def expect(self, n: int) -> None:
+        """
+        Sets the number of timepoints expected in total, e.g. of all chunks of a streaming calculation.
+        """
+        self.expected = n
+
+    def schedule(self, n: int) -> None:
+        """
+        Adds timepoints that are about to be partitioned. The total grows beyond the expected number if more
+        timepoints are scheduled (e.g. when a coarse-grained currentscape is validated at full resolution).
+        """
+        if self._start is None:
+            self._start = self._last_report = time.perf_counter()
+        self.scheduled += n
+
+    def update(self, n: int = 1) -> None:
+        """
+        Adds partitioned timepoints and reports the progress if the last report is older than `interval`.
+        """
+        self.completed += n
+        now = time.perf_counter()
+        if now - self._last_report >= self.interval:
+            self._last_report = now
+            self.callback(self.get_event(now))
+
+    def finish(self) -> None:
+        """
+        Reports the final progress of the task.
+        """
+        if self._start is not None:
+            self.callback(self.get_event(time.perf_counter(), done=True))
+
+    def get_event(self, now: float, done: bool = False) -> dict:
+        elapsed = now - self._start
+        rate = self.completed / elapsed if elapsed > 0 else 0.0
+        eta = (self.total - self.completed) / rate if rate > 0 else None
+        return {'task': self.task, 'worker': self.worker, 'completed': self.completed, 'total': self.total,
+                'elapsed': elapsed, 'rate': rate, 'eta': 0.0 if done else eta, 'done': done}
+
+
+class ProgressAggregator:
+    """
+    Aggregates the progress events of parallel worker processes into a single progress.
+
+    Each worker reports through the picklable callback of `worker_callback`, whose events are sent to the parent
+    process through a queue. The parent combines the last event of every worker and calls `callback` with an event
+    of the same format as `ProgressReporter`, with the additional key 'workers' (the number of workers that
+    reported) and the combined throughput of all workers as rate. Used as a context manager around the parallel
+    work.
+
+    Without a callback, the aggregator does nothing and the workers get no callback.
+
+    Attributes:
+        callback (callable): The function called with each aggregated progress event.
+    """
+    def __init__(self, callback) -> None:
+        self.callback = callback
+        self._manager = None
+        self._queue = None
+        self._thread = None
+        self._events = {}
+
+    def __enter__(self) -> 'ProgressAggregator':
+        if self.callback is None:
+            return self
+        self._manager = multiprocessing.Manager()
+        self._queue = self._manager.Queue()
+        self._thread = threading.Thread(target=self._collect, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        if self._manager is None:
+            return
+        self._queue.put(None)
+        self._thread.join()
+        self._manager.shutdown()
+
+    def worker_callback(self, worker: int) -> 'QueueCallback':
+        """
+        Returns the callback of a worker, to be passed to the worker process (None without a callback).
+        """
+        if self._queue is None:
+            return None
+        return QueueCallback(self._queue, worker)
+
+    def _collect(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            # Keep the last event of each worker
+            worker, event = item
+            self._events[worker] = event
+            self.callback(aggregate_events(list(self._events.values())))
+
+
+class QueueCallback:
+    """
+    Progress callback of a worker process that sends the events to a `ProgressAggregator`.
+    """
+    def __init__(self, queue, worker: int) -> None:
+        self.queue = queue
+        self.worker = worker
+
+    def __call__(self, event: dict) -> None:
+        self.queue.put((self.worker, event))
+
+
+def aggregate_events(events: list[dict]) -> dict:
+    """
+    Combines the last progress events of several workers.
+    """
+    completed = sum(event['completed'] for event in events)
+    total = sum(event['total'] for event in events)
+    rate = sum(event['rate'] for event in events if not event['done'])
+    remaining = total - completed
+    return {'task': events[-1]['task'], 'worker': None, 'workers': len(events), 'completed': completed,
+            'total': total, 'elapsed': max(event['elapsed'] for event in events), 'rate': rate,
+            'eta': remaining / rate if rate > 0 else (0.0 if remaining <= 0 else None),
+            'done': all(event['done'] for event in events)}
+
+
+def print_progress(event: dict) -> None:
+    """
+    Progress callback that prints one line per event.
+    """
+    eta = 'unknown' if event['eta'] is None else f"{event['eta']:.0f} s"
+    workers = f" ({event['workers']} workers)" if event.get('workers', 1) > 1 else ''
+    print(f"Partitioned {event['completed']}/{event['total']} timepoints{workers}: {event['rate']:.1f} timepoints/s, "
+          f"ETA {eta}")
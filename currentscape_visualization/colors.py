@@ -0,0 +1,61 @@
+# Colors of the current types of the predefined partitioning strategies
+COLOR_MAPPINGS = {
+    'region': {
+        'distal_intrinsic': '#23125d',
+        'distal_synaptic': '#65559a',
+        'oblique_trunk_intrinsic': '#831b6d',
+        'oblique_trunk_synaptic': '#b875bb',
+        'basal_intrinsic': '#c21f9a',
+        'basal_synaptic': '#f0a6c1',
+        'soma_intrinsic': '#ef3870',
+        'soma_synaptic': '#fac4b8',
+        'axon_intrinsic': '#fbe38e',
+        'axon_synaptic': '#fdf3d1',
+        'residual': '#d9d9d9'
+    },
+    'type': {
+        'kap': '#51a7f9',
+        'kad': '#0365c0',
+        'kdr': '#164f86',
+        'kslow': '#002452',
+        'nad': '#ec5d57',
+        'nax': '#c82506',
+        'car': '#f39019',
+        'passive': '#00882b',
+        'capacitive': '#70bf41',
+        'AMPA': '#f5d328',
+        'NMDA': '#c3971a',
+        'GABA': '#b36ae2',
+        'GABA_B': '#773f9b',
+        'soma_iax_neg': '#a6aaa9',
+        'soma_iax_pos': '#a6aaa9',
+        'residual': '#d9d9d9',
+    },
+}
+
+# The Vega 'tableau20' color scheme, used for user-defined grouping schemes
+TABLEAU20 = ['#4c78a8', '#9ecae9', '#f58518', '#ffbf79', '#54a24b', '#88d27a', '#b79a20', '#f2cf5b', '#439894',
+             '#83bcb6', '#e45756', '#ff9d98', '#79706e', '#bab0ac', '#d67195', '#fcbfd2', '#b279a2', '#d6a5c9',
+             '#9e765f', '#d8b5a5']
+
+# Color of current types missing from a predefined color mapping
+UNKNOWN_COLOR = '#d9d9d9'
+
+
+def get_color_mapping(partitionby: str) -> dict:
+    """
+    Returns the colors of the current types of a partitioning strategy ('type' or 'region'), or None for
+    user-defined grouping schemes, which have no predefined colors.
+    """
+    return COLOR_MAPPINGS.get(partitionby)
+
+
+def get_itype_colors(itypes: list, partitionby: str) -> dict:
+    """
+    Returns the color of each current type as in the Altair currentscape: from the color mapping of the partitioning
+    strategy, or from the tableau20 scheme in sorted order of the current types for user-defined grouping schemes.
+    """
+    color_mapping = get_color_mapping(partitionby)
+    if color_mapping is None:
+        return {itype: TABLEAU20[i % len(TABLEAU20)] for i, itype in enumerate(sorted(itypes, key=str))}
+    return {itype: color_mapping.get(itype, UNKNOWN_COLOR) for itype in itypes}
@@ -1,11 +1,14 @@
 import numpy as np
 import altair as alt
 from currentscape_visualization.utils import *
+from currentscape_visualization.decimation import (CHART_WIDTH, LINE_POINTS_PER_PIXEL, AREA_POINTS_PER_PIXEL,
+                                                   get_target_points)
 
 
 def plot_currentscape(part_pos: pd.DataFrame, part_neg: pd.DataFrame, vm: np.array, taxis: np.array, tmin: int, tmax: int,
                       return_segs: bool=False, segments_preselected: bool=True,
-                      vmin: int=-69, vmax: int=-65, partitionby: str='type'):
+                      vmin: int=-69, vmax: int=-65, partitionby: str='type', width: int=CHART_WIDTH,
+                      decimate: bool=True):
     """
     Generates and saves a currentscape plot.
 
@@ -44,7 +47,17 @@ def plot_currentscape(part_pos: pd.DataFrame, part_neg: pd.DataFrame, vm: np.arr
         Maximum membrane potential value for visualization.
 
     partitionby : str, default='type'
-        Sets partitioning strategy. Can be 'type' or 'region'-specific.
+        Sets partitioning strategy. Can be 'type', 'region'-specific or any other grouping scheme (plotted with a
+        generic color scheme).
+
+    width : int, default=CHART_WIDTH
+        Width of the charts in pixels.
+
+    decimate : bool, default=True
+        If True, the data embedded into the charts is reduced to what the chart width can show: the membrane
+        potential and the total current are decimated with LTTB to two points per pixel, the current shares are
+        averaged over one time bin per pixel. The size of the chart and its rendering time are then bounded
+        whatever the length of the time window.
 
     Returns
     list of pd.DataFrame, np.array or None
@@ -64,10 +77,15 @@ def plot_currentscape(part_pos: pd.DataFrame, part_neg: pd.DataFrame, vm: np.arr
         t_seg = taxis[segment_indexes]
         vm_seg = vm
 
+    # Number of points of the line and area charts
+    n_points = get_target_points(width, LINE_POINTS_PER_PIXEL) if decimate else None
+    n_bins = get_target_points(width, AREA_POINTS_PER_PIXEL) if decimate else None
+
     # Create charts
-    totalpos = create_currsum_pos_chart(part_pos_seg, t_seg)
-    currshares_pos, currshares_neg = create_currshares_chart(part_pos_seg, part_neg_seg, t_seg, partitionby)
-    vm_chart = create_vm_chart(vm_seg, t_seg, vmin, vmax)
+    totalpos = create_currsum_pos_chart(part_pos_seg, t_seg, n_points, width)
+    currshares_pos, currshares_neg = create_currshares_chart(part_pos_seg, part_neg_seg, t_seg, partitionby,
+                                                             n_bins, width)
+    vm_chart = create_vm_chart(vm_seg, t_seg, vmin, vmax, n_points, width)
 
     # Create currentscape
     if (return_segs):
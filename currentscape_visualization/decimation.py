@@ -0,0 +1,88 @@
+import numpy as np
+
+# Width of the charts of a currentscape (pixels)
+CHART_WIDTH = 1000
+
+# Samples drawn per horizontal pixel. Lines keep two points per pixel, so that a rise and a fall within a pixel
+# stay visible. Stacked areas cannot show more than one value per pixel.
+LINE_POINTS_PER_PIXEL = 2
+AREA_POINTS_PER_PIXEL = 1
+
+
+def get_target_points(width: int = CHART_WIDTH, points_per_pixel: float = LINE_POINTS_PER_PIXEL) -> int:
+    """
+    Returns the number of points drawn on a chart of the given width (pixels).
+    """
+    return max(int(width * points_per_pixel), 3)
+
+
+def lttb_indices(t: np.ndarray, y: np.ndarray, n_points: int) -> np.ndarray:
+    """
+    Selects the samples of a line with the Largest-Triangle-Three-Buckets algorithm (Steinarsson, 2013).
+
+    The first and last samples are kept, the others are split into `n_points` - 2 buckets of consecutive samples. From
+    each bucket, the sample forming the largest triangle with the sample selected from the previous bucket and the
+    average of the next bucket is selected, which preserves the peaks and the shape of the line.
+
+    Args:
+        t (np.ndarray): The time of the samples.
+        y (np.ndarray): The values of the samples.
+        n_points (int): The number of selected samples.
+
+    Returns:
+        np.ndarray: The sorted indexes of the selected samples (all samples if there are at most `n_points`).
+    """
+    n_samples = len(y)
+    if n_samples <= n_points or n_points < 3:
+        return np.arange(n_samples)
+    t = np.asarray(t, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    # n_points - 2 buckets between the first and the last sample, each containing at least one sample
+    edges = np.linspace(1, n_samples - 1, n_points - 1).astype(int)
+    indexes = np.empty(n_points, dtype=int)
+    indexes[0] = 0
+    indexes[-1] = n_samples - 1
+    selected = 0
+    for i in range(n_points - 2):
+        start, stop = edges[i], edges[i + 1]
+        if i + 2 < len(edges):
+            t_next = t[stop:edges[i + 2]].mean()
+            y_next = y[stop:edges[i + 2]].mean()
+        else:
+            t_next, y_next = t[-1], y[-1]
+        # Twice the areas of the triangles (selected, candidate, next average)
+        areas = np.abs((t[selected] - t_next) * (y[start:stop] - y[selected])
+                       - (t[selected] - t[start:stop]) * (y_next - y[selected]))
+        selected = start + int(np.argmax(areas))
+        indexes[i + 1] = selected
+    return indexes
+
+
+def bin_average(t: np.ndarray, values: np.ndarray, n_bins: int) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Averages the values over `n_bins` bins of consecutive timepoints.
+
+    Timepoints with a non-finite value in any row (e.g. current shares of a zero total current) are left out of the
+    averages, so columns summing to 100 % still sum to 100 % after averaging. Bins without such timepoints are NaN.
+
+    Args:
+        t (np.ndarray): The timepoints.
+        values (np.ndarray): The (row x timepoint) values.
+        n_bins (int): The number of bins.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: The average time of each bin and the (row x bin) averaged values (the inputs
+        if there are at most `n_bins` timepoints).
+    """
+    n_timepoints = len(t)
+    if n_timepoints <= n_bins:
+        return np.asarray(t), np.asarray(values)
+    starts = np.linspace(0, n_timepoints, n_bins + 1).astype(int)[:-1]
+    values = np.asarray(values, dtype=np.float64)
+    valid = np.isfinite(values).all(axis=0)
+    counts = np.add.reduceat(valid.astype(np.float64), starts)
+    sums = np.add.reduceat(np.where(valid, values, 0.0), starts, axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        averages = sums / counts
+    t_bins = np.add.reduceat(np.asarray(t, dtype=np.float64), starts) / np.diff(np.append(starts, n_timepoints))
+    return t_bins, averages
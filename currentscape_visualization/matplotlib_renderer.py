@@ -0,0 +1,184 @@
+import numpy as np
+import pandas as pd
+
+from multiprocessing import Pool
+from matplotlib.figure import Figure
+from currentscape_visualization.colors import get_itype_colors
+from currentscape_visualization.decimation import (CHART_WIDTH, LINE_POINTS_PER_PIXEL, AREA_POINTS_PER_PIXEL,
+                                                   get_target_points, lttb_indices, bin_average)
+
+# Heights of the membrane potential, total current and current share panels (pixels), as in the Altair currentscape
+PANEL_HEIGHTS = (200, 100, 400)
+DPI = 100
+FONT_SIZE = 18
+VM_COLOR = '#4c78a8'
+IBASE = 0.0035
+LEFT_MARGIN = 1.6
+LEGEND_WIDTH = 3
+
+
+def plot_currentscape_matplotlib(part_pos: pd.DataFrame, part_neg: pd.DataFrame, vm: np.ndarray, t: np.ndarray,
+                                 vmin: float = -69, vmax: float = -65, partitionby: str = 'type',
+                                 width: int = CHART_WIDTH, decimate: bool = True) -> Figure:
+    """
+    Draws a currentscape with Matplotlib, with the layout and colors of `plot_currentscape`: the membrane potential,
+    the total outward current on a log scale, and the stacked shares of the outward (up) and inward (down) currents.
+
+    Args:
+        part_pos (pd.DataFrame): The positive currents (itype x timepoint) of the selected timepoints.
+        part_neg (pd.DataFrame): The negative currents (itype x timepoint) of the selected timepoints.
+        vm (np.ndarray): The membrane potential at the selected timepoints.
+        t (np.ndarray): The time of the selected timepoints (ms).
+        vmin (float): Lower limit of the membrane potential axis (mV).
+        vmax (float): Upper limit of the membrane potential axis (mV).
+        partitionby (str): The partitioning strategy, which sets the colors ('type', 'region' or any other grouping
+            scheme, drawn with the tableau20 colors).
+        width (int): Width of the panels in pixels.
+        decimate (bool): If True, the data is reduced to the panel width as in `plot_currentscape`.
+
+    Returns:
+        Figure: The figure, which is not attached to pyplot and can be saved with `savefig`.
+    """
+    return draw_currentscape(part_pos.index.to_list(), part_pos.to_numpy(dtype=np.float64),
+                             part_neg.to_numpy(dtype=np.float64), np.asarray(vm), np.asarray(t), vmin, vmax,
+                             partitionby, width, decimate)
+
+
+def draw_currentscape(itypes: list, pos: np.ndarray, neg: np.ndarray, vm: np.ndarray, t: np.ndarray,
+                      vmin: float, vmax: float, partitionby: str, width: int = CHART_WIDTH,
+                      decimate: bool = True) -> Figure:
+    """
+    Draws a currentscape from NumPy arrays (see `plot_currentscape_matplotlib`).
+
+    Args:
+        itypes (list): The current types (rows of `pos` and `neg`).
+        pos (np.ndarray): The (itype x timepoint) positive currents.
+        neg (np.ndarray): The (itype x timepoint) negative currents.
+
+    Returns:
+        Figure: The figure.
+    """
+    n_points = get_target_points(width, LINE_POINTS_PER_PIXEL) if decimate else None
+    n_bins = get_target_points(width, AREA_POINTS_PER_PIXEL) if decimate else None
+    colors = get_itype_colors(itypes, partitionby)
+    # Current types are stacked in ascending order, as by Vega-Lite
+    order = sorted(range(len(itypes)), key=lambda i: str(itypes[i]))
+
+    # Margins (inches) for the axis labels, and for the legend right of the panels
+    fig_width = width / DPI + LEFT_MARGIN + LEGEND_WIDTH
+    fig_height = sum(PANEL_HEIGHTS) / DPI + 1
+    fig = Figure(figsize=(fig_width, fig_height), dpi=DPI)
+    axes = fig.subplots(3, 1, sharex=True, gridspec_kw={'height_ratios': PANEL_HEIGHTS, 'hspace': 0})
+    fig.subplots_adjust(left=LEFT_MARGIN / fig_width, right=1 - LEGEND_WIDTH / fig_width,
+                        bottom=0.8 / fig_height, top=1 - 0.2 / fig_height)
+    draw_vm(axes[0], t, vm, vmin, vmax, n_points)
+    draw_total_current(axes[1], t, pos.sum(axis=0), n_points)
+    draw_current_shares(axes[2], t, pos, neg, [itypes[i] for i in order], order, colors, n_bins)
+    axes[2].set_xlim(np.min(t), np.max(t))
+    fig.align_ylabels(axes)
+    return fig
+
+
+def draw_vm(ax, t: np.ndarray, vm: np.ndarray, vmin: float, vmax: float, n_points: int = None) -> None:
+    if n_points is not None:
+        indexes = lttb_indices(t, vm, n_points)
+        t, vm = t[indexes], vm[indexes]
+    ax.plot(t, vm, color=VM_COLOR, linewidth=2)
+    ax.set_ylim(vmin, vmax)
+    ax.set_ylabel('V (mV)', fontsize=FONT_SIZE)
+    ax.tick_params(axis='y', labelsize=FONT_SIZE)
+    ax.tick_params(axis='x', bottom=False, labelbottom=False)
+    hide_frame(ax)
+
+
+def draw_total_current(ax, t: np.ndarray, total: np.ndarray, n_points: int = None) -> None:
+    if np.min(total) < 0.1:
+        iticks = [0.0035, 0.008, 0.02, 0.04]
+        idomain = [0.0035, 0.04]
+    else:
+        iticks = [0.1, 1, 10, 100]
+        idomain = [0.1, 100]
+    if n_points is not None:
+        indexes = lttb_indices(t, np.log10(np.clip(total, idomain[0], None)), n_points)
+        t, total = t[indexes], total[indexes]
+    ax.fill_between(t, IBASE, total, color='black', alpha=0.6, linewidth=0)
+    ax.set_yscale('log')
+    ax.set_ylim(*idomain)
+    ax.set_yticks(iticks, [f'{tick:g}' for tick in iticks])
+    ax.minorticks_off()
+    ax.grid(axis='y')
+    ax.set_ylabel('I (nA)', fontsize=FONT_SIZE)
+    ax.tick_params(axis='y', labelsize=FONT_SIZE)
+    ax.tick_params(axis='x', bottom=False, labelbottom=False)
+    hide_frame(ax)
+
+
+def draw_current_shares(ax, t: np.ndarray, pos: np.ndarray, neg: np.ndarray, itypes: list, order: list,
+                        colors: dict, n_bins: int = None) -> None:
+    with np.errstate(invalid='ignore', divide='ignore'):
+        shares_pos = pos[order] / pos.sum(axis=0) * 100
+        shares_neg = -neg[order] / neg.sum(axis=0) * 100
+    t_pos, t_neg = t, t
+    if n_bins is not None:
+        t_pos, shares_pos = bin_average(t, shares_pos, n_bins)
+        t_neg, shares_neg = bin_average(t, shares_neg, n_bins)
+
+    for t_shares, shares in ((t_pos, shares_pos), (t_neg, shares_neg)):
+        # Stacked from zero, upwards for the outward and downwards for the inward currents
+        upper = np.cumsum(shares, axis=0)
+        lower = upper - shares
+        for itype, low, up in zip(itypes, lower, upper):
+            ax.fill_between(t_shares, low, up, color=colors[itype], linewidth=0, label=itype)
+    ax.axhline(0, color='black', linewidth=1)
+    ax.set_ylim(-100, 100)
+    ax.set_yticks([])
+    ax.set_ylabel('inward %          outward %', fontsize=FONT_SIZE)
+    ax.set_xlabel('time (ms)', fontsize=FONT_SIZE)
+    ax.tick_params(axis='x', labelsize=FONT_SIZE)
+    ax.xaxis.set_major_formatter('{x:.0f}')
+    hide_frame(ax)
+    # One legend entry per current type
+    handles, labels = ax.get_legend_handles_labels()
+    ax.legend(handles[:len(itypes)], labels[:len(itypes)], title='itype', loc='upper left', bbox_to_anchor=(1.01, 1),
+              frameon=False, fontsize=FONT_SIZE, title_fontsize=FONT_SIZE)
+
+
+def hide_frame(ax) -> None:
+    for side in ('top', 'right', 'bottom', 'left'):
+        ax.spines[side].set_visible(False)
+
+
+def save_currentscape_figure(filename: str, part_pos: pd.DataFrame, part_neg: pd.DataFrame, vm: np.ndarray,
+                             t: np.ndarray, **kwargs) -> str:
+    """
+    Draws a currentscape with `plot_currentscape_matplotlib` (with the keyword arguments) and saves it. The format
+    follows the extension of `filename` (e.g. '.pdf', '.svg' or '.png').
+
+    Returns:
+        str: The filename.
+    """
+    fig = plot_currentscape_matplotlib(part_pos, part_neg, vm, t, **kwargs)
+    fig.savefig(filename)
+    return filename
+
+
+def save_currentscape_job(job: dict) -> str:
+    return save_currentscape_figure(**job)
+
+
+def save_currentscape_figures(jobs: list[dict], processes: int = None) -> list[str]:
+    """
+    Saves several currentscapes in parallel worker processes.
+
+    Args:
+        jobs (list[dict]): The arguments of `save_currentscape_figure` of each figure.
+        processes (int or None): The number of worker processes. Defaults to the number of CPUs. If 1, the figures
+            are saved in this process.
+
+    Returns:
+        list[str]: The saved filenames, in the order of `jobs`.
+    """
+    if processes == 1 or len(jobs) <= 1:
+        return [save_currentscape_job(job) for job in jobs]
+    with Pool(processes) as pool:
+        return pool.map(save_currentscape_job, jobs)
@@ -2,7 +2,7 @@ from CurrentscapePipeline import CurrentscapePipeline
 
 output_dir = 'output'
 target = 'soma'  # can be any dendrite too e.g. 'dend5_0'
-partitioning = 'type'  # can be 'type' or 'region'
+partitioning = 'type'  # can be 'type', 'region', 'distance' or 'branch_order'
 ca = False
 stim_dend = 108
 direction = 'IN'  # can be 'IN' or 'OUT'
@@ -20,7 +20,7 @@ pipeline = CurrentscapePipeline(output_dir, target, partitioning, ca, stim_dend,
 
 if pipeline.results_exist():
     print("Results found. Loading and visualizing only...")
-    pipeline.run_simulation()
+    pipeline.run_simulation(recording_profile='vm-target')  # only the membrane potential is needed
     pipeline.load_results()
     pipeline.visualize()
 else:
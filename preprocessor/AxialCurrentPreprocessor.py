@@ -1,7 +1,9 @@
 import pandas as pd
 import numpy as np
 
-from preprocessor.utils.preprocess_axial import get_segment_iax, update_root_node
+from scipy import sparse
+from SegmentCatalog import SegmentCatalog
+from preprocessor.utils.preprocess_axial import get_segment_iax, update_root_node, accumulate_subtrees
 
 
 class AxialCurrentPreprocessor:
@@ -11,12 +13,17 @@ class AxialCurrentPreprocessor:
     Initializes two primary DataFrames:
     - axial_current: Stores calculated axial currents with a MultiIndex.
     - axial_current_soma_merged: Stores axial current dataframe with merged somatic section.
+
+    Segments are looked up by their integer codes in the shared `catalog`. The axial currents are calculated in
+    float64 and stored with the type `dtype` (see `Precision`).
     """
-    def __init__(self) -> None:
+    def __init__(self, catalog: SegmentCatalog = None, dtype=np.float64) -> None:
+        self.catalog = catalog if catalog is not None else SegmentCatalog()
+        self.dtype = np.dtype(dtype)
         self.axial_current = pd.DataFrame
         self.axial_current_soma_merged = pd.DataFrame
 
-    def calculate_axial_currents(self, simulation_data: dict) -> None:
+    def calculate_axial_currents(self, simulation_data: dict, timepoints: np.ndarray = None) -> None:
         """
         Calculates axial currents based on simulation data.
 
@@ -24,38 +31,82 @@ class AxialCurrentPreprocessor:
             simulation_data (dict): A dictionary containing connection data and membrane potential data.
                 - 'connections': A DataFrame with 'ref', 'par', and 'ri_par' columns.
                 - 'membrane_potential_data': A tuple containing segments and membrane potential values.
+            timepoints (np.ndarray or None): The timepoints (column indexes) to calculate. The columns of the
+                resulting DataFrame keep these indexes as labels. If None, all timepoints are used.
 
         Populates the 'axial_current' attribute with a MultiIndex DataFrame of calculated currents.
         """
         connections = simulation_data['connections']
         segments = simulation_data['membrane_potential_data'][0]
-        membrane_potential = simulation_data['membrane_potential_data'][1]
-
-        df_v = pd.DataFrame(data=membrane_potential)
-        df_v.insert(0, 'segment', segments)
-
-        # Calculate axial currents
-        iax = np.empty((connections.shape[0], df_v.shape[1] - 1))
-        for i, _ in enumerate(connections.iloc[:, 0]):
-            try:
-                ref = connections.iloc[i, 0]
-                par = connections.iloc[i, 1]
-                ri_par = connections.iloc[i, 2]
-
-                v_ref = df_v[df_v['segment'] == ref].iloc[0, 1:].values
-                v_par = df_v[df_v['segment'] == par].iloc[0, 1:].values
-
-                iax_row = (v_par - v_ref) / ri_par
-            except IndexError:
-                # print(f"The following segment does not have a parent: {connections.iloc[i, 0]}")  # sanity check
-                iax_row = np.zeros(df_v.shape[1] - 1)
-            iax[i, :] = iax_row
-        axial_values = iax
+        membrane_potential = np.asarray(simulation_data['membrane_potential_data'][1], dtype=np.float64)
+        if timepoints is not None:
+            membrane_potential = membrane_potential[:, timepoints]
+
+        # Row of each segment code in the membrane potential array (-1 if the segment is not recorded).
+        # Rows are assigned in reverse order, so the first row of a duplicated segment is used.
+        segment_codes = self.catalog.encode_segments(segments)
+        ref_codes = self.catalog.encode_segments(connections['ref'])
+        par_codes = self.catalog.encode_segments(connections['par'])
+        code_rows = np.full(len(self.catalog), -1)
+        code_rows[segment_codes[::-1]] = np.arange(len(segment_codes))[::-1]
+        ref_rows = code_rows[ref_codes]
+        par_rows = code_rows[par_codes]
+        ri_par = connections.iloc[:, 2].to_numpy(dtype=np.float64)
+
+        # Calculate axial currents; connections without a recorded parent (e.g. the root) have zero axial current
+        iax = np.zeros((connections.shape[0], membrane_potential.shape[1]))
+        connected = (ref_rows >= 0) & (par_rows >= 0)
+        iax[connected] = ((membrane_potential[par_rows[connected]] - membrane_potential[ref_rows[connected]])
+                          / ri_par[connected, np.newaxis])
+        axial_values = iax.astype(self.dtype, copy=False)
         axial_index = pd.DataFrame(data={'ref': connections['ref'].values, 'par': connections['par'].values})
 
         # Create a DataFrame with a MultiIndex
         multiindex = pd.MultiIndex.from_frame(axial_index)
-        self.axial_current = pd.DataFrame(data=axial_values, index=multiindex)
+        self.axial_current = pd.DataFrame(data=axial_values, index=multiindex, columns=timepoints)
+
+    def accumulate_axial_currents(self, simulation_data: dict, membrane_currents: pd.DataFrame) -> None:
+        """
+        Calculates axial currents from the membrane currents instead of the membrane potentials.
+
+        The axial current flowing from the parent into a segment leaves the cell through the membrane of the
+        segment's subtree, so it equals the total membrane current of that subtree. The subtree sums are accumulated
+        in a single postorder pass over the parent index of each segment (see `accumulate_subtrees`). The currents
+        are balanced at every node by construction and only the membrane potential of the target has to be recorded.
+
+        Args:
+            simulation_data (dict): A dictionary containing the connection data.
+                - 'connections': A DataFrame with 'ref', 'par', and 'ri_par' columns.
+            membrane_currents (pd.DataFrame): The combined membrane currents (nA) of the segments, indexed by
+                (segment, itype) (see `MembraneCurrentPreprocessor.combine_membrane_currents`). Their columns are the
+                timepoints of the axial currents.
+
+        Populates the 'axial_current' attribute with a MultiIndex DataFrame of calculated currents.
+        """
+        connections = simulation_data['connections']
+        ref_codes = self.catalog.encode_segments(connections['ref'])
+        par_codes = self.catalog.encode_segments(connections['par'])
+        segment_codes = self.catalog.encode_segments(membrane_currents.index.get_level_values(0))
+
+        # Total membrane current of each segment (segments without recorded currents, such as the section ends,
+        # have none)
+        summation = sparse.csr_matrix((np.ones(len(segment_codes)), (segment_codes, np.arange(len(segment_codes)))),
+                                      shape=(len(self.catalog), len(segment_codes)))
+        im_total = summation @ membrane_currents.to_numpy(dtype=np.float64)
+
+        # Every segment of the tree is the reference of a connection, so a parent that is not (e.g. 'None' of the
+        # root) is outside the cell; these connections have zero axial current, as with `calculate_axial_currents`
+        is_ref = np.zeros(len(self.catalog), dtype=bool)
+        is_ref[ref_codes] = True
+        connected = is_ref[par_codes]
+        parents = np.full(len(self.catalog), -1)
+        parents[ref_codes[connected]] = par_codes[connected]
+
+        subtrees = accumulate_subtrees(im_total, parents)
+        iax = np.where(connected[:, np.newaxis], subtrees[ref_codes], 0.0).astype(self.dtype, copy=False)
+        multiindex = pd.MultiIndex.from_arrays([connections['ref'].values, connections['par'].values],
+                                               names=['ref', 'par'])
+        self.axial_current = pd.DataFrame(data=iax, index=multiindex, columns=membrane_currents.columns)
 
     def merge_section_iax(self, target: str) -> pd.DataFrame:
         """
@@ -105,13 +156,11 @@ class AxialCurrentPreprocessor:
         new_index = pd.MultiIndex.from_tuples(new_index_tuples, names=df_iax_soma_merged.index.names)
         df_iax_soma_merged.index = new_index
 
-        # Remove internal axial current rows (with "soma" in "ref")
-        ref_idx = df[df.index.get_level_values("ref").str.contains("soma")].index
-        df_iax_ref_removed = df.drop(ref_idx)
-
-        # Remove original soma-dendrite axial currents (with "soma" in "par")
-        par_idx = df_iax_ref_removed[df_iax_ref_removed.index.get_level_values("par").str.contains("soma")].index
-        df_iax_removed = df_iax_ref_removed.drop(par_idx)
+        # Remove internal axial current rows (with "soma" in "ref") and
+        # original soma-dendrite axial currents (with "soma" in "par")
+        ref_soma = self.catalog.in_section(self.catalog.encode_segments(df.index.get_level_values("ref")), 'soma')
+        par_soma = self.catalog.in_section(self.catalog.encode_segments(df.index.get_level_values("par")), 'soma')
+        df_iax_removed = df[~ref_soma & ~par_soma]
 
         # Combine updated segments
         self.axial_current_soma_merged = pd.concat([df_iax_removed, df_iax_soma_merged], axis=0)
@@ -129,29 +178,25 @@ class AxialCurrentPreprocessor:
         """
 
         df = self.axial_current_soma_merged
-        # Select external iax connections (between parent and children nodes)
-        df_segment_ref = df[df.index.get_level_values('ref').str.startswith(
-            f'{target}(')]  # select iax rows where segment is the reference
-        df_segment_par = df[df.index.get_level_values('par').str.startswith(
-            f'{target}(')]  # select iax rows where segment is the parent
-        # this is now a new copy - so renaming does not affects the original dataframe
-        df_external = pd.concat([df_segment_ref, df_segment_par]).drop_duplicates(
-            keep=False)  # this keeps rows that are unique (meaning that they connect to external nodes)
-
-        # Rename index
-        iref = df.index.get_level_values('ref').str.startswith(f'{target}(')
-        first_internal_name = df.index.get_level_values('ref')[iref].sort_values()[
-            0]  # we assume that sorting will sort it correctly: The first element is the first internal node
-        last_terminal_name = df.index.get_level_values('ref')[iref].sort_values()[
-            -1]  # and the last is the terminal node
+        ref_codes = self.catalog.encode_segments(df.index.get_level_values('ref'))
+        par_codes = self.catalog.encode_segments(df.index.get_level_values('par'))
+        ref_internal = self.catalog.in_section(ref_codes, target)  # iax rows where a segment of the target is the reference
+        par_internal = self.catalog.in_section(par_codes, target)  # iax rows where a segment of the target is the parent
+
+        # Select external iax connections (between parent and children nodes), this is a new copy
+        df_external = df[ref_internal ^ par_internal].copy()
+
+        # Rename the first internal node and the terminal node of the section to the section name
+        positions = self.catalog.positions[ref_codes[ref_internal]]
+        first_internal_name = self.catalog.segments[ref_codes[ref_internal][np.argmin(positions)]]
+        last_terminal_name = self.catalog.segments[ref_codes[ref_internal][np.argmax(positions)]]
         rename_dict = {first_internal_name: target,
                        last_terminal_name: target}
         df_external.rename(index=rename_dict, level='ref', inplace=True)
         df_external.rename(index=rename_dict, level='par', inplace=True)
 
         # Remove segment iax rows (both external and internal)
-        df_internal_idx = pd.concat([df_segment_ref, df_segment_par]).drop_duplicates().index
-        df.drop(df_internal_idx, inplace=True)
+        df = df[~(ref_internal | par_internal)]
 
         # Concatenate updated external iax rows
         df_merged = pd.concat([df, df_external])
@@ -1,6 +1,8 @@
+import numpy as np
 import pandas as pd
 import gc
 
+from SegmentCatalog import SegmentCatalog
 from preprocessor.utils.preprocess_intrinsic import preprocess_intrinsic
 from preprocessor.utils.preprocess_synaptic import preprocess_synaptic
 
@@ -9,16 +11,21 @@ class MembraneCurrentPreprocessor:
     """
     Preprocesses intrinsic and synaptic currents and combines them into membrane currents.
     """
-    def __init__(self) -> None:
+    def __init__(self, catalog: SegmentCatalog = None, dtype=np.float64) -> None:
         """
         Initializes the MembraneCurrentPreprocessor with an empty DataFrame.
 
         Args:
+            catalog (SegmentCatalog): The catalog used to encode segments and current types. A new catalog is
+                                      created if None.
+            dtype (np.dtype): The type of the membrane currents (see `Precision`).
             membrane_currents_combined (pd.DataFrame): A DataFrame containing combined membrane currents.
         """
+        self.catalog = catalog if catalog is not None else SegmentCatalog()
+        self.dtype = np.dtype(dtype)
         self.membrane_currents_combined = pd.DataFrame()
 
-    def combine_membrane_currents(self, simulation_data: dict) -> None:
+    def combine_membrane_currents(self, simulation_data: dict, timepoints: np.ndarray = None) -> None:
         """
         Combines intrinsic and synaptic currents into a single DataFrame.
 
@@ -29,6 +36,8 @@ class MembraneCurrentPreprocessor:
         Args:
             simulation_data (dict): The simulation data containing 'intrinsic_data', 'synaptic_data',
                                     and 'areas' used for preprocessing.
+            timepoints (np.ndarray or None): The timepoints (column indexes) to preprocess. The columns of the
+                                    combined DataFrame keep these indexes as labels. If None, all timepoints are used.
 
         Example of expected simulation_data structure:
             simulation_data = {
@@ -43,8 +52,8 @@ class MembraneCurrentPreprocessor:
         ssegments = simulation_data['synaptic_data'][0]
         svalues = simulation_data['synaptic_data'][1]
 
-        intrinsic = preprocess_intrinsic(isegments, ivalues, area)
-        synaptic = preprocess_synaptic(ssegments, svalues)
+        intrinsic = preprocess_intrinsic(isegments, ivalues, area, timepoints, self.dtype)
+        synaptic = preprocess_synaptic(ssegments, svalues, timepoints, self.dtype)
 
         # Create merged dataframe
         dfs = intrinsic + synaptic
@@ -55,20 +64,23 @@ class MembraneCurrentPreprocessor:
         del dfs
         gc.collect()
 
-        df_im['index'] = df_im['index'].astype('category')
-        df_im['itype'] = df_im['itype'].astype('category')
-
-        # Calculate and set multiindex
-        segments = df_im['index'].unique()
-        itypes = df_im['itype'].unique()
-
-        multi_index = pd.MultiIndex.from_product([segments, itypes], names=['segment', 'itype'])
-        df_im_combined = df_im.set_index(['index', 'itype']).reindex(multi_index)
-        del df_im
+        # Rows of the (segment, itype) product, in order of appearance of the segment and itype codes
+        segment_codes = self.catalog.encode_segments(df_im['index'])
+        itype_codes = self.catalog.encode_itypes(df_im['itype'])
+        segment_rows, segments = pd.factorize(segment_codes)
+        itype_rows, itypes = pd.factorize(itype_codes)
+        rows = segment_rows * len(itypes) + itype_rows
+
+        values = df_im.drop(columns=['index', 'itype']).to_numpy(dtype=self.dtype)
+        combined = np.zeros((len(segments) * len(itypes), values.shape[1]), dtype=self.dtype)
+        combined[rows] = values
+        columns = df_im.columns.drop(['index', 'itype']).astype(int)
+        del df_im, values
         gc.collect()
 
-        df_im_combined = df_im_combined.fillna(0)
-        df_im_combined.columns = df_im_combined.columns.astype(int)
+        multi_index = pd.MultiIndex.from_product([self.catalog.segment_names(segments),
+                                                  self.catalog.itype_names(itypes)], names=['segment', 'itype'])
+        df_im_combined = pd.DataFrame(data=combined, index=multi_index, columns=columns)
         self.membrane_currents_combined = df_im_combined
 
 
@@ -85,8 +97,9 @@ class MembraneCurrentPreprocessor:
         Returns:
             pd.DataFrame: A DataFrame with merged membrane currents for the target section.
         """
-        df_section = self.membrane_currents_combined[self.membrane_currents_combined.index.get_level_values(0).str.startswith(
-            f'{target}(')]  # select all rows belonging to the given segment
+        segment_codes = self.catalog.encode_segments(self.membrane_currents_combined.index.get_level_values(0))
+        df_section = self.membrane_currents_combined[
+            self.catalog.in_section(segment_codes, target)]  # select all rows belonging to the given section
         df_summed_by_itype = df_section.groupby(level='itype', observed=False).sum()  # sum dataframe by current type for each time point
         df_summed_by_itype = df_summed_by_itype.reset_index()
         df_summed_by_itype['segment'] = target
@@ -1,7 +1,17 @@
+import numpy as np
 import pandas as pd
 
+from SegmentCatalog import SegmentCatalog
+from Instrumentation import Instrumentation, nbytes
+from Precision import get_dtype
 from preprocessor.MembraneCurrentPreprocessor import MembraneCurrentPreprocessor
 from preprocessor.AxialCurrentPreprocessor import AxialCurrentPreprocessor
+from preprocessor.utils.current_balance import validate_current_balance, BALANCE_TOLERANCE
+
+# Engines calculating the axial currents: from the membrane potentials of all segments ('voltage') or as the
+# membrane current of the downstream subtree ('accumulated')
+AXIAL_ENGINES = ('voltage', 'accumulated')
+
 
 class Preprocessor:
     """
@@ -12,15 +22,39 @@ class Preprocessor:
     Attributes:
         simulation_data (dict): The data used for preprocessing, derived from simulations.
         target (str): The target section for current preprocessing, defaulting to 'soma'.
+        timepoints (np.ndarray or None): The timepoints (column indexes) that are preprocessed: the samples of the
+            analysis window (tmin < t < tmax) extended by `padding` samples on both sides. None if no window is given,
+            in which case the whole simulation is preprocessed.
+        catalog (SegmentCatalog): The segment catalog of the model (simulation_data['catalog']), shared by the
+            membrane and axial current preprocessors. Created from the recorded segments if missing.
         membrane_current_preprocessor (MembraneCurrentPreprocessor): An instance for handling membrane currents.
         axial_current_preprocessor (AxialCurrentPreprocessor): An instance for handling axial currents.
+        instrumentation (Instrumentation): Measures the preprocessing steps (disabled if not given).
+        axial_engine (str): How the axial currents are calculated: 'voltage' from the membrane potentials of all
+            segments, or 'accumulated' from the membrane currents of the downstream subtree of each connection (see
+            `AxialCurrentPreprocessor.accumulate_axial_currents`), which does not need the membrane potentials and
+            balances the currents exactly.
+        dtype (np.dtype): The type of the preprocessed currents, set by the `precision` ('float32' or 'float64', see
+            `Precision`).
     """
 
-    def __init__(self, simulation_data: dict) -> None:
+    def __init__(self, simulation_data: dict, tmin: float = None, tmax: float = None, padding: int = 0,
+                 instrumentation: Instrumentation = None, axial_engine: str = 'voltage',
+                 precision: str = 'float64') -> None:
+        if axial_engine not in AXIAL_ENGINES:
+            raise ValueError(f"Unknown axial current engine '{axial_engine}'. Available engines: "
+                             f"{', '.join(AXIAL_ENGINES)}.")
         self.simulation_data = simulation_data
         self.target = 'soma'  # soma is always the target compartment for the preprocessing steps
-        self.membrane_current_preprocessor = MembraneCurrentPreprocessor()
-        self.axial_current_preprocessor = AxialCurrentPreprocessor()
+        self.timepoints = get_window_timepoints(simulation_data['taxis'], tmin, tmax, padding)
+        self.catalog = simulation_data.get('catalog')
+        if self.catalog is None:
+            self.catalog = SegmentCatalog(simulation_data['membrane_potential_data'][0])
+        self.dtype = get_dtype(precision)
+        self.membrane_current_preprocessor = MembraneCurrentPreprocessor(self.catalog, self.dtype)
+        self.axial_current_preprocessor = AxialCurrentPreprocessor(self.catalog, self.dtype)
+        self.instrumentation = instrumentation if instrumentation is not None else Instrumentation(enabled=False)
+        self.axial_engine = axial_engine
 
     def preprocess_membrane_currents(self) -> pd.DataFrame:
         """
@@ -31,19 +65,85 @@ class Preprocessor:
             pd.DataFrame: A DataFrame containing processed membrane current data.
         """
         print("Preprocessing membrane currents...")
-        self.membrane_current_preprocessor.combine_membrane_currents(self.simulation_data)
-        im = self.membrane_current_preprocessor.merge_section_im(self.target)
+        with self.instrumentation.stage('membrane_currents') as metrics:
+            self.membrane_current_preprocessor.combine_membrane_currents(self.simulation_data, self.timepoints)
+            im = self.membrane_current_preprocessor.merge_section_im(self.target)
+            metrics['segments'] = im.index.get_level_values(0).nunique()
+            metrics['timepoints'] = im.shape[1]
+            metrics['im_bytes'] = nbytes(im)
         return im
 
     def preprocess_axial_currents(self) -> pd.DataFrame:
         """
         Preprocesses axial currents using the AxialCurrentPreprocessor.
-        Calculates and merges axial currents based on the target section.
+        Calculates (with the `axial_engine`) and merges axial currents based on the target section.
 
         Returns:
             pd.DataFrame: A DataFrame containing processed axial current data.
         """
         print('Preprocessing axial currents...')
-        self.axial_current_preprocessor.calculate_axial_currents(self.simulation_data)
-        iax = self.axial_current_preprocessor.merge_section_iax(self.target)
+        with self.instrumentation.stage('axial_currents', engine=self.axial_engine) as metrics:
+            if self.axial_engine == 'accumulated':
+                if self.membrane_current_preprocessor.membrane_currents_combined.empty:
+                    self.membrane_current_preprocessor.combine_membrane_currents(self.simulation_data,
+                                                                                 self.timepoints)
+                self.axial_current_preprocessor.accumulate_axial_currents(
+                    self.simulation_data, self.membrane_current_preprocessor.membrane_currents_combined)
+            else:
+                self.axial_current_preprocessor.calculate_axial_currents(self.simulation_data, self.timepoints)
+            iax = self.axial_current_preprocessor.merge_section_iax(self.target)
+            metrics['edges'] = iax.shape[0]
+            metrics['timepoints'] = iax.shape[1]
+            metrics['iax_bytes'] = nbytes(iax)
         return iax
+
+    def validate_current_balance(self, im: pd.DataFrame, iax: pd.DataFrame) -> dict:
+        """
+        Checks that the preprocessed membrane and axial currents are conserved at every node (see
+        `preprocessor.utils.current_balance`). The result, including the worst nodes and timepoints, is added to the
+        'current_balance' stage of the instrumentation report, and a warning is printed if the currents are not
+        balanced.
+
+        Args:
+            im (pd.DataFrame): The preprocessed membrane currents.
+            iax (pd.DataFrame): The preprocessed axial currents.
+
+        Returns:
+            dict: The result of the check (see `validate_current_balance`).
+        """
+        with self.instrumentation.stage('current_balance') as metrics:
+            # The currents are rounded to the precision of the data
+            tolerance = max(BALANCE_TOLERANCE, 100 * np.finfo(self.dtype).eps)
+            balance = validate_current_balance(im, iax, self.target, tolerance=tolerance)
+            metrics['edges'] = iax.shape[0]
+            metrics['timepoints'] = iax.shape[1]
+            metrics.update(balance)
+        if not balance['balance_ok']:
+            worst = balance['balance_worst_nodes'][0]
+            print(f"Warning: the preprocessed currents are not balanced. The largest imbalance is "
+                  f"{worst['residual']:.3g} nA at {worst['node']} (timepoint {worst['timepoint']}).")
+        return balance
+
+
+def get_window_timepoints(taxis: np.ndarray, tmin: float = None, tmax: float = None, padding: int = 0) -> np.ndarray:
+    """
+    Returns the timepoints (column indexes) of the analysis window tmin < t < tmax, extended by `padding` samples on
+    both sides.
+
+    Args:
+        taxis (np.ndarray): The time axis of the simulation data.
+        tmin (float or None): Start of the analysis window in milliseconds.
+        tmax (float or None): End of the analysis window in milliseconds.
+        padding (int): The number of additional samples kept before and after the window.
+
+    Returns:
+        np.ndarray or None: The column indexes to preprocess, or None if no window is given.
+    """
+    if tmin is None and tmax is None:
+        return None
+    tmin = -np.inf if tmin is None else tmin
+    tmax = np.inf if tmax is None else tmax
+    window = np.flatnonzero((taxis > tmin) & (taxis < tmax))
+    if len(window) == 0:
+        raise ValueError(f"The analysis window ({tmin}, {tmax}) ms does not contain any timepoints.")
+    return np.arange(max(window[0] - padding, 0), min(window[-1] + padding + 1, len(taxis)))
@@ -0,0 +1,111 @@
+import numpy as np
+import pandas as pd
+
+from scipy import sparse
+
+# Largest current imbalance of a node, relative to the largest axial current, that is accepted as rounding
+BALANCE_TOLERANCE = 1e-6
+
+
+def create_incidence_matrix(iax_index: pd.MultiIndex, nodes: pd.Index) -> sparse.csr_matrix:
+    """
+    Creates the sparse (node x edge) incidence matrix of the axial currents.
+
+    The axial current of an edge (ref, par) flows from `par` into `ref`, so its column is +1 at the row of `ref` and
+    -1 at the row of `par`. Multiplying the matrix with the axial currents gives the net axial inflow of every node.
+
+    Args:
+        iax_index (pd.MultiIndex): The (ref, par) index of the axial currents.
+        nodes (pd.Index): The nodes (rows of the matrix), containing all nodes of the edges.
+
+    Returns:
+        sparse.csr_matrix: The incidence matrix.
+    """
+    n_edges = len(iax_index)
+    rows = np.concatenate([nodes.get_indexer(iax_index.get_level_values(0)),
+                           nodes.get_indexer(iax_index.get_level_values(1))])
+    columns = np.tile(np.arange(n_edges), 2)
+    values = np.concatenate([np.ones(n_edges), -np.ones(n_edges)])
+    return sparse.csr_matrix((values, (rows, columns)), shape=(len(nodes), n_edges))
+
+
+def get_current_balance(im: pd.DataFrame, iax: pd.DataFrame) -> pd.DataFrame:
+    """
+    Calculates the current imbalance of every node: its net axial inflow minus its total membrane current (nA).
+    The imbalance is zero if the currents are conserved (Kirchhoff's current law), except at the root of the tree,
+    whose imbalance is the net membrane current of the whole cell.
+
+    Both sums are sparse matrix products over the rows of `im` and `iax`, so the cost is linear in their size.
+
+    Args:
+        im (pd.DataFrame): The membrane currents indexed by (segment, itype).
+        iax (pd.DataFrame): The axial currents indexed by (ref, par), with the same timepoints as `im`.
+
+    Returns:
+        pd.DataFrame: The imbalance of each node (rows) at each timepoint (columns).
+    """
+    segments = pd.Index(np.asarray(im.index.levels[0], dtype=object))
+    nodes = segments.append(pd.Index(np.asarray(iax.index.get_level_values(0), dtype=object))).append(
+        pd.Index(np.asarray(iax.index.get_level_values(1), dtype=object))).unique()
+    # Sums the membrane currents of all itypes of each node
+    node_codes = nodes.get_indexer(segments)[im.index.codes[0]]
+    summation = sparse.csr_matrix((np.ones(len(node_codes)), (node_codes, np.arange(len(node_codes)))),
+                                  shape=(len(nodes), len(node_codes)))
+    incidence = create_incidence_matrix(iax.index, nodes)
+    if not im.columns.equals(iax.columns):
+        im = im.loc[:, iax.columns]
+    residual = incidence @ iax.to_numpy(dtype=np.float64) - summation @ im.to_numpy(dtype=np.float64)
+    return pd.DataFrame(residual, index=nodes, columns=iax.columns)
+
+
+def validate_current_balance(im: pd.DataFrame, iax: pd.DataFrame, root: str = 'soma', n_worst: int = 5,
+                             tolerance: float = BALANCE_TOLERANCE) -> dict:
+    """
+    Checks that the preprocessed currents are conserved at every node but the root (see `get_current_balance`).
+
+    Args:
+        im (pd.DataFrame): The membrane currents indexed by (segment, itype).
+        iax (pd.DataFrame): The axial currents indexed by (ref, par).
+        root (str): The root node of the axial currents, which is not checked.
+        n_worst (int): The number of worst nodes and timepoints that are reported.
+        tolerance (float): The accepted imbalance, relative to the largest absolute axial current.
+
+    Returns:
+        dict: The metrics of the check:
+            - 'balance_root_residual': The largest absolute imbalance of the root, i.e. the net membrane current of
+              the cell (nA).
+            - 'balance_max_residual': The largest absolute imbalance (nA).
+            - 'balance_max_relative': The largest absolute imbalance relative to the largest absolute axial current.
+            - 'balance_ok': Whether the largest relative imbalance is within the tolerance.
+            - 'balance_worst_nodes': The nodes with the largest imbalances, with the timepoint of their largest
+              imbalance.
+            - 'balance_worst_timepoints': The timepoints with the largest imbalances, with the node of their largest
+              imbalance.
+    """
+    residual = get_current_balance(im, iax)
+    is_root = residual.index == root
+    root_residual = float(np.abs(residual.to_numpy()[is_root]).max(initial=0.0))
+    residual = residual[~is_root]
+    abs_residual = np.abs(residual.to_numpy())
+    if abs_residual.size == 0:
+        return {'balance_root_residual': root_residual, 'balance_max_residual': 0.0, 'balance_max_relative': 0.0,
+                'balance_ok': True, 'balance_worst_nodes': [], 'balance_worst_timepoints': []}
+    scale = np.abs(iax.to_numpy(dtype=np.float64)).max()
+    max_residual = abs_residual.max()
+    max_relative = max_residual / scale if scale > 0 else 0.0
+
+    worst_timepoint_of_node = abs_residual.argmax(axis=1)
+    node_residuals = abs_residual[np.arange(abs_residual.shape[0]), worst_timepoint_of_node]
+    worst_nodes = [{'node': str(residual.index[i]), 'timepoint': residual.columns[worst_timepoint_of_node[i]],
+                    'residual': float(residual.iat[i, worst_timepoint_of_node[i]])}
+                   for i in np.argsort(-node_residuals, kind='stable')[:n_worst]]
+
+    worst_node_of_timepoint = abs_residual.argmax(axis=0)
+    timepoint_residuals = abs_residual[worst_node_of_timepoint, np.arange(abs_residual.shape[1])]
+    worst_timepoints = [{'timepoint': residual.columns[j], 'node': str(residual.index[worst_node_of_timepoint[j]]),
+                         'residual': float(residual.iat[worst_node_of_timepoint[j], j])}
+                        for j in np.argsort(-timepoint_residuals, kind='stable')[:n_worst]]
+
+    return {'balance_root_residual': root_residual, 'balance_max_residual': float(max_residual),
+            'balance_max_relative': float(max_relative), 'balance_ok': bool(max_relative <= tolerance),
+            'balance_worst_nodes': worst_nodes, 'balance_worst_timepoints': worst_timepoints}
@@ -1,3 +1,4 @@
+import numpy as np
 import pandas as pd
 import networkx as nx
 
@@ -111,4 +112,54 @@ def create_directed_graph(iax: pd.DataFrame, tp: int) -> nx.DiGraph:
             dg.add_edge(row['par'], row['ref'], iax=row['iax'])  # par -> ref if 'iax_timepoint' is positive
         elif row['iax'] < 0:
             dg.add_edge(row['ref'], row['par'], iax=row['iax'])  # ref -> par if 'iax_timepoint' is negative
-    return dg
\ No newline at end of file
+    return dg
+
+def get_node_depths(parents: np.ndarray) -> np.ndarray:
+    """
+    Returns the depth of every node of a forest given by parent indexes (0 for the roots).
+
+    The depths are calculated by pointer jumping: in each pass every node adds the depth accumulated by its current
+    ancestor and jumps to that ancestor's ancestor, so the number of vectorized passes grows with the logarithm of
+    the tree depth.
+
+    Parameters:
+        parents (np.ndarray): The index of the parent of each node, -1 for the roots.
+
+    Returns:
+        np.ndarray: The number of edges between each node and its root.
+    """
+    depths = (parents >= 0).astype(np.int64)
+    ancestors = parents.copy()
+    jumping = np.flatnonzero(ancestors >= 0)
+    while len(jumping) > 0:
+        depths[jumping] += depths[ancestors[jumping]]
+        ancestors[jumping] = ancestors[ancestors[jumping]]
+        jumping = jumping[ancestors[jumping] >= 0]
+    return depths
+
+
+def accumulate_subtrees(values: np.ndarray, parents: np.ndarray) -> np.ndarray:
+    """
+    Sums the values of every node over its subtree (the node and all its descendants).
+
+    The nodes are visited in postorder, one depth level at a time from the deepest level: the accumulated sums of
+    the siblings of each level are added to their parent in a single vectorized operation.
+
+    Parameters:
+        values (np.ndarray): The values of each node (node x timepoint).
+        parents (np.ndarray): The index of the parent of each node, -1 for the roots.
+
+    Returns:
+        np.ndarray: The subtree sums (node x timepoint).
+    """
+    subtrees = np.array(values, dtype=np.float64, order='C')
+    depths = get_node_depths(parents)
+    # Nodes sorted by depth and, within a level, by parent, so that siblings are contiguous
+    order = np.lexsort((parents, depths))
+    level_starts = np.searchsorted(depths[order], np.arange(depths.max(initial=0) + 2))
+    for depth in range(depths.max(initial=0), 0, -1):
+        nodes = order[level_starts[depth]:level_starts[depth + 1]]
+        level_parents = parents[nodes]
+        first_siblings = np.flatnonzero(np.r_[True, level_parents[1:] != level_parents[:-1]])
+        subtrees[level_parents[first_siblings]] += np.add.reduceat(subtrees[nodes], first_siblings, axis=0)
+    return subtrees
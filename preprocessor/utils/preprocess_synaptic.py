@@ -1,15 +1,20 @@
+import numpy as np
 import pandas as pd
 
 
-def preprocess_synaptic(segments, values):
+def preprocess_synaptic(segments, values, timepoints=None, dtype=np.float64):
     currents = list(segments.keys())
     dfs = []
     for curr in currents:
         seg = segments[curr]
         val = values[curr]
-        df = pd.DataFrame(data=val, index=seg)
+        if timepoints is None:
+            df = pd.DataFrame(data=val, index=seg)
+        else:
+            df = pd.DataFrame(data=val[:, timepoints], index=seg, columns=timepoints)
         df = df.reset_index()
         df_summed = df.groupby('index', as_index=False).sum()
+        df_summed = df_summed.astype(dict.fromkeys(df_summed.columns[1:], dtype))
         df_summed.insert(1, 'itype', curr)
         df_summed[['index', 'itype']] = df_summed[['index', 'itype']].astype('category')
         dfs.append(df_summed)
@@ -1,13 +1,22 @@
+import numpy as np
 import pandas as pd
 from neuron import h
 
 import simulator.model.simulation as simulation
-from simulator.model.ca1_model import CA1
-from simulator.model.ca1_functions import init_activeCA1, add_syns
-from simulator.model.ca1_functions import genDendLocs
-from simulator.model.sim_functions import SIM_nsynIteration
+from SegmentCatalog import SegmentCatalog
+from Instrumentation import Instrumentation, nbytes
+from simulator.model.ca1_model import CA1, CA1Copy
+from simulator.model.ca1_functions import init_activeCA1, add_syns, add_gaba_syns
+from simulator.model.ca1_functions import genDendLocs, genRandomLocs
+from simulator.model.sim_functions import SIM_nsynIteration, SIM_batch
 from simulator.model.utils.extract_connections import get_external_connections, get_internal_connections, get_connections
 from simulator.model.utils.extract_areas import get_segment_areas
+from simulator.model.utils.extract_morphology import get_segment_distances, get_branch_orders
+from simulator.model.utils.spike_trains import load_spike_trains
+
+# Background spike trains (one 'source time' event per line) of the excitatory and inhibitory populations
+BACKGROUND_INPUT = {'excitatory': 'simulator/model/synaptic_input/Espikes_d10_Ne2000_Re0.5_rseed1_rep0.dat',
+                    'inhibitory': 'simulator/model/synaptic_input/Ispikes_d10_Ni200_Ri7.4_rseed1_rep0.dat'}
 
 class ModelSimulator:
     """
@@ -17,18 +26,29 @@ class ModelSimulator:
     segment connections and segment areas.
     """
 
-    def __init__(self):
+    def __init__(self, instrumentation: Instrumentation = None):
         """
        Initialize the ModelSimulator object.
 
        Args:
+           instrumentation (Instrumentation or None): Measures the model building and simulation stages.
            connections (dict): Stores internal and external segment connections for later processing.
            segment_areas (pd.DataFrame): DataFrame containing segment name and segment area information.
+           segment_distances (pd.DataFrame): DataFrame containing the distance of each segment from the soma.
+           branch_orders (pd.DataFrame): DataFrame containing the branch order of each section.
+           catalog (SegmentCatalog): Integer codes of the segments, sections and current types of the model.
+           background_trains (dict): The background spike trains (`SpikeTrains`) of each population, if any.
        """
         self.connections = {}
         self.segment_areas = pd.DataFrame()
+        self.segment_distances = pd.DataFrame()
+        self.branch_orders = pd.DataFrame()
+        self.catalog = SegmentCatalog()
+        self.background_trains = {}
+        self.instrumentation = instrumentation if instrumentation is not None else Instrumentation(enabled=False)
 
-    def build_model(self, ca: bool, stimulated_dend: int, nsyn: int) -> CA1:
+    def build_model(self, ca: bool, stimulated_dend: int, nsyn: int, aggregate_synapses: bool = False,
+                    background_input: dict = None, seed: int = None) -> CA1:
         """
         Build the CA1 hippocampal model with synaptic inputs.
 
@@ -36,27 +56,56 @@ class ModelSimulator:
             ca (bool): Whether to have R-type Ca2+ (and slow K+) active or not.
             stimulated_dend (int): The dendrite to stimulate.
             nsyn (int): The number of synaptic inputs to add to the model.
+            aggregate_synapses (bool): Whether synapses in the same segment share their point processes, so that
+                synaptic currents are recorded per (segment, receptor type) instead of per synapse.
+            background_input (dict or None): Paths of the 'excitatory' and (optionally) 'inhibitory' background
+                spike-train files (see `BACKGROUND_INPUT`). Each source gets a synapse at a random dendritic location.
+            seed (int or None): Seed of a randomized trial. If given, the stimulated synapses are placed at random
+                positions of the stimulated dendrite and the background synapses at locations drawn from this seed.
+                If None, the stimulated synapses are evenly spaced and the background locations are fixed.
 
         Returns:
             CA1: A configured instance of the CA1 model.
         """
         print("Building CA1 model...")
+        with self.instrumentation.stage('build_model') as metrics:
+            model = self._build_model(ca, stimulated_dend, nsyn, aggregate_synapses, background_input, seed)
+            metrics['segments'] = len(self.segment_areas)
+            metrics['synapses'] = len(model.ncAMPAlist)
+        return model
+
+    def _build_model(self, ca: bool, stimulated_dend: int, nsyn: int, aggregate_synapses: bool,
+                     background_input: dict, seed: int) -> CA1:
         # Create and initialize the CA1 model
         model = CA1()
         init_activeCA1(model, ca)
 
         # Generate synapse locations on the dendrites and add synapses to the model
-        Elocs = genDendLocs(stimulated_dend, nsyn)
-        add_syns(model, Elocs)
+        # Independent seeds of the stimulated, background excitatory and background inhibitory locations
+        seeds = [None, 1, 2] if seed is None else np.random.SeedSequence(seed).generate_state(3).tolist()
+        Elocs = genDendLocs(stimulated_dend, nsyn, seed=seeds[0])
+        if background_input is not None:
+            # Background excitatory synapses follow the stimulated ones
+            self.background_trains = {population: load_spike_trains(path)
+                                      for population, path in background_input.items()}
+            Elocs = Elocs + genRandomLocs(model, self.background_trains['excitatory'].n_sources, seed=seeds[1])
+            if 'inhibitory' in self.background_trains:
+                Ilocs = genRandomLocs(model, self.background_trains['inhibitory'].n_sources, seed=seeds[2])
+                add_gaba_syns(model, Ilocs, aggregate_synapses)
+        add_syns(model, Elocs, aggregate_synapses)
 
         # Get connections and segment area data
         self.connections['external'] = get_external_connections()
         self.connections['internal'] = get_internal_connections()
         self.segment_areas = get_segment_areas()
+        self.segment_distances = get_segment_distances()
+        self.branch_orders = get_branch_orders()
+        self.catalog = SegmentCatalog(self.segment_areas.index)
         return model
 
     def run_simulation(self, model: CA1, nsyn: int, t_interval: float, onset: int, direction: str,
-                       t_stop: int) -> dict:
+                       t_stop: int, recording_profile: str = 'full', target: str = 'soma',
+                       precision: str = 'float64') -> dict:
         """
         Run a simulation with the specified parameters.
 
@@ -72,14 +121,86 @@ class ModelSimulator:
             onset (int): The onset time for the start of the simulation in miliseconds.
             direction (str): The direction of the simulation (e.g., IN or OUT).
             t_stop (int): The stop time for the end of the simulation in milliseconds.
+            recording_profile (str): The recording profile, which selects the recorded variables:
+                'full', 'currentscape-minimal', 'currentscape-accumulated' or 'vm-target' (see
+                `RECORDING_PROFILES`).
+            target (str): The target section, for profiles that only record the target.
+            precision (str): The precision of the recorded currents ('float32' or 'float64', see `Precision`). The
+                membrane potentials are always kept in float64.
 
         Returns:
             dict: A dictionary containing simulation data, connections information,
-            and segment area details.
+            segment area details, segment distances from the soma, section branch orders and the segment catalog.
         """
         print("Running simulation...")
-        simulation_data = SIM_nsynIteration(model, nsyn=nsyn, t_interval=t_interval, onset=onset,
-                                            direction=direction, t_stop=t_stop)
+        background_events = None
+        if self.background_trains:
+            background_events = {population: trains.events(tmax=t_stop)
+                                 for population, trains in self.background_trains.items()}
+        with self.instrumentation.stage('run_simulation') as metrics:
+            simulation_data = SIM_nsynIteration(model, nsyn=nsyn, t_interval=t_interval, onset=onset,
+                                                direction=direction, t_stop=t_stop,
+                                                background_events=background_events,
+                                                recording_profile=recording_profile, target=target,
+                                                precision=precision)
+            metrics['timepoints'] = len(simulation_data['taxis'])
+            metrics['recorded_bytes'] = nbytes(simulation_data['membrane_potential_data'],
+                                               simulation_data['intrinsic_data'], simulation_data['synaptic_data'])
         simulation_data['connections'] = get_connections(self.connections['external'], self.connections['internal'])
         simulation_data['areas'] = self.segment_areas
+        simulation_data['distances'] = self.segment_distances
+        simulation_data['branch_orders'] = self.branch_orders
+        simulation_data['catalog'] = self.catalog
         return simulation_data
+
+    def build_batch(self, ca: bool, configs: list[dict], aggregate_synapses: bool = False) -> list:
+        """
+        Build several independent copies of the CA1 model in the same process, each with its own synaptic inputs.
+
+        The first configuration is built as the prototype model (see `build_model`); the other cells are copies of
+        the prototype (`CA1Copy`) and share its morphology, biophysics, connections and segment data.
+
+        Args:
+            ca (bool): Whether to have R-type Ca2+ (and slow K+) active or not (the same for all cells).
+            configs (list[dict]): The 'stim_dend' and 'nsyn' of each cell.
+            aggregate_synapses (bool): See `build_model`.
+
+        Returns:
+            list: The prototype `CA1` model followed by its copies, one per configuration.
+        """
+        prototype = self.build_model(ca, configs[0]['stim_dend'], configs[0]['nsyn'], aggregate_synapses)
+        models = [prototype]
+        print(f"Copying CA1 model {len(configs) - 1} times...")
+        for index, config in enumerate(configs[1:], start=1):
+            model = CA1Copy(prototype, index)
+            add_syns(model, genDendLocs(config['stim_dend'], config['nsyn']), aggregate_synapses)
+            models.append(model)
+        return models
+
+    def run_batch(self, models: list, configs: list[dict], t_stop: int, recording_profile: str = 'full',
+                  target: str = 'soma', precision: str = 'float64') -> list[dict]:
+        """
+        Simulate the cells of `build_batch` together and split the results into one simulation data dictionary
+        per configuration (see `run_simulation`).
+
+        Args:
+            models (list): The cells returned by `build_batch`.
+            configs (list[dict]): The 'nsyn', 't_interval', 'onset' and 'direction' of each cell.
+            t_stop (int): The stop time for the end of the simulation in milliseconds.
+            recording_profile (str): See `run_simulation`.
+            target (str): See `run_simulation`.
+            precision (str): See `run_simulation`.
+
+        Returns:
+            list[dict]: The simulation data of each configuration.
+        """
+        print(f"Running simulation of {len(models)} cells...")
+        simulation_data_batch = SIM_batch(models, configs, t_stop, recording_profile, target, precision)
+        connections = get_connections(self.connections['external'], self.connections['internal'])
+        for simulation_data in simulation_data_batch:
+            simulation_data['connections'] = connections
+            simulation_data['areas'] = self.segment_areas
+            simulation_data['distances'] = self.segment_distances
+            simulation_data['branch_orders'] = self.branch_orders
+            simulation_data['catalog'] = self.catalog
+        return simulation_data_batch
@@ -163,19 +163,26 @@ def init_activeCA1(model: CA1, ca: bool) -> None:
             sec.gmax_kslow = 0.001
 
 
-def add_syns(model: CA1, Elocs: list[list[int, float]]):
+def add_syns(model: CA1, Elocs: list[list[int, float]], aggregate: bool = False):
     """
     Adds AMPA and NMDA synapses to the specified locations on the model's neuronal structure.
     This function defines two types of synaptic channels (AMPA and NMDA) with their specific
     parameters and attaches them to the corresponding locations in the dendrites of
     the model.
 
+    Each location gets its own NetCon in `ncAMPAlist` and `ncNMDAlist` (in the order of `Elocs`). With
+    `aggregate=True`, the locations that fall into the same segment share a single AMPA and NMDA point process,
+    so `AMPAlist` and `NMDAlist` hold one synapse per segment and the recorded synaptic currents are already summed
+    per (segment, receptor type). This is exact, as the conductances of both mechanisms are linear in the summed
+    synaptic weights and the Mg2+ block of the NMDA current only depends on the membrane potential of the segment.
+
     Parameters:
         model (CA1): The neuronal model to which the synapses will be added.
         Elocs (list[list[int, float]]): A list of locations where synapses will
             be added. Each location is represented as a list containing two elements:
             an integer representing the index of a dendritic section,
             and a float representing the position along the section.
+        aggregate (bool): Whether synapses in the same segment share their point processes.
     """
 
     model.AMPAlist = []
@@ -186,6 +193,7 @@ def add_syns(model: CA1, Elocs: list[list[int, float]]):
     model.ncNMDAlist = []
     NMDA_gmax = 0.8 / 1000.  # Set in nS and convert to muS
 
+    segment_synapses = {}  # (AMPA, NMDA) point processes of each segment, used when aggregating
     for loc in Elocs:
         locInd = int(loc[0])
         if (locInd == -1):
@@ -194,22 +202,88 @@ def add_syns(model: CA1, Elocs: list[list[int, float]]):
             synloc = model.dends[int(loc[0])]
             synpos = float(loc[1])
 
-        AMPA = h.Exp2Syn(synpos, sec=synloc)
-        AMPA.tau1 = 0.1
-        AMPA.tau2 = 1
+        segment = str(synloc(synpos))
+        if aggregate and segment in segment_synapses:
+            AMPA, NMDA = segment_synapses[segment]
+        else:
+            AMPA = h.Exp2Syn(synpos, sec=synloc)
+            AMPA.tau1 = 0.1
+            AMPA.tau2 = 1
+            model.AMPAlist.append(AMPA)
+
+            NMDA = h.Exp2SynNMDA(synpos, sec=synloc)
+            NMDA.tau1 = 2
+            NMDA.tau2 = 50
+            model.NMDAlist.append(NMDA)
+            segment_synapses[segment] = (AMPA, NMDA)
+
         NC = h.NetCon(h.nil, AMPA, 0, 0, AMPA_gmax)  # NetCon(source, target, threshold, delay, weight)
-        model.AMPAlist.append(AMPA)
         model.ncAMPAlist.append(NC)
-
-        NMDA = h.Exp2SynNMDA(synpos, sec=synloc)
-        NMDA.tau1 = 2
-        NMDA.tau2 = 50
         NC = h.NetCon(h.nil, NMDA, 0, 0, NMDA_gmax)
-        model.NMDAlist.append(NMDA)
         model.ncNMDAlist.append(NC)
 
 
-def genDendLocs(stimulated_dend: int, nsyn: int, spread: list[float] = [0.4, 0.6]) -> list[list[int, float]]:
+def add_gaba_syns(model: CA1, Ilocs: list[list[int, float]], aggregate: bool = False):
+    """
+    Adds GABA-A synapses to the specified locations of the model, in the same way as `add_syns`.
+
+    Parameters:
+        model (CA1): The neuronal model to which the synapses will be added.
+        Ilocs (list[list[int, float]]): The dendritic section index and position of each synapse.
+        aggregate (bool): Whether synapses in the same segment share their point process.
+    """
+    model.GABAlist = []
+    model.ncGABAlist = []
+    GABA_gmax = 1.0 / 1000.  # Set in nS and convert to muS
+
+    segment_synapses = {}
+    for loc in Ilocs:
+        synloc = model.dends[int(loc[0])]
+        synpos = float(loc[1])
+
+        segment = str(synloc(synpos))
+        if aggregate and segment in segment_synapses:
+            GABA = segment_synapses[segment]
+        else:
+            GABA = h.Exp2Syn(synpos, sec=synloc)
+            GABA.tau1 = 0.1
+            GABA.tau2 = 4
+            GABA.e = -80
+            model.GABAlist.append(GABA)
+            segment_synapses[segment] = GABA
+
+        NC = h.NetCon(h.nil, GABA, 0, 0, GABA_gmax)
+        model.ncGABAlist.append(NC)
+
+
+def genRandomLocs(model: CA1, nsyn: int, seed: int = 1) -> list[list[int, float]]:
+    """
+    Generate random dendritic locations for background synapses.
+
+    The dendrite of each synapse is drawn with a probability proportional to its length, and the position along
+    the dendrite is drawn uniformly.
+
+    Parameters:
+    model: CA1
+        The model whose dendrites receive the synapses.
+    nsyn: int
+        The number of synapses.
+    seed: int
+        Seed of the random number generator.
+
+    Returns:
+    list[list[int, float]]
+        A list of locations (dendrite index, relative position), in the format of `genDendLocs`.
+    """
+    rng = np.random.default_rng(seed)
+    lengths = np.array([dend.L for dend in model.dends])
+    dends = rng.choice(len(lengths), size=nsyn, p=lengths / lengths.sum())
+    positions = rng.uniform(0, 1, size=nsyn)
+    return [[int(dend), float(pos)] for dend, pos in zip(dends, positions)]
+
+
+def genDendLocs(stimulated_dend: int, nsyn: int, spread: list[float] = [0.4, 0.6],
+                seed: int = None) -> list[list[int, float]]:
     """
     Generate dendritic locations for synapses.
 
@@ -225,6 +299,9 @@ def genDendLocs(stimulated_dend: int, nsyn: int, spread: list[float] = [0.4, 0.6
     spread: list[float]
         A list with two float values defining the range for synapse placement along
         the dendrite, given as [start, end]. The default range is [0.4, 0.6].
+    seed: int or None
+        If given, the synapses are placed at random (uniformly distributed) positions within the range, drawn with
+        this seed, instead of evenly.
 
     Returns:
     list[list[int, float]]
@@ -233,8 +310,11 @@ def genDendLocs(stimulated_dend: int, nsyn: int, spread: list[float] = [0.4, 0.6
     """
     locs = []
 
-    isd = (spread[1]-spread[0])/float(nsyn)
-    pos = np.arange(spread[0], spread[1], isd)[0:nsyn]
+    if seed is not None:
+        pos = np.sort(np.random.default_rng(seed).uniform(spread[0], spread[1], nsyn))
+    else:
+        isd = (spread[1]-spread[0])/float(nsyn)
+        pos = np.arange(spread[0], spread[1], isd)[0:nsyn]
 
     if (len(pos) != nsyn):
         # print ('error: synapse number mismatch, stop simulation! dend:', i_dend, 'created=', len(pos), '!=', nsyn_dend)
@@ -1,5 +1,6 @@
 from neuron import h
 import numpy as np
+import re
 
 ## define the CA1 cell
 class CA1(object):
@@ -20,6 +21,7 @@ class CA1(object):
 
     def __init__(self):
         h('xopen("simulator/model/CA1.hoc")')
+        self.sections = list(h.allsec())  # the sections of this cell, excluding later copies
         propsCA1(self)
         # self._geom()
         self._topol()
@@ -90,6 +92,85 @@ class CA1(object):
                     # sec.Ra = self.RA_dend # Ra is a section variable...
                 iseg = iseg + 1
 
+class CA1Copy(object):
+    """
+    An independent copy of a CA1 model, living in the same NEURON process as its prototype.
+
+    The sections of the prototype are cloned into Python sections owned by this object, including their geometry,
+    topology, passive and active membrane properties (as set on the prototype at the time of copying). Synapses are
+    not copied, so each copy can receive its own inputs. Several copies can then be simulated together, which
+    amortises the interpreter, mechanism and model setup costs over a batch of configurations.
+
+    Sections of a copy are named after the copy, e.g. 'CA1[1].dend5_0'; `strip_cell_name` recovers the names of
+    the prototype.
+
+    Attributes:
+        index (int): The index of the copy (the prototype has index 0).
+        sections (list): The sections of the copy, in the order of the prototype's sections.
+        soma, hill, iseg, node, inode, dends: The sections with the same role as in `CA1`.
+    """
+
+    def __init__(self, prototype: CA1, index: int):
+        self.index = index
+        propsCA1(self)
+        clones = {sec: clone_section(sec, self) for sec in prototype.sections}
+        for sec, clone in clones.items():
+            parent = sec.parentseg()
+            if parent is not None:
+                clone.connect(clones[parent.sec](parent.x), sec.orientation())
+
+        self.sections = list(clones.values())
+        self.soma = clones[prototype.soma]
+        self.hill = clones[prototype.hill]
+        self.iseg = clones[prototype.iseg]
+        self.node = [clones[sec] for sec in prototype.sections if sec.hname().startswith('node[')]
+        self.inode = [clones[sec] for sec in prototype.sections if sec.hname().startswith('inode[')]
+        self.dends = [clones[sec] for sec in prototype.dends]
+
+    def __str__(self):
+        return f'CA1[{self.index}]'
+
+
+def clone_section(sec, cell):
+    """
+    Creates a copy of a section owned by `cell`, with the same geometry, segmentation and membrane properties.
+    The copy is not connected.
+    """
+    clone = h.Section(name=sec.name(), cell=cell)
+    if sec.n3d() > 0:
+        for i in range(sec.n3d()):
+            clone.pt3dadd(sec.x3d(i), sec.y3d(i), sec.z3d(i), sec.diam3d(i))
+    else:
+        clone.L = sec.L
+    clone.nseg = sec.nseg
+    clone.Ra = sec.Ra
+
+    properties = sec.psection()
+    for mechanism, parameters in properties['density_mechs'].items():
+        clone.insert(mechanism)
+        for parameter, values in parameters.items():
+            for seg, value in zip(clone, values):
+                if not isinstance(value, list):  # array parameters are not copied
+                    setattr(getattr(seg, mechanism), parameter, value)
+    for ion, variables in properties['ions'].items():
+        for variable, values in variables.items():
+            for seg, value in zip(clone, values):
+                setattr(seg, variable, value)
+    for seg, seg_clone in zip(sec, clone):
+        seg_clone.cm = seg.cm
+        if sec.n3d() == 0:
+            seg_clone.diam = seg.diam
+    return clone
+
+
+def strip_cell_name(name: str) -> str:
+    """
+    Removes the cell prefix of a section or segment name of a `CA1Copy` (e.g. 'CA1[1].dend5_0(0.5)' ->
+    'dend5_0(0.5)'), so that all copies share the segment names of the prototype.
+    """
+    return re.sub(r'^CA1\[\d+\]\.', '', name)
+
+
 def propsCA1(model):
 
    # Passive properties
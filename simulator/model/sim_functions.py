@@ -2,14 +2,51 @@ import numpy as np
 import simulator.model.simulation as simulation
 
 
-def SIM_nsynIteration(model, nsyn, t_interval, onset, direction, t_stop):
+def SIM_nsynIteration(model, nsyn, t_interval, onset, direction, t_stop, background_events=None,
+                      recording_profile='full', target='soma', precision='float64'):
     etimes = genDSinput(nsyn, t_interval, onset, direction)
-    fih = simulation.h.FInitializeHandler(1, lambda: initSpikes_dend(model, etimes))
-    simulation_data = simulation.simulate(model, t_stop)
+    itimes = np.zeros([0, 2])
+    if background_events is not None:
+        # background excitatory inputs use the synapses following the nsyn stimulated ones
+        ebackground = background_events['excitatory'] + [nsyn, 0]
+        etimes_all = np.concatenate((etimes, ebackground))
+        itimes = background_events.get('inhibitory', itimes)
+    else:
+        etimes_all = etimes
+    model.vecstims = initSpikes_vecstim(model, etimes_all, itimes)  # kept alive during the simulation
+    simulation_data = simulation.simulate(model, t_stop, recording_profile, target, precision)
     simulation_data['etimes'] = etimes
+    if background_events is not None:
+        simulation_data['background_events'] = background_events
     return simulation_data
 
 
+def SIM_batch(models, configs, t_stop, recording_profile='full', target='soma', precision='float64'):
+    """
+    Simulates several cells together, each with the stimulation of its configuration.
+
+    Parameters:
+        models (list): The cells (a `CA1` prototype and its `CA1Copy` copies).
+        configs (list[dict]): The 'nsyn', 't_interval', 'onset' and 'direction' of the stimulation of each cell.
+        t_stop (float): The simulation end time in milliseconds.
+        recording_profile (str): The recording profile of all cells (see `RECORDING_PROFILES`).
+        target (str): The target section, for profiles that only record the target.
+        precision (str): The precision of the recorded currents ('float32' or 'float64').
+
+    Returns:
+        list[dict]: The simulation data of each cell, in the order of `models`.
+    """
+    etimes_batch = []
+    for model, config in zip(models, configs):
+        etimes = genDSinput(config['nsyn'], config['t_interval'], config['onset'], config['direction'])
+        model.vecstims = initSpikes_vecstim(model, etimes)  # kept alive during the simulation
+        etimes_batch.append(etimes)
+    simulation_data_batch = simulation.simulate_batch(models, t_stop, recording_profile, target, precision)
+    for simulation_data, etimes in zip(simulation_data_batch, etimes_batch):
+        simulation_data['etimes'] = etimes
+    return simulation_data_batch
+
+
 def genDSinput(nsyn, t_interval, onset, direction):
     # a single train with nsyn inputs - either in the in or in the out direction
     times = np.zeros([nsyn, 2])
@@ -21,8 +58,39 @@ def genDSinput(nsyn, t_interval, onset, direction):
     return times
 
 
-def initSpikes_dend(model, etimes):
-    if (len(etimes)>0):
-        for s in etimes:
-            model.ncAMPAlist[int(s[0])].event(float(s[1]))
-            model.ncNMDAlist[int(s[0])].event(float(s[1]))
+def initSpikes_vecstim(model, etimes, itimes=()):
+    """
+    Hands the spike times of all inputs to NEURON in bulk, so that events are scheduled inside NEURON without
+    Python callbacks during the simulation.
+
+    Each input gets a VecStim playing its sorted spike times. The VecStim drives the synapses of the input's
+    NetCons (AMPA and NMDA for excitatory, GABA for inhibitory inputs) with the same weights and delays.
+
+    Parameters:
+        model (CA1): The model with the NetCon lists of the synapses (`ncAMPAlist`, `ncNMDAlist`, `ncGABAlist`).
+        etimes (np.ndarray): (input index, time) of the excitatory events, as returned by `genDSinput`.
+        itimes (np.ndarray): (input index, time) of the inhibitory events.
+
+    Returns:
+        list: The created Vectors, VecStims and NetCons, which must be kept alive during the simulation.
+    """
+    stims = connectVecStims(etimes, [model.ncAMPAlist, model.ncNMDAlist])
+    stims += connectVecStims(itimes, [getattr(model, 'ncGABAlist', [])])
+    return stims
+
+
+def connectVecStims(events, netcon_lists):
+    events = np.asarray(events, dtype=float).reshape(-1, 2)
+    events = events[np.lexsort((events[:, 1], events[:, 0]))]  # sort by input, then by time
+    inputs, starts = np.unique(events[:, 0].astype(int), return_index=True)
+
+    objects = []
+    for i, times in zip(inputs, np.split(events[:, 1], starts[1:])):
+        vec = simulation.h.Vector(times)
+        stim = simulation.h.VecStim()
+        stim.play(vec)
+        objects += [vec, stim]
+        for netcons in netcon_lists:
+            nc = netcons[i]
+            objects.append(simulation.h.NetCon(stim, nc.syn(), 0, nc.delay, nc.weight[0]))
+    return objects
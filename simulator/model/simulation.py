@@ -5,9 +5,12 @@ from simulator.model.ca1_model import CA1
 from simulator.model.utils.record_intrinsic import record_intrinsic_currents, preprocess_intrinsic_data
 from simulator.model.utils.record_synaptic import record_synaptic_currents, preprocess_synaptic_data
 from simulator.model.utils.record_membrane_potential import record_membrane_potential, preprocess_membrane_potential_data
+from simulator.model.utils.recording_profiles import get_recording_plan
+from Precision import get_dtype
 
 
-def simulate(model: CA1, tstop: float) -> dict:
+def simulate(model: CA1, tstop: float, profile: str = 'full', target: str = 'soma',
+             precision: str = 'float64') -> dict:
     """
     Simulate the activity of a CA1 model.
 
@@ -19,6 +22,9 @@ def simulate(model: CA1, tstop: float) -> dict:
     Parameters:
         model (CA1): The biophysical model to be simulated.
         tstop (float): The simulation end time in milliseconds.
+        profile (str): The recording profile, which selects the recorded variables (see `RECORDING_PROFILES`).
+        target (str): The target section, for profiles that only record the target.
+        precision (str): The precision of the downsampled currents ('float32' or 'float64', see `Precision`).
 
     Returns:
         dict: A dictionary containing the processed simulation data. The dictionary keys
@@ -31,15 +37,46 @@ def simulate(model: CA1, tstop: float) -> dict:
               processed arrays.
             - 'taxis': A downsampled time axis array.
     """
+    return simulate_batch([model], tstop, profile, target, precision)[0]
+
+
+def simulate_batch(models: list, tstop: float, profile: str = 'full', target: str = 'soma',
+                   precision: str = 'float64') -> list[dict]:
+    """
+    Simulate several CA1 cells (a prototype `CA1` and its `CA1Copy` copies) together in one run.
+
+    Each cell is recorded from its own sections and synapses, and the recordings are split into one
+    simulation data dictionary per cell (see `simulate`). All cells share the integration time steps
+    of the variable step solver.
+
+    Parameters:
+        models (list): The cells to be simulated.
+        tstop (float): The simulation end time in milliseconds.
+        profile (str): The recording profile of all cells (see `simulate`).
+        target (str): The target section (see `simulate`).
+        precision (str): The precision of the downsampled currents (see `simulate`).
+
+    Returns:
+        list[dict]: The processed simulation data of each cell, in the order of `models`.
+    """
     h.CVode().active(True)
     h.CVode().atol((1e-3))
 
     trec = h.Vector()
     trec.record(h._ref_t)
 
-    v_segments, v = record_membrane_potential()
-    intrinsic_segments, intrinsic_currents = record_intrinsic_currents()
-    synaptic_segments, synaptic_currents = record_synaptic_currents(model)
+    recordings = []
+    n_vectors = 0
+    for model in models:
+        plan = get_recording_plan(model, profile, target)
+        v_segments, v = record_membrane_potential(segments=plan['v_segments'])
+        intrinsic_segments, intrinsic_currents = record_intrinsic_currents(segments=plan['intrinsic_segments'])
+        synaptic_segments, synaptic_currents = record_synaptic_currents(model, plan['synaptic'])
+        recordings.append((v_segments, v, intrinsic_segments, intrinsic_currents, synaptic_segments,
+                           synaptic_currents))
+        n_vectors += len(v) + sum(len(vecs) for vecs in intrinsic_currents.values()) + \
+            sum(len(vecs) for vecs in synaptic_currents.values())
+    print(f"Recording {n_vectors} variables (profile '{profile}')")
 
     h.celsius = 35
     h.finitialize(-68.3)
@@ -51,12 +88,16 @@ def simulate(model: CA1, tstop: float) -> dict:
     x = int((max(taxis_unique)) * 5)
     taxis_downsampled = np.linspace(min(taxis_unique), max(taxis_unique), x)
 
-    v_segments, v_arrays = preprocess_membrane_potential_data(v_segments, v, taxis_unique, index_unique)
-    intrinsic_segments, intrinsic_arrays = preprocess_intrinsic_data(intrinsic_segments, intrinsic_currents, taxis_unique, index_unique)
-    synaptic_segments, synaptic_arrays = preprocess_synaptic_data(synaptic_segments, synaptic_currents, taxis_unique, index_unique)
+    dtype = get_dtype(precision)
+    simulation_data_batch = []
+    for v_segments, v, intrinsic_segments, intrinsic_currents, synaptic_segments, synaptic_currents in recordings:
+        v_segments, v_arrays = preprocess_membrane_potential_data(v_segments, v, taxis_unique, index_unique)
+        intrinsic_segments, intrinsic_arrays = preprocess_intrinsic_data(intrinsic_segments, intrinsic_currents, taxis_unique, index_unique, dtype)
+        synaptic_segments, synaptic_arrays = preprocess_synaptic_data(synaptic_segments, synaptic_currents, taxis_unique, index_unique, dtype)
 
-    simulation_data = {'membrane_potential_data': [v_segments, v_arrays],
-                       'intrinsic_data': [intrinsic_segments, intrinsic_arrays],
-                       'synaptic_data': [synaptic_segments, synaptic_arrays],
-                       'taxis': taxis_downsampled}
-    return simulation_data
+        simulation_data = {'membrane_potential_data': [v_segments, v_arrays],
+                           'intrinsic_data': [intrinsic_segments, intrinsic_arrays],
+                           'synaptic_data': [synaptic_segments, synaptic_arrays],
+                           'taxis': taxis_downsampled}
+        simulation_data_batch.append(simulation_data)
+    return simulation_data_batch
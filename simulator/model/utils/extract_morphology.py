@@ -0,0 +1,41 @@
+import pandas as pd
+from neuron import h
+
+
+def get_segment_distances():
+    """
+    Calculates the path distance of each segment from the middle of the soma.
+
+    Returns:
+        pd.DataFrame: A DataFrame with a 'distance' column (um), indexed by segment name.
+    """
+    origin = h.soma(0.5)
+    segments = []
+    distances = []
+    for sec in h.allsec():
+        for seg in sec.allseg():
+            segments.append(str(seg))
+            distances.append(h.distance(origin, seg))
+    return pd.DataFrame({'distance': distances}, index=segments)
+
+
+def get_branch_orders():
+    """
+    Calculates the branch order of each section, i.e. the number of sections between the section and the root
+    section of the tree (the soma).
+
+    Returns:
+        pd.DataFrame: A DataFrame with a 'branch_order' column, indexed by section name.
+    """
+    orders = {}
+
+    def branch_order(sec):
+        name = sec.name()
+        if name not in orders:
+            parent = sec.parentseg()
+            orders[name] = 0 if parent is None else branch_order(parent.sec) + 1
+        return orders[name]
+
+    for sec in h.allsec():
+        branch_order(sec)
+    return pd.DataFrame({'branch_order': list(orders.values())}, index=list(orders.keys()))
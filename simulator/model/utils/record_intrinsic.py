@@ -3,6 +3,8 @@ import pandas as pd
 import numpy as np
 from neuron import h
 
+from simulator.model.ca1_model import strip_cell_name
+
 # Dictionary mapping current types to their corresponding NEURON attributes
 current_types = {
         'nax': '_ref_ina_nax',
@@ -37,20 +39,34 @@ def measure_intrinsic(seg, current_types):
     return recorded_vectors
 
 
-def record_intrinsic_currents():
+def record_intrinsic_currents(sections=None, segments=None):
     """
     Records intrinsic currents for all segments in all sections of the NEURON model.
     Iterates through all segments in all sections and records intrinsic currents based on the defined current types.
 
+    Parameters:
+        sections (list or None): The sections to record from (e.g. `model.sections` of a single cell).
+            All sections are recorded if None.
+        segments (dict or None): Keys are current types, and values are lists of segments to record the current
+            type from, e.g. selected with the mechanism table of a recording profile (see `get_recording_plan`).
+            Overrides `sections` if given, and the segments are not probed for the current types.
+
     Returns:
         tuple:
             - intrinsic_segments (dict): Keys are current types, and values are lists of segments where the current type is present.
             - intrinsic_currents (dict): Keys are current types, and values are lists of `h.Vector` objects for the recorded data.
     """
+    if segments is not None:
+        intrinsic_segments = {current: list(segments.get(current, [])) for current in current_types}
+        intrinsic_currents = {current: [h.Vector().record(getattr(seg, current_types[current]))
+                                        for seg in intrinsic_segments[current]]
+                              for current in current_types}
+        return intrinsic_segments, intrinsic_currents
+
     intrinsic_currents = {current: [] for current in current_types}
     intrinsic_segments = {current: [] for current in current_types}
 
-    for sec in h.allsec():
+    for sec in (h.allsec() if sections is None else sections):
         for seg in sec.allseg():
             recorded = measure_intrinsic(seg, current_types)
             for current, vec in recorded.items():
@@ -59,7 +75,7 @@ def record_intrinsic_currents():
     return intrinsic_segments, intrinsic_currents
 
 
-def preprocess_intrinsic_data(intrinsic_segments, intrinsic_currents, taxis_unique, index_unique):
+def preprocess_intrinsic_data(intrinsic_segments, intrinsic_currents, taxis_unique, index_unique, dtype=np.float64):
     """
     Saves recorded intrinsic current data and segment information to disk.
 
@@ -67,6 +83,7 @@ def preprocess_intrinsic_data(intrinsic_segments, intrinsic_currents, taxis_uniq
         intrinsic_segments (dict): Keys are current types, and values are lists of segments where the current type is present.
         intrinsic_currents (dict): Keys are current types, and values are lists of recorded `h.Vector` objects.
         output_dir (str): Path to the directory where data will be saved.
+        dtype (np.dtype): The type of the downsampled currents (see `Precision`).
 
     Outputs:
         - Segment information is saved as `.npy` files in the `intrinsic_segments` subdirectory.
@@ -76,7 +93,7 @@ def preprocess_intrinsic_data(intrinsic_segments, intrinsic_currents, taxis_uniq
     current_dict = {}
     for current_type in intrinsic_segments.keys():
         try:
-            segments_array = np.array(intrinsic_segments[current_type]).astype('str')
+            segments_array = np.array([strip_cell_name(str(seg)) for seg in intrinsic_segments[current_type]])
 
             # preprocess currents data (select unique indices, downsample to 5kHz)
             currents_array = np.array(intrinsic_currents[current_type])
@@ -86,7 +103,7 @@ def preprocess_intrinsic_data(intrinsic_segments, intrinsic_currents, taxis_uniq
             taxis_downsampled = np.linspace(min(taxis_unique), max(taxis_unique), x)
             currents_downsampled = np.array([
                 np.interp(taxis_downsampled, taxis_unique, row) for row in currents_unique
-            ])
+            ], dtype=dtype)
             segment_dict[current_type] = segments_array
             current_dict[current_type] = currents_downsampled
         except IndexError:  # if CaR and Kslow are inactive
@@ -2,23 +2,29 @@ import numpy as np
 from neuron import h
 import os
 
+from simulator.model.ca1_model import strip_cell_name
 
-def record_membrane_potential():
+
+def record_membrane_potential(sections=None, segments=None):
     """
     Records the membrane potential from all segments in all sections of the NEURON model.
 
+    Parameters:
+        sections (list or None): The sections to record from (e.g. `model.sections` of a single cell).
+            All sections are recorded if None.
+        segments (list or None): The segments to record from, e.g. selected by a recording profile
+            (see `get_recording_plan`). Overrides `sections` if given.
+
     Returns:
         tuple:
             - v_segments (list): A list of segment objects where the membrane potential was recorded.
             - v (list): A list of `h.Vector` objects containing the recorded membrane potential data.
     """
-    v = []
-    v_segments = []
+    if segments is None:
+        segments = [seg for sec in (h.allsec() if sections is None else sections) for seg in sec.allseg()]
 
-    for sec in h.allsec():
-        for seg in sec.allseg():
-            v_segments.append(seg)
-            v.append(h.Vector().record(seg._ref_v))
+    v_segments = list(segments)
+    v = [h.Vector().record(seg._ref_v) for seg in v_segments]
     return v_segments, v
 
 
@@ -35,7 +41,7 @@ def preprocess_membrane_potential_data(v_segments, v, taxis_unique, index_unique
         - Segment information is saved as `segments.npy` in the `membrane_potential_data` subdirectory.
         - Membrane potential data is saved as `v.npy` in the same subdirectory.
     """
-    segments_array = np.array([str(seg) for seg in v_segments])
+    segments_array = np.array([strip_cell_name(str(seg)) for seg in v_segments])
 
     # preprocessing (select unique indices, downsample to 5kHz)
     potential_array = np.array(v)
@@ -3,6 +3,8 @@ import pandas as pd
 import numpy as np
 from neuron import h
 
+from simulator.model.ca1_model import strip_cell_name
+
 
 def measure_AMPA_current(model):
     """
@@ -37,20 +39,40 @@ def measure_NMDA_current(model):
     return NMDA, NMDA_segments
 
 
-def record_synaptic_currents(model):
+def measure_GABA_current(model):
+    GABA = []
+    GABA_segments = []
+
+    for syn in getattr(model, 'GABAlist', []):
+        vec = h.Vector().record(syn._ref_i)
+        GABA.append(vec)
+        GABA_segments.append(syn.get_segment())
+    return GABA, GABA_segments
+
+
+def record_synaptic_currents(model, record: bool = True):
     """
     Records synaptic currents for all synapse types (AMPA, NMDA, GABA, GABA-B).
 
+    One vector is recorded per point process. If the synapses were added with `add_syns(..., aggregate=True)`,
+    the point processes are shared per segment and the recorded currents are already summed per segment.
+
     Parameters:
         model (object): The NEURON model containing lists of synapses (`AMPAlist`, `NMDAlist`, `GABAlist`, `GABA_Blist`).
+        record (bool): If False, nothing is recorded and empty dictionaries are returned (recording profiles
+            without synaptic currents).
 
     Returns:
         tuple:
             - synaptic_segments (dict): A dictionary where keys are synapse types and values are lists of segments.
             - synaptic_currents (dict): A dictionary where keys are synapse types and values are lists of `h.Vector` objects.
     """
+    if not record:
+        return {}, {}
+
     AMPA, AMPA_segments = measure_AMPA_current(model)
     NMDA, NMDA_segments = measure_NMDA_current(model)
+    GABA, GABA_segments = measure_GABA_current(model)
 
     synaptic_currents = {
         'AMPA': AMPA,
@@ -62,10 +84,15 @@ def record_synaptic_currents(model):
         'NMDA': NMDA_segments
     }
 
+    # GABA synapses only exist with background input
+    if GABA:
+        synaptic_currents['GABA'] = GABA
+        synaptic_segments['GABA'] = GABA_segments
+
     return synaptic_segments, synaptic_currents
 
 
-def preprocess_synaptic_data(synaptic_segments, synaptic_currents, taxis_unique, index_unique):
+def preprocess_synaptic_data(synaptic_segments, synaptic_currents, taxis_unique, index_unique, dtype=np.float64):
     """
     Saves synaptic current data and segment information to disk.
 
@@ -73,6 +100,7 @@ def preprocess_synaptic_data(synaptic_segments, synaptic_currents, taxis_unique,
         synaptic_segments (dict): Keys are synapse types, and values are lists of segments where the synapse currents are recorded.
         synaptic_currents (dict): Keys are synapse types, and values are lists of recorded `h.Vector` objects.
         output_dir (str): Path to the directory where data will be saved.
+        dtype (np.dtype): The type of the downsampled currents (see `Precision`).
 
     Outputs:
         - Segment information is saved as `.npy` files in the `synaptic_segments` subdirectory.
@@ -81,7 +109,7 @@ def preprocess_synaptic_data(synaptic_segments, synaptic_currents, taxis_unique,
     segment_dict = {}
     current_dict = {}
     for synapse_type in synaptic_segments.keys():
-        segments_array = np.array(synaptic_segments[synapse_type]).astype('str')
+        segments_array = np.array([strip_cell_name(str(seg)) for seg in synaptic_segments[synapse_type]])
 
         # preprocess currents data (select unique indices, downsample to 5kHz)
         currents_array = np.array(synaptic_currents[synapse_type])
@@ -91,7 +119,7 @@ def preprocess_synaptic_data(synaptic_segments, synaptic_currents, taxis_unique,
         taxis_downsampled = np.linspace(min(taxis_unique), max(taxis_unique), x)
         currents_downsampled = np.array([
             np.interp(taxis_downsampled, taxis_unique, row) for row in currents_unique
-        ])
+        ], dtype=dtype)
         segment_dict[synapse_type] = segments_array
         current_dict[synapse_type] = currents_downsampled
     return segment_dict, current_dict
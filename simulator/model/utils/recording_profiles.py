@@ -0,0 +1,107 @@
+import numpy as np
+import pandas as pd
+
+from simulator.model.ca1_model import strip_cell_name
+from simulator.model.utils.record_intrinsic import current_types
+
+# Density mechanism providing each intrinsic current type (the capacitive current exists in every section)
+CURRENT_MECHANISMS = {
+    'nax': 'nax',
+    'nad': 'nad',
+    'car': 'car',
+    'kdr': 'kdr',
+    'kap': 'kap',
+    'kad': 'kad',
+    'kslow': 'kslow',
+    'passive': 'pas',
+    'capacitive': None,
+}
+
+# What each recording profile records:
+#   'membrane_potential': the segments of which v is recorded ('allseg' or 'target')
+#   'intrinsic': the segments of which the intrinsic currents are recorded ('allseg', 'internal' or None)
+#   'synaptic': whether the synaptic currents are recorded
+RECORDING_PROFILES = {
+    # everything that can be recorded, including the currents of the zero-area nodes at the section ends
+    'full': {'membrane_potential': 'allseg', 'intrinsic': 'allseg', 'synaptic': True},
+    # what the currentscape needs: v of all nodes (for the axial currents) and the membrane currents of the
+    # internal segments; the currents of the section ends vanish when they are scaled by their area (0)
+    'currentscape-minimal': {'membrane_potential': 'allseg', 'intrinsic': 'internal', 'synaptic': True},
+    # the membrane currents for the 'accumulated' axial current engine, which derives the axial currents from them,
+    # and the membrane potential of the target for the figure
+    'currentscape-accumulated': {'membrane_potential': 'target', 'intrinsic': 'internal', 'synaptic': True},
+    # only the membrane potential of the target section (e.g. to plot previously calculated results)
+    'vm-target': {'membrane_potential': 'target', 'intrinsic': None, 'synaptic': False},
+}
+
+
+def get_recording_profile(profile: str) -> dict:
+    """
+    Returns the definition of a recording profile (see `RECORDING_PROFILES`).
+    """
+    if profile not in RECORDING_PROFILES:
+        raise ValueError(f"Unknown recording profile '{profile}'. Available profiles: "
+                         f"{', '.join(RECORDING_PROFILES)}.")
+    return RECORDING_PROFILES[profile]
+
+
+def get_mechanism_table(sections) -> pd.DataFrame:
+    """
+    Creates a table of the intrinsic current types that are present in each section.
+
+    Density mechanisms are inserted per section, so each section is probed once instead of probing every segment
+    for every current type.
+
+    Parameters:
+        sections (list): The NEURON sections of a cell (e.g. `model.sections`).
+
+    Returns:
+        pd.DataFrame: A boolean (section x current type) table, indexed by the position of the section in `sections`.
+    """
+    table = np.zeros((len(sections), len(current_types)), dtype=bool)
+    for row, sec in enumerate(sections):
+        for col, current in enumerate(current_types):
+            mechanism = CURRENT_MECHANISMS[current]
+            table[row, col] = mechanism is None or sec.has_membrane(mechanism)
+    return pd.DataFrame(table, columns=list(current_types))
+
+
+def get_recording_plan(model, profile: str = 'full', target: str = 'soma') -> dict:
+    """
+    Selects the segments to record of a cell for a recording profile.
+
+    The mechanism table of the cell is created once and cached in `model.mechanism_table`.
+
+    Parameters:
+        model (object): The cell to record (`CA1` or `CA1Copy`).
+        profile (str): The recording profile (see `RECORDING_PROFILES`).
+        target (str): The target section, used by profiles that only record the target.
+
+    Returns:
+        dict:
+            - 'v_segments' (list): The segments of which the membrane potential is recorded.
+            - 'intrinsic_segments' (dict): Keys are current types, and values are lists of segments where the current
+              type is recorded.
+            - 'synaptic' (bool): Whether the synaptic currents are recorded.
+    """
+    definition = get_recording_profile(profile)
+    sections = model.sections
+    if getattr(model, 'mechanism_table', None) is None:
+        model.mechanism_table = get_mechanism_table(sections)
+
+    if definition['membrane_potential'] == 'target':
+        v_sections = [sec for sec in sections if strip_cell_name(sec.name()) == target]
+        if not v_sections:
+            raise ValueError(f"Target section '{target}' not found in the model.")
+    else:
+        v_sections = sections
+    v_segments = [seg for sec in v_sections for seg in sec.allseg()]
+
+    intrinsic_segments = {current: [] for current in current_types}
+    if definition['intrinsic'] is not None:
+        for sec, present in zip(sections, model.mechanism_table.to_numpy()):
+            segments = list(sec.allseg()) if definition['intrinsic'] == 'allseg' else list(sec)
+            for current in model.mechanism_table.columns[present]:
+                intrinsic_segments[current].extend(segments)
+
+    return {'v_segments': v_segments, 'intrinsic_segments': intrinsic_segments, 'synaptic': definition['synaptic']}
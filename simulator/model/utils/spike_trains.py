@@ -0,0 +1,124 @@
+import os
+import hashlib
+import tempfile
+import numpy as np
+import pandas as pd
+
+# Default directory of the parsed spike trains, outside of the source tree
+CACHE_DIR = os.path.join(os.environ.get('XDG_CACHE_HOME', os.path.join(os.path.expanduser('~'), '.cache')),
+                         'currentscapes', 'spike_trains')
+
+
+class SpikeTrains:
+    """
+    Compact event index of a population of spike trains.
+
+    The spike times of all sources are stored in a single array, sorted by source and by time within each source,
+    and the events of source `i` are `times[offsets[i]:offsets[i + 1]]` (CSR layout).
+
+    Attributes:
+        times (np.ndarray): The spike times (ms) of all sources.
+        offsets (np.ndarray): The start of the events of each source in `times`, with a final entry for the end.
+    """
+    def __init__(self, times: np.ndarray, offsets: np.ndarray) -> None:
+        self.times = times
+        self.offsets = offsets
+
+    @property
+    def n_sources(self) -> int:
+        return len(self.offsets) - 1
+
+    def source_times(self, source: int) -> np.ndarray:
+        """
+        Returns the spike times of a single source.
+        """
+        return self.times[self.offsets[source]:self.offsets[source + 1]]
+
+    def events(self, sources: np.ndarray = None, tmin: float = None, tmax: float = None) -> np.ndarray:
+        """
+        Returns the events of a subset of sources within a time window.
+
+        Args:
+            sources (np.ndarray or None): The sources to select. All sources are selected if None.
+            tmin (float or None): Start of the time window (ms), inclusive.
+            tmax (float or None): End of the time window (ms), exclusive.
+
+        Returns:
+            np.ndarray: An (n_events x 2) array with the position of the source in `sources` and the spike time of
+            each event, sorted by time (the format of `genDSinput`).
+        """
+        sources = np.arange(self.n_sources) if sources is None else np.asarray(sources, dtype=np.int64)
+        starts = self.offsets[sources]
+        counts = self.offsets[sources + 1] - starts
+
+        # Gather the events of the selected sources without a loop over the sources
+        first = np.cumsum(counts) - counts
+        event_index = np.arange(counts.sum()) - np.repeat(first - starts, counts)
+        source_index = np.repeat(np.arange(len(sources)), counts)
+        times = self.times[event_index]
+
+        in_window = np.ones(len(times), dtype=bool)
+        if tmin is not None:
+            in_window &= times >= tmin
+        if tmax is not None:
+            in_window &= times < tmax
+        order = np.argsort(times[in_window], kind='stable')
+        return np.column_stack((source_index[in_window][order], times[in_window][order]))
+
+
+def load_spike_trains(path: str, n_sources: int = None, cache_dir: str = None) -> SpikeTrains:
+    """
+    Loads a spike-train file with one 'source time' event per line.
+
+    The text file is parsed once and cached as '<name>_<path hash>.npz' in `cache_dir`; later calls load the cache
+    directly, unless the text file is newer than the cache. The cache is written to a temporary file and renamed into
+    place, so parallel processes parsing the same file never load a partly written cache.
+
+    Args:
+        path (str): Path to the spike-train file (e.g. 'synaptic_input/Espikes_d10_Ne2000_Re0.5_rseed1_rep0.dat').
+        n_sources (int or None): The number of sources. If None, it is the largest source id plus one.
+        cache_dir (str or None): Directory of the cache files. Defaults to `CACHE_DIR`, so that the cache is not
+            written into the source tree.
+
+    Returns:
+        SpikeTrains: The event index of the spike trains.
+    """
+    cache_dir = CACHE_DIR if cache_dir is None else cache_dir
+    # Files of the same name in different directories get separate caches
+    path_hash = hashlib.md5(os.path.abspath(path).encode()).hexdigest()[:8]
+    name = f'{os.path.splitext(os.path.basename(path))[0]}_{path_hash}'
+    cache_path = os.path.join(cache_dir, f'{name}.npz')
+
+    if os.path.exists(cache_path) and os.path.getmtime(cache_path) >= os.path.getmtime(path):
+        with np.load(cache_path) as cache:
+            times = cache['times']
+            offsets = cache['offsets']
+    else:
+        times, offsets = parse_spike_trains(path)
+        os.makedirs(cache_dir, exist_ok=True)
+        descriptor, temp_path = tempfile.mkstemp(dir=cache_dir, prefix=f'.{name}-', suffix='.npz')
+        try:
+            with os.fdopen(descriptor, 'wb') as file:
+                np.savez(file, times=times, offsets=offsets)
+            os.replace(temp_path, cache_path)
+        except BaseException:
+            os.remove(temp_path)
+            raise
+
+    if n_sources is not None and n_sources + 1 > len(offsets):
+        offsets = np.append(offsets, np.full(n_sources + 1 - len(offsets), offsets[-1]))
+    return SpikeTrains(times, offsets)
+
+
+def parse_spike_trains(path: str) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Parses a spike-train text file into spike times sorted by source and time, and the CSR offsets of the sources.
+    """
+    events = pd.read_csv(path, sep=r'\s+', header=None, names=['source', 'time'],
+                         dtype={'source': np.int64, 'time': np.float64}, comment='#')
+    sources = events['source'].to_numpy()
+    times = events['time'].to_numpy()
+    order = np.lexsort((times, sources))
+    counts = np.bincount(sources, minlength=sources.max(initial=-1) + 1)
+    offsets = np.concatenate(([0], np.cumsum(counts)))
+    return times[order], offsets
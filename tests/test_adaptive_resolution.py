@@ -0,0 +1,46 @@
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetic_tree import SyntheticTree
+from currentscape_calculator.adaptive_resolution import partition_iax_adaptive, needs_refinement
+from currentscape_calculator.partitioning_algorithm import partition_iax
+
+
+def get_tree_with_near_zero_edges(n_timepoints: int = 200) -> SyntheticTree:
+    # Slowly changing currents, with noise-level currents at the leaves whose axial currents flip sign randomly
+    tree = SyntheticTree(300, n_timepoints, flip_rate=0.002)
+    leaves = np.setdiff1d(np.arange(1, len(tree.nodes)), tree.node_parents)
+    rows = tree.im.index.get_level_values(0).isin(np.asarray(tree.nodes, dtype=object)[leaves])
+    tree.im.loc[rows] = np.random.default_rng(1).normal(scale=1e-9, size=(rows.sum(), n_timepoints))
+    tree.iax = tree._get_axial_currents()
+    return tree
+
+
+def get_shares(part: pd.DataFrame) -> np.ndarray:
+    return (part / part.sum()).to_numpy() * 100
+
+
+def test_near_zero_sign_changes_do_not_refine():
+    tree = get_tree_with_near_zero_edges()
+    timepoints = list(tree.im.columns)
+    pos, neg, exact, _ = partition_iax_adaptive(tree.im.copy(), tree.iax.copy(), timepoints, 'soma', 'type', None,
+                                                stride=20)
+    pos_exact, neg_exact = partition_iax(tree.im.copy(), tree.iax.copy(), timepoints, 'soma', 'type', None)
+    assert exact.sum() < len(timepoints) / 2
+    assert np.abs(get_shares(pos) - get_shares(pos_exact)).max() < 5.0
+    assert np.abs(get_shares(neg) - get_shares(neg_exact)).max() < 5.0
+
+
+def test_sign_change_of_large_current_refines():
+    part = np.ones((2, 3))
+    large_flip = np.array([[1.0, 0.5, -1.0], [1e-6, 1e-6, 1e-6]])
+    small_flip = np.array([[1.0, 1.0, 1.0], [1e-6, -1e-6, 1e-6]])
+    assert needs_refinement(part, part, large_flip, 0, 2, 5.0, 0.2)
+    assert not needs_refinement(part, part, small_flip, 0, 2, 5.0, 0.2)
+
+
+def test_empty_timepoints():
+    tree = SyntheticTree(100, n_timepoints=5)
+    pos, neg, exact, error_bound = partition_iax_adaptive(tree.im.copy(), tree.iax.copy(), [], 'soma', 'type', None,
+                                                          tolerance=0.1)
+    assert pos.shape[1] == 0 and neg.shape[1] == 0 and len(exact) == 0 and len(error_bound) == 0
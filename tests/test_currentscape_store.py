@@ -0,0 +1,41 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks.synthetic_tree import SyntheticTree
+from currentscape_calculator.CurrentscapeCalculator import CurrentscapeCalculator
+from currentscape_calculator.currentscape_store import CurrentscapeStore, ColumnChunkReader
+
+
+def test_column_chunk_reader(tmp_path):
+    tree = SyntheticTree(100, n_timepoints=12)
+    tree.im.to_csv(tmp_path / 'im.csv')
+    reader = ColumnChunkReader(str(tmp_path / 'im.csv'), str(tmp_path / 'converted'), row_chunk_size=50)
+    chunk = reader.read([3, 4, 5, 6])
+    expected = tree.im.loc[:, [3, 4, 5, 6]]
+    np.testing.assert_allclose(chunk.to_numpy(), expected.to_numpy())
+    assert list(chunk.index) == list(expected.index)
+
+
+def test_streaming_equals_in_memory(tmp_path):
+    tree = SyntheticTree(200, n_timepoints=12)
+    tree.im.to_csv(tmp_path / 'im.csv')
+    tree.iax.to_csv(tmp_path / 'iax.csv')
+    taxis = tree.taxis
+    tmin, tmax = taxis[0] - 1, taxis[-1] + 1
+    calculator = CurrentscapeCalculator('soma', 'type', None, progress_callback=None)
+    pos, neg = calculator.calculate_currentscape(str(tmp_path / 'iax.csv'), str(tmp_path / 'im.csv'), taxis, tmin,
+                                                 tmax)
+    pos_streamed, neg_streamed = calculator.calculate_currentscape_streaming(
+        str(tmp_path / 'iax.csv'), str(tmp_path / 'im.csv'), taxis, tmin, tmax, str(tmp_path / 'store'), chunk_size=5)
+    np.testing.assert_allclose(pos_streamed.to_numpy(), pos.to_numpy(), rtol=1e-12)
+    np.testing.assert_allclose(neg_streamed.to_numpy(), neg.to_numpy(), rtol=1e-12)
+
+
+def test_store_rejects_new_itypes(tmp_path):
+    store = CurrentscapeStore(str(tmp_path), np.arange(4))
+    first = pd.DataFrame(1.0, index=['kdr', 'nax'], columns=[0, 1])
+    store.append(first, -first)
+    second = pd.DataFrame(1.0, index=['kdr', 'nax', 'residual'], columns=[2, 3])
+    with pytest.raises(ValueError, match='residual'):
+        store.append(second, -second)
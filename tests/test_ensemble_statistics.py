@@ -0,0 +1,30 @@
+import numpy as np
+import pandas as pd
+
+from currentscape_calculator.ensemble_statistics import EnsembleStatistics, get_shares, load_ensemble_statistics
+
+
+def add_trials(statistics: EnsembleStatistics, n_trials: int, rng: np.random.Generator) -> np.ndarray:
+    # Adds random trials, the last current type only from the second trial on, and returns their shares
+    shares = []
+    for trial in range(n_trials):
+        itypes = list('abcd') if trial > 0 else list('abc')
+        part_pos = pd.DataFrame(rng.lognormal(size=(len(itypes), 30)), index=itypes)
+        statistics.add(part_pos, -part_pos)
+        shares.append(get_shares(part_pos.reindex(list('abcd'), fill_value=0).to_numpy()))
+    return np.array(shares)
+
+
+def test_quantile_error_is_within_a_bin(tmp_path):
+    rng = np.random.default_rng(0)
+    statistics = EnsembleStatistics(n_bins=100)
+    shares = add_trials(statistics, 40, rng)
+    for q in (0, 0.05, 0.5, 0.95, 1):
+        expected = np.quantile(shares, q, axis=0, method='inverted_cdf')
+        assert np.abs(statistics.quantile('shares_pos', q).to_numpy() - expected).max() <= 1.0
+    # The extreme quantiles are the exact bounds of the shares
+    np.testing.assert_allclose(statistics.quantile('shares_neg', 1).to_numpy(), shares.max(axis=0))
+
+    statistics.save(str(tmp_path))
+    loaded = load_ensemble_statistics(str(tmp_path))
+    pd.testing.assert_frame_equal(loaded.quantile('shares_pos', 0.5), statistics.quantile('shares_pos', 0.5))
@@ -0,0 +1,97 @@
+import numpy as np
+import pandas as pd
+
+from SegmentCatalog import SegmentCatalog
+from benchmarks.synthetic_tree import SyntheticTree
+from currentscape_calculator import partitioning_algorithm
+from currentscape_calculator.partitioning_algorithm import partition_iax, partition_iax_approximate
+from currentscape_calculator.grouping import CURRENT_CATEGORIES
+from currentscape_calculator.CurrentscapeCalculator import CurrentscapeCalculator
+
+
+def get_category_mapping(im: pd.DataFrame) -> pd.Series:
+    # Maps every (segment, itype) row to 'intrinsic' or 'synaptic'
+    categories = {itype: category for category, itypes in CURRENT_CATEGORIES.items() for itype in itypes}
+    return pd.Series([categories[itype] for itype in im.index.get_level_values(1)], index=im.index)
+
+
+def test_partition_iax_with_series_mapping():
+    tree = SyntheticTree(200, n_timepoints=5)
+    timepoints = list(tree.im.columns)
+    mapping = get_category_mapping(tree.im)
+
+    pos, neg = partition_iax(tree.im.copy(), tree.iax.copy(), timepoints, 'soma', mapping, None)
+    pos_type, neg_type = partition_iax(tree.im.copy(), tree.iax.copy(), timepoints, 'soma', 'type', None)
+
+    # The partitioning is linear in the membrane currents, so grouping before partitioning equals grouping after
+    labels = mapping.groupby(level=1).first()
+    for grouped, by_type in ((pos, pos_type), (neg, neg_type)):
+        expected = by_type.groupby(labels.reindex(by_type.index).to_numpy()).sum()
+        pd.testing.assert_frame_equal(grouped.sort_index().astype(np.float64), expected.sort_index(),
+                                      check_names=False, rtol=1e-9, atol=1e-12)
+
+
+def test_calculator_with_series_mapping():
+    tree = SyntheticTree(200, n_timepoints=5)
+    mapping = get_category_mapping(tree.im)
+    calculator = CurrentscapeCalculator('soma', mapping, None, progress_callback=None)
+    pos, neg = calculator.calculate_from_frames(tree.im.copy(), tree.iax.copy(), list(tree.im.columns))
+    assert set(pos.index) == {'intrinsic', 'synaptic'}
+    assert np.isfinite(pos.to_numpy()).all() and np.isfinite(neg.to_numpy()).all()
+
+
+def test_partition_iax_with_shared_catalog_in_chunks(monkeypatch):
+    tree = SyntheticTree(200, n_timepoints=7)
+    timepoints = list(tree.im.columns)
+    target = tree.deepest_section()
+    pos, neg = partition_iax(tree.im.copy(), tree.iax.copy(), timepoints, target, 'type', None)
+
+    # A catalog of the whole model, with more segments than the partitioning graph, and node arrays of 2 timepoints
+    catalog = SegmentCatalog(['unused(0.5)', *tree.nodes], tree.im.index.get_level_values(1).unique())
+    n_values = 2 * (len(catalog) + 1) * len(catalog.itypes)
+    monkeypatch.setattr(partitioning_algorithm, 'NODE_ARRAY_VALUES', n_values)
+    pos_shared, neg_shared = partition_iax(tree.im.copy(), tree.iax.copy(), timepoints, target, 'type', None,
+                                           catalog=catalog)
+    pd.testing.assert_frame_equal(pos_shared, pos)
+    pd.testing.assert_frame_equal(neg_shared, neg)
+    assert target in catalog.segments
+
+
+def test_partition_iax_float32_is_rounded_once():
+    tree = SyntheticTree(300, n_timepoints=5)
+    timepoints = list(tree.im.columns)
+    pos, neg = partition_iax(tree.im.copy(), tree.iax.copy(), timepoints, 'soma', 'type', None)
+    pos32, neg32 = partition_iax(tree.im.astype(np.float32), tree.iax.astype(np.float32), timepoints, 'soma', 'type',
+                                 None)
+    assert (pos32.dtypes == np.float32).all() and (neg32.dtypes == np.float32).all()
+    # The currents are accumulated in float64, so only the inputs and the result are rounded to float32
+    for part32, part in ((pos32, pos), (neg32, neg)):
+        scale = np.abs(part.to_numpy()).max()
+        assert np.abs(part32.to_numpy(dtype=np.float64) - part.to_numpy()).max() < 1e-6 * scale
+
+
+def test_partition_iax_approximate_skips_cut_subtrees(monkeypatch):
+    tree = SyntheticTree(500, n_timepoints=5)
+    timepoints = list(tree.im.columns)
+    tolerance = 0.1 * np.nanmax(np.abs(tree.iax.to_numpy()))
+    traversed = []
+
+    def get_partitioning_order(dg, target, direction):
+        order = get_order(dg, target, direction)
+        traversed.append(len(order))
+        return order
+
+    get_order = partitioning_algorithm.get_partitioning_order
+    monkeypatch.setattr(partitioning_algorithm, 'get_partitioning_order', get_partitioning_order)
+    pos, neg = partition_iax(tree.im.copy(), tree.iax.copy(), timepoints, 'soma', 'type', None)
+    n_exact = sum(traversed)
+    traversed.clear()
+    pos_approx, neg_approx, error_bound = partition_iax_approximate(tree.im.copy(), tree.iax.copy(), timepoints,
+                                                                    'soma', 'type', None, tolerance)
+    assert sum(traversed) < n_exact
+    assert (error_bound.to_numpy() > 0).any()
+
+    # The current of the cut subtrees is kept in the 'residual' current type
+    for approx, exact, bound in ((pos_approx, pos, 'error_bound_pos'), (neg_approx, neg, 'error_bound_neg')):
+        np.testing.assert_allclose(approx.sum().to_numpy(), exact.sum().to_numpy(), rtol=1e-9)
+        assert (approx.loc['residual'].abs() <= error_bound[bound] * (1 + 1e-9)).all()
@@ -0,0 +1,26 @@
+import os
+import pytest
+
+from concurrent.futures.process import BrokenProcessPool
+from PipelineScheduler import PipelineScheduler, PipelineStage
+
+
+def die_on_two(item: int) -> int:
+    # Simulates a worker process that is killed while processing an item
+    if item == 2:
+        os._exit(1)
+    return item
+
+
+def double(item: int) -> int:
+    return 2 * item
+
+
+@pytest.mark.parametrize('fresh_process', [False, True])
+def test_dead_worker_fails_its_item(fresh_process):
+    scheduler = PipelineScheduler([PipelineStage('die', die_on_two, workers=2, fresh_process=fresh_process),
+                                   PipelineStage('double', double)])
+    with pytest.raises(BrokenProcessPool):
+        scheduler.run(list(range(6)))
+    # The other items were processed, the workers continued with new processes
+    assert scheduler.report['items'].tolist() == [6, 5]
@@ -0,0 +1,55 @@
+import os
+import json
+import multiprocessing
+
+from SweepQueue import SweepQueue, get_job_id
+
+
+def write_params(params: dict, output_dir: str) -> None:
+    with open(os.path.join(output_dir, 'params.json'), 'w') as file:
+        json.dump(params, file)
+
+
+def test_stale_worker_does_not_move_a_reclaimed_job(tmp_path):
+    queue = SweepQueue(str(tmp_path), lease_timeout=0)
+    queue.submit([{'nsyn': 8}])
+    stale_job = queue.claim()
+
+    # The lease of the first worker expires and the job is claimed by a second worker
+    os.utime(queue._claimed_path(stale_job['job_id'], stale_job['claimant']), (0, 0))
+    assert queue.requeue_stale() == [stale_job['job_id']]
+    job = queue.claim()
+    assert job['job_id'] == stale_job['job_id'] and job['claimant'] != stale_job['claimant']
+
+    # Calls of the first worker leave the new claim in place
+    assert not queue.renew(stale_job)
+    queue.complete(stale_job)
+    queue.fail(stale_job, 'error')
+    assert queue.status() == {'pending': 0, 'claimed': 1, 'done': 0, 'failed': 0}
+    assert queue.submit([{'nsyn': 8}]) == []
+
+    queue.fail(job, 'error')
+    assert queue.status() == {'pending': 1, 'claimed': 0, 'done': 0, 'failed': 0}
+    job = queue.claim()
+    assert job['attempts'] == 1 and 'claimant' in job
+    queue.complete(job)
+    assert queue.status() == {'pending': 0, 'claimed': 0, 'done': 1, 'failed': 0}
+
+
+def test_parallel_workers_drain_the_queue(tmp_path):
+    queue = SweepQueue(str(tmp_path))
+    jobs = [{'nsyn': nsyn} for nsyn in range(12)]
+    queue.submit(jobs)
+    workers = [multiprocessing.Process(target=queue.work, args=(write_params, 0.1)) for _ in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(60)
+    assert all(worker.exitcode == 0 for worker in workers)
+
+    assert queue.status() == {'pending': 0, 'claimed': 0, 'done': len(jobs), 'failed': 0}
+    # One output directory per job, without temporary directories left behind
+    assert sorted(os.listdir(queue.output_root)) == sorted(get_job_id(params) for params in jobs)
+    for params in jobs:
+        with open(os.path.join(queue.output_dir(get_job_id(params)), 'params.json')) as file:
+            assert json.load(file) == params